@@ -4,28 +4,34 @@ import os
 import logging
 import threading
 import time
-from datetime import datetime, time as dt_time, timedelta
+from datetime import datetime, timedelta
 import json
 import pytz
 import requests
 from telegram import Update, ParseMode, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Updater, CommandHandler, CallbackContext, Job, ConversationHandler, MessageHandler, Filters, CallbackQueryHandler
-from telegram.error import Conflict, BadRequest
+from telegram.error import Conflict, BadRequest, RetryAfter, TelegramError
+from telegram.ext.extbot import ExtBot
+from telegram.utils.request import Request
 import html
-from http.server import BaseHTTPRequestHandler, HTTPServer
-
-# ✅ ИМПОРТ GOOGLE SHEETS ИНТЕГРАЦИИ
-try:
-    from sheets_integration import SheetsManager
-    sheets_manager = SheetsManager()
-    SHEETS_AVAILABLE = True
-    logger_temp = logging.getLogger(__name__)
-    logger_temp.info("✅ Google Sheets integration loaded successfully")
-except Exception as e:
-    sheets_manager = None
-    SHEETS_AVAILABLE = False
-    logger_temp = logging.getLogger(__name__)
-    logger_temp.warning(f"📵 Google Sheets integration not available: {e}")
+import heapq
+import hmac
+import secrets
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from storage import get_store
+from metrics import metrics
+from tasks import TaskManager, TaskCancelled, TaskConflictError
+from scheduler import ReminderScheduler, UpcomingIndex, LoadShaper, AdaptiveInterval
+from recurrence import compile_reminder, parse_rule, schedule_text, RecurrenceError, WEEKDAYS
+
+# ✅ GOOGLE SHEETS ИНТЕГРАЦИЯ
+# Менеджер создается в фоне при запуске (init_sheets_manager): авторизация в Google
+# не задерживает импорт модуля и начало обработки команд.
+# sheets_ready - попытка подключения завершена (успешно или нет)
+sheets_manager = None
+SHEETS_AVAILABLE = False
+sheets_ready = threading.Event()
 
 # Константа для московского времени
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
@@ -33,25 +39,345 @@ MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 # Время запуска бота
 BOT_START_TIME = None
 
+class StartupStages:
+    """
+    Этапы запуска бота: статус и длительность каждого этапа.
+
+    Локальные этапы (файлы, планирование, polling) проходят синхронно,
+    работа с Google Sheets - в фоне; /status показывает текущее состояние.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._started = time.monotonic()
+        self.total_seconds = None
+
+    @contextmanager
+    def stage(self, name):
+        """Отмечает этап выполняющимся, по выходу - завершенным или упавшим"""
+        started = time.monotonic()
+        with self._lock:
+            self._stages[name] = {"status": "running", "seconds": None}
+        logger.info(f"⏳ Startup stage '{name}' started")
+        try:
+            yield
+        except Exception:
+            self._finish(name, "failed", started)
+            raise
+        self._finish(name, "done", started)
+
+    def _finish(self, name, status, started):
+        seconds = time.monotonic() - started
+        with self._lock:
+            self._stages[name] = {"status": status, "seconds": seconds}
+        if status == "done":
+            logger.info(f"✅ Startup stage '{name}' done in {seconds:.2f}s")
+        else:
+            logger.error(f"❌ Startup stage '{name}' failed after {seconds:.2f}s")
+
+    def complete(self):
+        """Фиксирует общее время запуска (после фоновых этапов)"""
+        self.total_seconds = time.monotonic() - self._started
+        logger.info(f"🚀 Bot startup completed in {self.total_seconds:.2f}s")
+
+    @property
+    def is_complete(self):
+        return self.total_seconds is not None
+
+    def status(self, name):
+        with self._lock:
+            stage = self._stages.get(name)
+            return stage["status"] if stage else None
+
+    def snapshot(self):
+        """Список (этап, статус, секунды) в порядке запуска"""
+        with self._lock:
+            return [(name, stage["status"], stage["seconds"]) for name, stage in self._stages.items()]
+
+startup_stages = StartupStages()
+
+# --- Операционный HTTP endpoint ---
+# /healthz (и /) - liveness: процесс жив и не завис;
+# /readyz - readiness: файлы загружены, напоминания запланированы, polling запущен;
+# /metrics - метрики в формате Prometheus, /metrics.json - тот же набор JSON документом
+# POST /resync - точечная пересинхронизация измененных строк таблицы (RESYNC_TOKEN)
+
+# Ближайшее срабатывание, просроченное дольше этого времени, означает зависший планировщик
+LIVENESS_MAX_LAG_SECONDS = int(os.environ.get('LIVENESS_MAX_LAG_SECONDS', 300))
+
+# Способ получения обновлений: polling (long polling) или webhook.
+# В режиме webhook Telegram присылает обновления POST-запросом на WEBHOOK_PATH
+# того же health-сервера (порт PORT); WEBHOOK_URL - внешний адрес сервиса
+BOT_MODE = os.environ.get('BOT_MODE', 'polling').strip().lower()
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', os.environ.get('BASE_URL', '')).strip()
+WEBHOOK_PATH = '/' + os.environ.get('WEBHOOK_PATH', 'telegram-webhook').strip().strip('/')
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token; если не задан -
+# генерируется при запуске (webhook все равно регистрируется заново)
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+
+# Точечная пересинхронизация: Apps Script (триггер onEdit) или другой клиент
+# присылает POST /resync с заголовком Authorization: Bearer RESYNC_TOKEN и телом
+# {"sheet": "Reminders" | "Chat_Stats", "ids": [...], "rows": [...]}.
+# Без RESYNC_TOKEN endpoint выключен
+RESYNC_TOKEN = os.environ.get('RESYNC_TOKEN', '').strip()
+RESYNC_PATH = '/resync'
+RESYNC_MAX_ITEMS = 500
+
+# Этап запуска, после которого бот получает обновления
+UPDATES_STAGE = "webhook" if BOT_MODE == 'webhook' else "polling"
+
+# Updater запущенного бота (для проверок health-сервера)
+_updater = None
+
+def updates_running():
+    """Получает ли бот обновления: polling-поток (или webhook) и диспетчер работают"""
+    if _updater is None:
+        return False
+    if BOT_MODE == 'webhook':
+        return bool(_updater.dispatcher.running)
+    return bool(_updater.running and _updater.dispatcher.running)
+
+def check_liveness():
+    """
+    Возвращает (ok, проверки). До начала получения обновлений процесс считается
+    живым: перезапуск нужен только действительно зависшему экземпляру.
+    """
+    checks = {}
+    if _updater is None or startup_stages.status(UPDATES_STAGE) != "done":
+        return True, checks
+
+    checks[UPDATES_STAGE] = updates_running()
+    if reminder_scheduler is not None:
+        checks["scheduler"] = reminder_scheduler.is_running
+    else:
+        checks["scheduler"] = bool(_updater.job_queue.scheduler.running)
+
+    next_fire = upcoming_index.peek()
+    lag = (datetime.now(pytz.UTC) - next_fire).total_seconds() if next_fire else 0
+    checks["scheduler_lag"] = lag <= LIVENESS_MAX_LAG_SECONDS
+    return all(checks.values()), checks
+
+def check_readiness():
+    """Возвращает (ok, проверки): готов ли бот принимать команды и отправлять напоминания"""
+    checks = {
+        "stores_loaded": startup_stages.status("local_state") == "done",
+        "jobs_scheduled": startup_stages.status("schedule") == "done",
+        UPDATES_STAGE: updates_running(),
+    }
+    return all(checks.values()), checks
+
+SHEETS_CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def _register_metrics_gauges():
+    """Gauges для /metrics: только дешевые чтения без сетевых вызовов"""
+    metrics.gauge("subscribed_chats", lambda: chats_store.index("count"))
+    metrics.gauge("reminders", lambda: reminders_store.index("count"))
+    metrics.gauge("scheduled_reminders", lambda: count_scheduled_reminders(_updater.job_queue if _updater else None))
+    metrics.gauge("update_queue_depth", lambda: _updater.dispatcher.update_queue.qsize() if _updater else 0)
+    metrics.gauge("live_deliveries", lambda: _live_deliveries)
+    metrics.gauge("prepared_fanouts", lambda: len(_prepared_fanouts))
+    metrics.gauge("send_history_queue_depth",
+                  lambda: sheets_manager.send_history_queue_depth if sheets_manager else 0)
+    metrics.gauge("sheets_spool_depth",
+                  lambda: sheets_manager.spool_depth if sheets_manager else 0)
+    metrics.gauge("background_tasks_running", lambda: task_manager.count("running"))
+    metrics.gauge("background_tasks_queued", lambda: task_manager.count("queued"))
+    metrics.gauge("sheets_initialized", lambda: bool(sheets_manager and sheets_manager.is_initialized))
+    # 0 - цепь замкнута, 1 - пробный запрос, 2 - разомкнута (запросы к Sheets не выполняются)
+    metrics.gauge("sheets_circuit_state",
+                  lambda: SHEETS_CIRCUIT_STATES.get(sheets_manager.breaker.state, 0) if sheets_manager else 0)
+    # Сводка по методам SheetsManager (запросы к API, p95, 429 и паузы) - только в JSON;
+    # в Prometheus те же данные - sheets_api_requests_total, sheets_request_seconds,
+    # sheets_rate_limited_total и sheets_rate_limit_sleep_seconds
+    metrics.gauge("sheets_api", lambda: sheets_manager.api_stats() if sheets_manager else [])
+    metrics.gauge("startup", lambda: {
+        "complete": startup_stages.is_complete,
+        "total_seconds": startup_stages.total_seconds,
+        "stages": {name: {"status": stage_status, "seconds": seconds}
+                   for name, stage_status, seconds in startup_stages.snapshot()},
+    })
+
+class InstrumentedRequest(Request):
+    """Request Bot API с подсчетом запросов по методам, ответов 429 и ошибок по классам"""
+
+    def post(self, url, data, timeout=None):
+        method = url.rsplit('/', 1)[-1]
+        metrics.incr("bot_api_requests", method=method)
+        try:
+            return super().post(url, data, timeout=timeout)
+        except RetryAfter:
+            metrics.incr("bot_api_rate_limited", method=method)
+            raise
+        except TelegramError as e:
+            metrics.incr("bot_api_errors", method=method, error_class=type(e).__name__)
+            raise
+
+def instrument_handlers(dispatcher):
+    """Оборачивает callbacks зарегистрированных обработчиков в метрику handler (латентность по имени)"""
+    def wrap(handler):
+        if isinstance(handler, ConversationHandler):
+            nested = list(handler.entry_points) + list(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                nested.extend(state_handlers)
+            for nested_handler in nested:
+                wrap(nested_handler)
+        elif getattr(handler, 'callback', None) is not None:
+            handler.callback = metrics.timed("handler", handler=handler.callback.__name__)(handler.callback)
+
+    for handlers in dispatcher.handlers.values():
+        for handler in handlers:
+            wrap(handler)
+
 class HealthHandler(BaseHTTPRequestHandler):
+    def _route(self):
+        """Возвращает (код, тело, Content-Type)"""
+        path = self.path.split('?', 1)[0].rstrip('/') or '/'
+        if path == '/metrics':
+            return 200, metrics.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+        if path in ('/', '/healthz'):
+            ok, checks = check_liveness()
+            code, document = (200 if ok else 503), {"status": "ok" if ok else "fail", "checks": checks}
+        elif path == '/readyz':
+            ok, checks = check_readiness()
+            code, document = (200 if ok else 503), {"status": "ok" if ok else "fail", "checks": checks}
+        elif path == '/metrics.json':
+            code, document = 200, metrics.snapshot()
+        else:
+            code, document = 404, {"status": "not found"}
+        return code, json.dumps(document, ensure_ascii=False, default=str), 'application/json; charset=utf-8'
+
+    def _respond(self, with_body):
+        try:
+            code, text, content_type = self._route()
+        except Exception as e:
+            logger.error(f"❌ Health endpoint error on {self.path}: {e}")
+            code, text, content_type = 500, json.dumps({"status": "error", "error": str(e)}), 'application/json; charset=utf-8'
+        body = text.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
     def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/plain')
+        self._respond(with_body=True)
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if BOT_MODE == 'webhook' and path == WEBHOOK_PATH:
+            code = self._accept_update()
+        elif RESYNC_TOKEN and path == RESYNC_PATH:
+            code = self._accept_resync()
+        else:
+            code = 404
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
         self.end_headers()
-        self.wfile.write(b'OK')
+
+    def _accept_update(self):
+        """Кладет обновление от Telegram в очередь диспетчера, возвращает HTTP код"""
+        token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            logger.warning(f"🚫 Webhook request with invalid secret token from {self.client_address[0]}")
+            return 403
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+        except Exception as e:
+            logger.warning(f"⚠️ Invalid webhook payload: {e}")
+            return 400
+        if not updates_running():
+            # Telegram повторит доставку, когда диспетчер запустится
+            return 503
+        update = Update.de_json(data, _updater.bot)
+        if update is None:
+            return 400
+        metrics.incr("webhook_updates")
+        _updater.update_queue.put(update)
+        return 200
+
+    def _accept_resync(self):
+        """Ставит измененные строки таблицы в очередь пересинхронизации, возвращает HTTP код"""
+        auth = self.headers.get('Authorization', '')
+        token = auth[len('Bearer '):] if auth.startswith('Bearer ') else ''
+        if not hmac.compare_digest(token, RESYNC_TOKEN):
+            logger.warning(f"🚫 Resync request with invalid token from {self.client_address[0]}")
+            return 403
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+            sheet = data.get('sheet', 'Reminders')
+            ids = list(data.get('ids') or [])
+            rows = [int(row) for row in data.get('rows') or []]
+        except Exception as e:
+            logger.warning(f"⚠️ Invalid resync payload: {e}")
+            return 400
+        if sheet not in ('Reminders', 'Chat_Stats') or not (ids or rows) or len(ids) + len(rows) > RESYNC_MAX_ITEMS:
+            return 400
+        if not updates_running():
+            return 503
+        metrics.incr("resync_requests", sheet=sheet)
+        request_resync(sheet, ids, rows)
+        logger.info(f"📨 Resync requested for {sheet}: ids={ids} rows={rows}")
+        return 202
 
     def do_HEAD(self):
         # Respond to health check HEAD requests
-        self.send_response(200)
-        self.end_headers()
+        self._respond(with_body=False)
+
+    def log_message(self, format, *args):
+        # Пробы идут постоянно - не засоряем stderr
+        logger.debug("Health server: " + format % args)
 
 def start_health_server():
     port = int(os.environ.get('PORT', 5000))
-    server = HTTPServer(('0.0.0.0', port), HealthHandler)
+    # Каждый запрос - в своем потоке: медленный клиент не блокирует пробы
+    server = ThreadingHTTPServer(('0.0.0.0', port), HealthHandler)
     server.serve_forever()
 
 # --- Глобальный файл напоминаний ---
 REMINDERS_FILE = "reminders.json"
+SUBSCRIBED_CHATS_FILE = "subscribed_chats.json"
+
+# ✅ Хранилища с блокировками и версиями: все read-modify-write идут через них,
+# поэтому потоки JobQueue и диспетчера не теряют изменения друг друга
+reminders_store = get_store(REMINDERS_FILE, indent=2, ensure_ascii=False)
+chats_store = get_store(SUBSCRIBED_CHATS_FILE)
+
+# Количество рабочих потоков диспетчера (обработчики команд)
+DISPATCHER_WORKERS = int(os.environ.get('DISPATCHER_WORKERS', 8))
+
+# Тяжелые операции команд (/clear_reminders, /restore_reminders) выполняются
+# фоновыми задачами: одновременно не больше BACKGROUND_TASK_WORKERS, остальные ждут в очереди
+BACKGROUND_TASK_WORKERS = int(os.environ.get('BACKGROUND_TASK_WORKERS', 2))
+task_manager = TaskManager(BACKGROUND_TASK_WORKERS)
+
+# Кому доставляются напоминания по умолчанию:
+# "all"  - всем подписанным чатам (исходное поведение бота),
+# "chat" - только чату-владельцу, в котором напоминание создано
+DEFAULT_REMINDER_AUDIENCE = os.environ.get('REMINDER_AUDIENCE', 'all').strip().lower()
+
+# Догоняющая отправка при запуске: напоминания, пропущенные за последние
+# CATCHUP_WINDOW_MINUTES минут простоя (0 - выключено), отправляются
+# по одному с паузой CATCHUP_INTERVAL_SECONDS
+CATCHUP_WINDOW_MINUTES = int(os.environ.get('CATCHUP_WINDOW_MINUTES', 120))
+CATCHUP_INTERVAL_SECONDS = float(os.environ.get('CATCHUP_INTERVAL_SECONDS', 2))
+
+# Разнос одновременных срабатываний: напоминания одной минуты сдвигаются
+# вперед не более чем на FIRE_SPREAD_SECONDS (0 - без сдвига), чтобы общая
+# рассылка не превышала FIRE_SPREAD_RATE сообщений в секунду
+FIRE_SPREAD_SECONDS = float(os.environ.get('FIRE_SPREAD_SECONDS', 30))
+FIRE_SPREAD_RATE = float(os.environ.get('FIRE_SPREAD_RATE', 10))
+
+# За сколько секунд до срабатывания готовить рассылку (получатели, тексты, соединение)
+PREPARE_LEAD_SECONDS = float(os.environ.get('PREPARE_LEAD_SECONDS', 5))
+
+# Время последней отправки копится и пишется в локальное хранилище одной
+# транзакцией не чаще раза в LAST_SENT_FLUSH_SECONDS, а не на каждое срабатывание
+LAST_SENT_FLUSH_SECONDS = float(os.environ.get('LAST_SENT_FLUSH_SECONDS', 5))
 
 logging.basicConfig(
     format="%(asctime)s — %(levelname)s — %(message)s",
@@ -107,19 +433,15 @@ def error_handler(update: Update, context: CallbackContext):
     logger.error("❌ Uncaught exception:", exc_info=context.error)
 
 def subscribe_chat(chat_id, chat_name="Unknown", chat_type="private", members_count=None):
-    try:
-        with open("subscribed_chats.json", "r") as f:
-            data = f.read().strip()
-            chats = json.loads(data) if data else []
-    except (FileNotFoundError, json.JSONDecodeError):
-        chats = []
-
-    # Проверяем, является ли чат новым
-    is_new_chat = chat_id not in chats
+    remember_chat_type(chat_id, chat_type)
+    # Проверяем и добавляем чат в одной транзакции
+    with chats_store.transaction() as tx:
+        is_new_chat = chat_id not in tx.data
+        if is_new_chat:
+            tx.data.append(chat_id)
+        chats = list(tx.data)
     
     if is_new_chat:
-        chats.append(chat_id)
-        save_chats(chats)
         logger.info(f"🆕 New chat subscribed: {chat_id} ({chat_name})")
         
         # ✅ МГНОВЕННАЯ ЗАПИСЬ В GOOGLE SHEETS
@@ -164,9 +486,13 @@ def subscribe_chat(chat_id, chat_name="Unknown", chat_type="private", members_co
             logger.warning(f"📵 Google Sheets not initialized - chat {chat_id} info not updated")
             logger.warning("   Check GOOGLE_SHEETS_ID and GOOGLE_SHEETS_CREDENTIALS environment variables")
 
+def load_chats():
+    """Список подписанных чатов (пустой, если файла нет или он поврежден)"""
+    chats = chats_store.read()
+    return chats if isinstance(chats, list) else []
+
 def save_chats(chats):
-    with open("subscribed_chats.json", "w") as f:
-        json.dump(chats, f)
+    chats_store.write(chats)
 
 # Функция ping для предотвращения засыпания на Render
 def ping_self(context: CallbackContext):
@@ -280,6 +606,7 @@ def test(update: Update, context: CallbackContext):
 REMINDER_DATE, REMINDER_TEXT = range(2)
 DAILY_TIME, DAILY_TEXT = range(2)
 WEEKLY_DAY, WEEKLY_TIME, WEEKLY_TEXT = range(3)
+CUSTOM_RULE, CUSTOM_TEXT = range(2)
 REM_DEL_ID = 0
 
 # --- Вспомогательные функции для хранения напоминаний (глобальный список) ---
@@ -288,28 +615,22 @@ def load_reminders():
     Load reminders from the JSON file, returning an empty list if the file is missing,
     empty, or contains invalid JSON.
     """
-    try:
-        with open(REMINDERS_FILE, "r", encoding='utf-8') as f:
-            data = f.read().strip()
-            if not data:
-                return []
-            return json.loads(data)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    reminders = reminders_store.read()
+    return reminders if isinstance(reminders, list) else []
 
 def save_reminders(reminders):
     try:
-        with open(REMINDERS_FILE, "w", encoding='utf-8') as f:
-            json.dump(reminders, f, ensure_ascii=False, indent=2)
+        reminders_store.write(reminders)
     except Exception as e:
         logger.error(f"Error saving reminders: {e}")
 
-def get_next_reminder_id():
+def get_next_reminder_id(reminders=None):
     """
     Генерирует следующий ID для напоминания
     """
     try:
-        reminders = load_reminders()
+        if reminders is None:
+            reminders = load_reminders()
         if not reminders:
             return "1"
         
@@ -328,6 +649,83 @@ def get_next_reminder_id():
         logger.error(f"Error generating reminder ID: {e}")
         return "1"
 
+def _reminder_sort_key(reminder):
+    try:
+        return int(reminder.get("id", "0"))
+    except (TypeError, ValueError):
+        return 0
+
+def reminder_owner(reminder):
+    """ID чата-владельца напоминания строкой ("" - старые напоминания без владельца)"""
+    owner = reminder.get("chat_id")
+    return str(owner).strip() if owner not in (None, "", 0) else ""
+
+def reminder_audience(reminder):
+    return (reminder.get("audience") or DEFAULT_REMINDER_AUDIENCE).strip().lower()
+
+def get_reminder_recipients(reminder, chats):
+    """Чаты, которым доставляется напоминание, из списка подписанных чатов"""
+    owner = reminder_owner(reminder)
+    if reminder_audience(reminder) == "chat" and owner:
+        return [cid for cid in chats if str(cid) == owner]
+    return chats
+
+chats_store.add_index("count", len)
+
+def predicted_fanout(reminder):
+    """Ожидаемое число сообщений при срабатывании напоминания"""
+    if reminder_audience(reminder) == "chat" and reminder_owner(reminder):
+        return 1
+    return chats_store.index("count")
+
+def _build_reminders_by_chat(reminders):
+    """Индекс: ID чата -> его напоминания, отсортированные по ID"""
+    index = {}
+    for reminder in reminders:
+        index.setdefault(reminder_owner(reminder), []).append(reminder)
+    for bucket in index.values():
+        bucket.sort(key=_reminder_sort_key)
+    return index
+
+reminders_store.add_index("by_chat", _build_reminders_by_chat)
+reminders_store.add_index("count", len)
+
+def get_chat_reminders(chat_id):
+    """
+    Напоминания чата (собственные + старые без владельца), отсортированные по ID.
+    Между записями стоимость пропорциональна числу напоминаний этого чата: индекс
+    by_chat кешируется в хранилище. Первое чтение после любой записи перестраивает
+    его за O(всех напоминаний), а сама запись сериализует весь файл.
+    Возвращаемые словари разделяются с индексом - только для чтения.
+    """
+    index = reminders_store.index("by_chat")
+    own = index.get(str(chat_id), [])
+    shared = index.get("", [])
+    if not shared:
+        return list(own)
+    if not own:
+        return list(shared)
+    return list(heapq.merge(own, shared, key=_reminder_sort_key))
+
+def add_reminder(fields):
+    """
+    Атомарно выдает новый ID и добавляет напоминание в хранилище.
+    Возвращает сохраненное напоминание.
+    """
+    with reminders_store.transaction() as tx:
+        reminder = {"id": get_next_reminder_id(tx.data)}
+        reminder.update(fields)
+        tx.data.append(reminder)
+    return reminder
+
+def remove_reminders(reminder_ids):
+    """Атомарно удаляет напоминания с указанными ID, возвращает удаленные"""
+    ids = {str(rid) for rid in reminder_ids}
+    with reminders_store.transaction() as tx:
+        removed = [r for r in tx.data if str(r.get("id")) in ids]
+        tx.data[:] = [r for r in tx.data if str(r.get("id")) not in ids]
+    return removed
+
 # --- Обработчики добавления разового напоминания ---
 def start_add_one_reminder(update: Update, context: CallbackContext):
     try:
@@ -371,20 +769,22 @@ def receive_reminder_datetime(update: Update, context: CallbackContext):
 
 def receive_reminder_text(update: Update, context: CallbackContext):
     try:
-        reminders = load_reminders()
-        new_id = get_next_reminder_id()
         reminder_text = update.message.text_html if update.message.text_html else update.message.text.strip()
         
         # Безопасно обрабатываем HTML
         reminder_text = safe_html_escape(reminder_text)
         
-        reminders.append({
-            "id": new_id,
+        chat = update.effective_chat
+        new_reminder = add_reminder({
             "type": "once",
             "datetime": context.user_data["reminder_datetime"],
-            "text": reminder_text
+            "text": reminder_text,
+            "chat_id": chat.id,
+            "chat_name": chat.title if chat.title else f"@{chat.username}" if chat.username else str(chat.first_name or "Private"),
+            "username": update.effective_user.username or update.effective_user.first_name or "Unknown",
+            "created_at": get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
         })
-        save_reminders(reminders)
+        new_id = new_reminder["id"]
         
         # ✅ ИНТЕГРАЦИЯ С GOOGLE SHEETS
         if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
@@ -423,7 +823,7 @@ def receive_reminder_text(update: Update, context: CallbackContext):
             logger.warning("📵 Google Sheets not available for reminder sync")
         
         # Планируем напоминание
-        schedule_reminder(context.dispatcher.job_queue, reminders[-1])
+        schedule_reminder(context.dispatcher.job_queue, new_reminder)
         
         try:
             update.message.reply_text(
@@ -471,18 +871,20 @@ def receive_daily_time(update: Update, context: CallbackContext):
 
 def receive_daily_text(update: Update, context: CallbackContext):
     try:
-        reminders = load_reminders()
-        new_id = get_next_reminder_id()
         reminder_text = update.message.text_html if update.message.text_html else update.message.text.strip()
         reminder_text = safe_html_escape(reminder_text)
         
-        reminders.append({
-            "id": new_id,
+        chat = update.effective_chat
+        new_reminder = add_reminder({
             "type": "daily",
             "time": context.user_data["daily_time"],
-            "text": reminder_text
+            "text": reminder_text,
+            "chat_id": chat.id,
+            "chat_name": chat.title if chat.title else f"@{chat.username}" if chat.username else str(chat.first_name or "Private"),
+            "username": update.effective_user.username or update.effective_user.first_name or "Unknown",
+            "created_at": get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
         })
-        save_reminders(reminders)
+        new_id = new_reminder["id"]
         
         # ✅ ИНТЕГРАЦИЯ С GOOGLE SHEETS
         if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
@@ -521,7 +923,7 @@ def receive_daily_text(update: Update, context: CallbackContext):
             logger.warning("📵 Google Sheets not available for daily reminder sync")
         
         # Планируем напоминание
-        schedule_reminder(context.dispatcher.job_queue, reminders[-1])
+        schedule_reminder(context.dispatcher.job_queue, new_reminder)
         
         try:
             update.message.reply_text(
@@ -561,8 +963,7 @@ def receive_weekly_day(update: Update, context: CallbackContext):
         return WEEKLY_DAY
     
     text = update.message.text.strip().lower()
-    days = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"]
-    if text not in days:
+    if text not in WEEKDAYS:
         try:
             update.message.reply_text("❌ <b>Некорректный день недели</b>\n\nВыберите один из:\nПонедельник, Вторник, Среда, Четверг, Пятница, Суббота, Воскресенье", parse_mode=ParseMode.HTML)
         except:
@@ -594,19 +995,21 @@ def receive_weekly_time(update: Update, context: CallbackContext):
 
 def receive_weekly_text(update: Update, context: CallbackContext):
     try:
-        reminders = load_reminders()
-        new_id = get_next_reminder_id()
         reminder_text = update.message.text_html if update.message.text_html else update.message.text.strip()
         reminder_text = safe_html_escape(reminder_text)
         
-        reminders.append({
-            "id": new_id,
+        chat = update.effective_chat
+        new_reminder = add_reminder({
             "type": "weekly",
             "day": context.user_data["weekly_day"],
             "time": context.user_data["weekly_time"],
-            "text": reminder_text
+            "text": reminder_text,
+            "chat_id": chat.id,
+            "chat_name": chat.title if chat.title else f"@{chat.username}" if chat.username else str(chat.first_name or "Private"),
+            "username": update.effective_user.username or update.effective_user.first_name or "Unknown",
+            "created_at": get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
         })
-        save_reminders(reminders)
+        new_id = new_reminder["id"]
         
         # ✅ ИНТЕГРАЦИЯ С GOOGLE SHEETS
         if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
@@ -646,7 +1049,7 @@ def receive_weekly_text(update: Update, context: CallbackContext):
             logger.warning("📵 Google Sheets not available for weekly reminder sync")
         
         # Планируем напоминание
-        schedule_reminder(context.dispatcher.job_queue, reminders[-1])
+        schedule_reminder(context.dispatcher.job_queue, new_reminder)
         
         try:
             update.message.reply_text(
@@ -664,10 +1067,117 @@ def receive_weekly_text(update: Update, context: CallbackContext):
         update.message.reply_text("❌ Ошибка при добавлении напоминания")
         return ConversationHandler.END
 
+# --- Обработчики добавления напоминания по правилу ---
+CUSTOM_RULE_HELP = (
+    "daily 09:00,18:00 — ежедневно\n"
+    "weekdays 09:00 — по будням\n"
+    "weekly пн,ср,пт 10:00 — по дням недели\n"
+    "monthly 1,15 12:00 — по числам месяца\n"
+    "every 3h 08:00 — каждые N часов\n"
+    "cron 0 9 * * 1-5 — выражение cron"
+)
+
+def start_add_custom_reminder(update: Update, context: CallbackContext):
+    current_time = get_moscow_time().strftime("%H:%M MSK")
+    try:
+        update.message.reply_text(f"🧭 <b>Напоминание по правилу</b>\n\nВведите правило расписания (московское время):\n{CUSTOM_RULE_HELP}\n\n<i>⏰ Сейчас: {current_time}</i>", parse_mode=ParseMode.HTML)
+    except:
+        update.message.reply_text(f"🧭 Напоминание по правилу\n\nВведите правило расписания (московское время):\n{CUSTOM_RULE_HELP}\n\n⏰ Сейчас: {current_time}")
+    return CUSTOM_RULE
+
+def receive_custom_rule(update: Update, context: CallbackContext):
+    text = update.message.text.strip() if update.message and update.message.text else ""
+    try:
+        recurrence = parse_rule(text)
+        first_fire = recurrence.next_after(get_moscow_time())
+        if first_fire is None:
+            raise RecurrenceError("правило не дает ни одного будущего срабатывания")
+    except RecurrenceError as e:
+        try:
+            update.message.reply_text(f"❌ <b>Некорректное правило:</b> {safe_html_escape(str(e))}\n\nПримеры:\n{CUSTOM_RULE_HELP}", parse_mode=ParseMode.HTML)
+        except:
+            update.message.reply_text(f"❌ Некорректное правило: {e}\n\nПримеры:\n{CUSTOM_RULE_HELP}")
+        return CUSTOM_RULE
+    
+    context.user_data["custom_rule"] = recurrence.rule
+    first_fire_str = first_fire.strftime("%Y-%m-%d %H:%M MSK")
+    try:
+        update.message.reply_text(f"✏️ <b>Текст напоминания</b>\n\n🧭 {recurrence.describe()}\n📅 Первое срабатывание: {first_fire_str}\n\nВведите текст (поддерживаются HTML теги и ссылки):", parse_mode=ParseMode.HTML)
+    except:
+        update.message.reply_text(f"✏️ Текст напоминания\n\n🧭 {recurrence.describe()}\n📅 Первое срабатывание: {first_fire_str}\n\nВведите текст:")
+    return CUSTOM_TEXT
+
+def receive_custom_text(update: Update, context: CallbackContext):
+    try:
+        reminder_text = update.message.text_html if update.message.text_html else update.message.text.strip()
+        reminder_text = safe_html_escape(reminder_text)
+        rule = context.user_data["custom_rule"]
+        
+        chat = update.effective_chat
+        chat_name = chat.title if chat.title else f"@{chat.username}" if chat.username else str(chat.first_name or "Private")
+        username = update.effective_user.username or update.effective_user.first_name or "Unknown"
+        new_reminder = add_reminder({
+            "type": "custom",
+            "rule": rule,
+            "text": reminder_text,
+            "chat_id": chat.id,
+            "chat_name": chat_name,
+            "username": username,
+            "created_at": get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        new_id = new_reminder["id"]
+        
+        # ✅ ИНТЕГРАЦИЯ С GOOGLE SHEETS (правило хранится в колонке Time_MSK)
+        if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
+            try:
+                sheets_manager.log_reminder_action("CREATE", update.effective_user.id, username, chat.id, f"Created custom reminder ({rule}): {reminder_text[:50]}...", new_id)
+                
+                reminder_data = {
+                    "id": new_id,
+                    "text": reminder_text,
+                    "time": rule,
+                    "type": "custom",
+                    "chat_id": chat.id,
+                    "chat_name": chat_name,
+                    "created_at": new_reminder["created_at"],
+                    "username": username
+                }
+                sheets_manager.sync_reminder(reminder_data, "CREATE")
+                sheets_manager.update_reminders_count(chat.id)
+                
+                logger.info(f"📊 Successfully synced custom reminder #{new_id} to Google Sheets")
+            except Exception as e:
+                logger.error(f"❌ Error syncing custom reminder to Google Sheets: {e}")
+        elif SHEETS_AVAILABLE and sheets_manager and not sheets_manager.is_initialized:
+            logger.warning(f"📵 Google Sheets not initialized - custom reminder #{new_id} not synced")
+        else:
+            logger.warning("📵 Google Sheets not available for custom reminder sync")
+        
+        # Планируем напоминание
+        schedule_reminder(context.dispatcher.job_queue, new_reminder)
+        
+        description = compile_reminder(new_reminder).describe()
+        try:
+            update.message.reply_text(
+                f"✅ <b>Напоминание #{new_id} добавлено</b>\n\n"
+                f"🧭 <i>{description} (MSK)</i>\n"
+                f"💬 {reminder_text}",
+                parse_mode=ParseMode.HTML
+            )
+        except:
+            update.message.reply_text(f"✅ Напоминание #{new_id} добавлено: {description} (MSK)")
+        
+        return ConversationHandler.END
+    except Exception as e:
+        logger.error(f"Error in receive_custom_text: {e}")
+        update.message.reply_text("❌ Ошибка при добавлении напоминания")
+        return ConversationHandler.END
+
 # --- Список напоминаний ---
 def list_reminders(update: Update, context: CallbackContext):
     try:
-        reminders = load_reminders()
+        # Только напоминания этого чата (уже отсортированы по ID в индексе)
+        reminders = get_chat_reminders(update.effective_chat.id)
         if not reminders:
             try:
                 update.message.reply_text("📭 <b>У вас нет активных напоминаний</b>", parse_mode=ParseMode.HTML)
@@ -677,9 +1187,6 @@ def list_reminders(update: Update, context: CallbackContext):
         
         lines = ["📋 Ваши напоминания:\n"]
         
-        # Сортируем по ID для удобства
-        reminders.sort(key=lambda x: int(x.get("id", "0")))
-        
         for i, r in enumerate(reminders, 1):
             try:
                 safe_text = safe_html_escape(r.get('text', ''))
@@ -689,6 +1196,8 @@ def list_reminders(update: Update, context: CallbackContext):
                     lines.append(f"{i}. [🔄 Ежедневно] {r['time']}\n💬 {safe_text}\n")
                 elif r["type"] == "weekly":
                     lines.append(f"{i}. [📆 Еженедельно] {r['day'].title()} {r['time']}\n💬 {safe_text}\n")
+                elif r["type"] == "custom":
+                    lines.append(f"{i}. [🧭 {compile_reminder(r).describe()}]\n💬 {safe_text}\n")
             except Exception as e:
                 logger.error(f"Error formatting reminder {i}: {e}")
                 lines.append(f"{i}. [Ошибка формата]\n")
@@ -733,7 +1242,7 @@ def list_reminders(update: Update, context: CallbackContext):
 # --- Удаление напоминания ---
 def start_delete_reminder(update: Update, context: CallbackContext):
     try:
-        reminders = load_reminders()
+        reminders = get_chat_reminders(update.effective_chat.id)
         if not reminders:
             try:
                 update.message.reply_text("📭 <b>У вас нет напоминаний для удаления</b>", parse_mode=ParseMode.HTML)
@@ -743,8 +1252,9 @@ def start_delete_reminder(update: Update, context: CallbackContext):
         
         lines = ["🗑 Выберите напоминание для удаления:\nВведите номер:\n"]
         
-        # Сортируем по ID для удобства
-        reminders.sort(key=lambda x: int(x.get("id", "0")))
+        # Запоминаем показанный список: номер из ответа пользователя указывает
+        # на этот ID, даже если список успеют изменить другие потоки
+        context.user_data["delete_candidates"] = [r.get("id") for r in reminders]
         
         for i, r in enumerate(reminders, 1):
             try:
@@ -758,6 +1268,8 @@ def start_delete_reminder(update: Update, context: CallbackContext):
                     lines.append(f"{i}. [🔄 Ежедневно] {r['time']}\n💬 {text_preview}")
                 elif r["type"] == "weekly":
                     lines.append(f"{i}. [📆 Еженедельно] {r['day'].title()} {r['time']}\n💬 {text_preview}")
+                elif r["type"] == "custom":
+                    lines.append(f"{i}. [🧭 {compile_reminder(r).describe()}]\n💬 {text_preview}")
             except Exception as e:
                 logger.error(f"Error formatting reminder for deletion {i}: {e}")
                 lines.append(f"{i}. [Ошибка формата]")
@@ -779,18 +1291,29 @@ def start_delete_reminder(update: Update, context: CallbackContext):
 def confirm_delete_reminder(update: Update, context: CallbackContext):
     try:
         reminder_number = int(update.message.text.strip())
-        reminders = load_reminders()
+        candidates = context.user_data.get("delete_candidates")
+        if candidates is None:
+            # Список не показывался в этой сессии - строим его так же, как start_delete_reminder
+            candidates = [r.get("id") for r in get_chat_reminders(update.effective_chat.id)]
         
-        if reminder_number < 1 or reminder_number > len(reminders):
+        if reminder_number < 1 or reminder_number > len(candidates):
             try:
-                update.message.reply_text("❌ <b>Неверный номер</b>\n\nВведите номер от 1 до " + str(len(reminders)), parse_mode=ParseMode.HTML)
+                update.message.reply_text("❌ <b>Неверный номер</b>\n\nВведите номер от 1 до " + str(len(candidates)), parse_mode=ParseMode.HTML)
             except:
-                update.message.reply_text(f"❌ Неверный номер\n\nВведите номер от 1 до {len(reminders)}")
+                update.message.reply_text(f"❌ Неверный номер\n\nВведите номер от 1 до {len(candidates)}")
             return REM_DEL_ID
         
-        # Сортируем по ID для удобства
-        reminders.sort(key=lambda x: int(x.get("id", "0")))
-        reminder_to_delete = reminders[reminder_number - 1]
+        # Удаляем атомарно по ID; если напоминание уже удалено другим потоком - сообщаем
+        removed = remove_reminders([candidates[reminder_number - 1]])
+        if not removed:
+            context.user_data.pop("delete_candidates", None)
+            try:
+                update.message.reply_text("⚠️ <b>Напоминание уже удалено</b>\n\nОбновите список командой /del_reminder", parse_mode=ParseMode.HTML)
+            except:
+                update.message.reply_text("⚠️ Напоминание уже удалено")
+            return ConversationHandler.END
+        reminder_to_delete = removed[0]
+        context.user_data.pop("delete_candidates", None)
         
         # ✅ СИНХРОНИЗАЦИЯ С GOOGLE SHEETS ПРИ УДАЛЕНИИ
         if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
@@ -807,10 +1330,10 @@ def confirm_delete_reminder(update: Update, context: CallbackContext):
                 reminder_data = {
                     "id": reminder_to_delete.get('id'),
                     "text": reminder_to_delete.get('text', ''),
-                    "time": reminder_to_delete.get('datetime') or reminder_to_delete.get('time', ''),
+                    "time": schedule_text(reminder_to_delete),
                     "type": reminder_to_delete.get('type', ''),
-                    "chat_id": chat_id,
-                    "chat_name": chat_name,
+                    "chat_id": reminder_to_delete.get('chat_id') or chat_id,
+                    "chat_name": reminder_to_delete.get('chat_name') or chat_name,
                     "created_at": reminder_to_delete.get('created_at', ''),
                     "username": reminder_to_delete.get('username', username),
                     "last_sent": reminder_to_delete.get('last_sent', ''),
@@ -820,8 +1343,8 @@ def confirm_delete_reminder(update: Update, context: CallbackContext):
                 # ВАЖНО: Используем действие "DELETE" для установки статуса "Deleted"
                 sheets_manager.sync_reminder(reminder_data, "DELETE")
                 
-                # Обновляем количество напоминаний для чата
-                sheets_manager.update_reminders_count(chat_id)
+                # Обновляем количество напоминаний для чата-владельца
+                sheets_manager.update_reminders_count(reminder_data["chat_id"])
                 
                 logger.info(f"📊 Successfully synced reminder #{reminder_to_delete.get('id')} deletion to Google Sheets (status: Deleted)")
                 
@@ -834,18 +1357,13 @@ def confirm_delete_reminder(update: Update, context: CallbackContext):
         else:
             logger.warning("📵 Google Sheets not available for reminder deletion sync")
         
-        # Удаляем напоминание из локального файла
-        all_reminders = load_reminders()
-        new_list = [r for r in all_reminders if r["id"] != reminder_to_delete["id"]]
-        save_reminders(new_list)
-        
         try:
             update.message.reply_text(f"✅ <b>Напоминание #{reminder_number} удалено</b>\n<i>Статус в Google Sheets изменен на Deleted</i>", parse_mode=ParseMode.HTML)
         except:
             update.message.reply_text(f"✅ Напоминание #{reminder_number} удалено")
         
-        # Перепланируем все напоминания
-        reschedule_all_reminders(context.dispatcher.job_queue)
+        # Снимаем удаленное напоминание с расписания
+        unschedule_reminder(context.dispatcher.job_queue, reminder_to_delete.get('id'))
         
     except ValueError:
         try:
@@ -859,412 +1377,344 @@ def confirm_delete_reminder(update: Update, context: CallbackContext):
     
     return ConversationHandler.END
 
+# --- Фоновые задачи тяжелых команд ---
+
+def task_cancel_markup(task):
+    """Кнопка отмены фоновой задачи"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⛔ Отменить", callback_data=f"task_cancel:{task.id}")]])
+
+def edit_task_message(bot, message, task, text, final=False):
+    """Обновляет сообщение о прогрессе задачи; пока задача идет - с кнопкой отмены"""
+    task.report(text.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', ''))
+    reply_markup = None if final else task_cancel_markup(task)
+    try:
+        bot.edit_message_text(
+            chat_id=message.chat_id,
+            message_id=message.message_id,
+            text=text,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup
+        )
+    except:
+        pass
+
+def start_background_command(update, context, kind, title, func, initial_text, key=None):
+    """
+    Запускает тяжелую часть команды фоновой задачей: поток диспетчера только
+    отправляет сообщение о прогрессе (с кнопкой отмены) и сразу освобождается.
+    func(task, progress_message) выполняется в пуле task_manager.
+    """
+    message_ready = threading.Event()
+    holder = {}
+
+    def run(task):
+        message_ready.wait()
+        func(task, holder["message"])
+
+    try:
+        task = task_manager.submit(kind, title, run, chat_id=update.effective_chat.id,
+                                   user_id=update.effective_user.id, key=key)
+    except TaskConflictError:
+        try:
+            update.message.reply_text(
+                f"⏳ <b>{title}: операция уже выполняется</b>\n\n"
+                f"Дождитесь завершения или отмените её: /tasks",
+                parse_mode=ParseMode.HTML
+            )
+        except:
+            update.message.reply_text(f"⏳ {title}: операция уже выполняется. Статус: /tasks")
+        return None
+
+    if task.status == "queued" and task_manager.count("running") >= task_manager.max_workers:
+        initial_text += "\n\n⏳ <i>В очереди: выполняются другие операции</i>"
+    try:
+        try:
+            holder["message"] = update.message.reply_text(initial_text, parse_mode=ParseMode.HTML,
+                                                          reply_markup=task_cancel_markup(task))
+        except:
+            clean_text = initial_text.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
+            holder["message"] = update.message.reply_text(clean_text, reply_markup=task_cancel_markup(task))
+    except Exception:
+        task.cancel()
+        raise
+    finally:
+        message_ready.set()
+    return task
+
+TASK_STATUS_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌", "cancelled": "⛔"}
+
+def list_tasks(update: Update, context: CallbackContext):
+    """Фоновые задачи этого чата: статус, прогресс и кнопки отмены"""
+    try:
+        tasks = task_manager.list(update.effective_chat.id)[-10:]
+        if not tasks:
+            try:
+                update.message.reply_text("📭 <b>Фоновых задач нет</b>", parse_mode=ParseMode.HTML)
+            except:
+                update.message.reply_text("📭 Фоновых задач нет")
+            return
+        
+        lines = ["🧵 <b>Фоновые задачи:</b>\n"]
+        buttons = []
+        for task in reversed(tasks):
+            line = f"{TASK_STATUS_ICONS.get(task.status, '•')} <b>#{task.id}</b> {html.escape(task.title)}"
+            if task.started_at is not None:
+                line += f" — {int(task.elapsed())}с"
+            if task.active and task.progress:
+                line += f"\n   <i>{html.escape(task.progress.splitlines()[0])}</i>"
+            if task.error:
+                line += f"\n   <i>{html.escape(task.error[:100])}</i>"
+            lines.append(line)
+            if task.active and not task.cancelled:
+                buttons.append([InlineKeyboardButton(f"⛔ Отменить #{task.id}", callback_data=f"task_cancel:{task.id}")])
+        
+        message = "\n".join(lines)
+        reply_markup = InlineKeyboardMarkup(buttons) if buttons else None
+        try:
+            update.message.reply_text(message, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+        except:
+            clean_message = message.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
+            update.message.reply_text(clean_message, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Error in list_tasks: {e}")
+        update.message.reply_text("❌ Ошибка получения списка задач")
+
+def handle_task_cancel_button(update: Update, context: CallbackContext):
+    """Обработчик кнопки отмены фоновой задачи"""
+    query = update.callback_query
+    try:
+        task_id = int(query.data.split(":", 1)[1])
+        task = task_manager.get(task_id)
+        if task is None or task.chat_id != query.message.chat_id:
+            query.answer("Задача не найдена")
+            return
+        if task_manager.cancel(task_id):
+            query.answer(f"Отмена задачи #{task_id}...")
+        else:
+            query.answer(f"Задача #{task_id} уже завершена")
+    except Exception as e:
+        logger.error(f"Error in handle_task_cancel_button: {e}")
+        try:
+            query.answer("Ошибка отмены задачи")
+        except:
+            pass
+
 # --- Очистка всех напоминаний ---
 def clear_reminders(update: Update, context: CallbackContext):
     try:
-        # Получаем все текущие напоминания перед удалением для синхронизации
-        all_reminders = load_reminders()
+        # Получаем все напоминания этого чата перед удалением для синхронизации
+        all_reminders = get_chat_reminders(update.effective_chat.id)
         reminders_count = len(all_reminders)
         
-        # ✅ СИНХРОНИЗАЦИЯ С GOOGLE SHEETS ПРИ МАССОВОМ УДАЛЕНИИ
-        if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized and all_reminders:
-            try:
-                chat_id = update.effective_chat.id
-                chat = update.effective_chat
-                chat_name = chat.title if chat.title else f"@{chat.username}" if chat.username else str(chat.first_name or "Private")
-                username = update.effective_user.username or update.effective_user.first_name or "Unknown"
-                
-                # Отправляем сообщение о начале операции
-                try:
-                    progress_message = update.message.reply_text(
-                        f"🔄 <b>Удаление всех напоминаний...</b>\n\n"
-                        f"📊 Обновление Google Sheets для {reminders_count} напоминаний...",
-                        parse_mode=ParseMode.HTML
-                    )
-                except:
-                    progress_message = update.message.reply_text(f"🔄 Удаление {reminders_count} напоминаний...")
-                
-                # Логируем начало массового удаления
-                sheets_manager.log_reminder_action("CLEAR_ALL", update.effective_user.id, username, chat_id, f"Started mass deletion of {reminders_count} reminders", "")
-                
-                # Синхронизируем каждое напоминание - устанавливаем статус "Deleted"
-                # Для больших количеств добавляем батчинг с перерывами
-                synced_count = 0
-                failed_count = 0
-                batch_size = 5  # Обрабатываем по 5 напоминаний за раз
-                batch_delay = 10.0  # 10 секунд между батчами
-                
-                for i, reminder in enumerate(all_reminders):
-                    try:
-                        # Проверяем, нужен ли перерыв между батчами
-                        if i > 0 and i % batch_size == 0:
-                            logger.info(f"📦 Completed batch {i//batch_size}, waiting {batch_delay}s before next batch...")
-                            
-                            # Обновляем сообщение о прогрессе между батчами
-                            try:
-                                context.bot.edit_message_text(
-                                    chat_id=progress_message.chat_id,
-                                    message_id=progress_message.message_id,
-                                    text=f"🔄 <b>Пауза между батчами...</b>\n\n"
-                                         f"✅ Обработано: {i}/{reminders_count}\n"
-                                         f"✅ Успешно: {synced_count}\n"
-                                         f"❌ Ошибки: {failed_count}\n\n"
-                                         f"⏱️ Ожидание {batch_delay}s...",
-                                    parse_mode=ParseMode.HTML
-                                )
-                            except:
-                                pass
-                            
-                            time.sleep(batch_delay)
-                        
-                        reminder_data = {
-                            "id": reminder.get('id'),
-                            "text": reminder.get('text', ''),
-                            "time": reminder.get('datetime') or reminder.get('time', ''),
-                            "type": reminder.get('type', ''),
-                            "chat_id": chat_id,
-                            "chat_name": chat_name,
-                            "created_at": reminder.get('created_at', ''),
-                            "username": reminder.get('username', username),
-                            "last_sent": reminder.get('last_sent', ''),
-                            "days_of_week": reminder.get('day', '') if reminder.get('type') == 'weekly' else reminder.get('days_of_week', '')
-                        }
-                        
-                        # ВАЖНО: Используем действие "DELETE" для установки статуса "Deleted"
-                        success = sheets_manager.sync_reminder(reminder_data, "DELETE")
-                        if success:
-                            synced_count += 1
-                        else:
-                            failed_count += 1
-                            logger.warning(f"⚠️ Failed to sync reminder #{reminder.get('id')} deletion")
-                        
-                        # Добавляем задержку между операциями для предотвращения rate limiting
-                        # Увеличиваем задержку до 1-2 секунд для соблюдения лимита 60 запросов/минуту
-                        if i < len(all_reminders) - 1:  # Не задерживаем после последнего
-                            # Прогрессивная задержка: больше времени для более поздних операций
-                            base_delay = 1.0  # Базовая задержка 1 секунда
-                            progressive_delay = (i % batch_size) * 0.2  # Дополнительная задержка внутри батча
-                            total_delay = base_delay + progressive_delay
-                            time.sleep(total_delay)
-                            logger.debug(f"⏱️ Waiting {total_delay:.1f}s before next sync operation ({i+2}/{len(all_reminders)})")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Error syncing reminder #{reminder.get('id')} deletion: {e}")
-                        failed_count += 1
-                        # Продолжаем даже если одно напоминание не синхронизировалось
-                
-                # Обновляем сообщение о прогрессе после синхронизации напоминаний
-                try:
-                    context.bot.edit_message_text(
-                        chat_id=progress_message.chat_id,
-                        message_id=progress_message.message_id,
-                        text=f"🔄 <b>Обновление статистики...</b>\n\n"
-                             f"✅ Напоминания: {synced_count}/{reminders_count}\n"
-                             f"❌ Ошибки: {failed_count}",
-                        parse_mode=ParseMode.HTML
-                    )
-                except:
-                    pass
-                
-                # Увеличенная задержка перед обновлением статистики
-                time.sleep(2.0)  # Увеличиваем с 0.5 до 2 секунд
-                
-                # Обновляем количество напоминаний для чата (должно стать 0)
-                count_update_success = sheets_manager.update_reminders_count(chat_id)
-                
-                # Финальное логирование
-                sheets_manager.log_reminder_action("CLEAR_ALL_COMPLETE", update.effective_user.id, username, chat_id, f"Completed mass deletion. Synced: {synced_count}/{reminders_count}, Failed: {failed_count}", "")
-                
-                logger.info(f"📊 Mass deletion summary: {synced_count}/{reminders_count} reminders synced, {failed_count} failed")
-                
-                # Обновляем сообщение о прогрессе
-                try:
-                    context.bot.edit_message_text(
-                        chat_id=progress_message.chat_id,
-                        message_id=progress_message.message_id,
-                        text=f"🔄 <b>Завершение удаления...</b>\n\n"
-                             f"✅ Google Sheets обновлен ({synced_count}/{reminders_count})"
-                             f"\n{'⚠️ Статистика чатов: ошибка обновления' if not count_update_success else '✅ Статистика чатов обновлена'}",
-                        parse_mode=ParseMode.HTML
-                    )
-                except:
-                    pass
-                
-            except Exception as e:
-                logger.error(f"❌ Error syncing mass deletion to Google Sheets: {e}")
-                # Продолжаем удаление даже если синхронизация не удалась
-        elif SHEETS_AVAILABLE and sheets_manager and not sheets_manager.is_initialized:
-            logger.warning(f"📵 Google Sheets not initialized - mass deletion of {reminders_count} reminders not synced")
-            logger.warning("   Check GOOGLE_SHEETS_ID and GOOGLE_SHEETS_CREDENTIALS environment variables")
-        elif not all_reminders:
+        if not all_reminders:
             logger.info("📭 No reminders to delete")
-        else:
-            logger.warning("📵 Google Sheets not available for mass deletion sync")
-        
-        # Удаляем все напоминания из локального файла
-        save_reminders([])
-        
-        # Останавливаем все задания
-        job_queue = context.dispatcher.job_queue
-        current_jobs = job_queue.jobs()
-        for job in current_jobs:
-            if hasattr(job, 'name') and job.name and job.name.startswith('reminder_'):
-                job.schedule_removal()
-        
-        # Финальное сообщение пользователю
-        if reminders_count > 0:
-            try:
-                # Если есть progress_message, обновляем его
-                if 'progress_message' in locals():
-                    # Формируем детальное сообщение с учетом успешности операций
-                    if 'synced_count' in locals() and 'failed_count' in locals():
-                        if failed_count == 0:
-                            final_text = f"🗑 <b>Все напоминания удалены ({reminders_count})</b>\n<i>✅ Статус всех напоминаний в Google Sheets изменен на Deleted</i>"
-                        else:
-                            final_text = f"🗑 <b>Напоминания удалены ({reminders_count})</b>\n<i>✅ Синхронизировано: {synced_count}/{reminders_count}\n⚠️ Ошибок синхронизации: {failed_count}</i>"
-                    else:
-                        final_text = f"🗑 <b>Все напоминания удалены ({reminders_count})</b>\n<i>⚠️ Google Sheets недоступен</i>"
-                    
-                    context.bot.edit_message_text(
-                        chat_id=progress_message.chat_id,
-                        message_id=progress_message.message_id,
-                        text=final_text,
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    update.message.reply_text(
-                        f"🗑 <b>Все напоминания удалены ({reminders_count})</b>\n"
-                        f"<i>Статус в Google Sheets изменен на Deleted</i>", 
-                        parse_mode=ParseMode.HTML
-                    )
-            except:
-                update.message.reply_text(f"🗑 Все напоминания удалены ({reminders_count})")
-        else:
             try:
                 update.message.reply_text("📭 <b>Напоминаний для удаления не найдено</b>", parse_mode=ParseMode.HTML)
             except:
                 update.message.reply_text("📭 Напоминаний для удаления не найдено")
-            
-    except Exception as e:
-        logger.error(f"Error in clear_reminders: {e}")
-        update.message.reply_text("❌ Ошибка при очистке напоминаний")
-
-# --- Восстановление напоминаний из Google Sheets ---
-def restore_reminders(update: Update, context: CallbackContext):
-    """Восстановление активных напоминаний из Google Sheets"""
-    try:
-        # Проверяем доступность Google Sheets
-        if not SHEETS_AVAILABLE or not sheets_manager:
-            try:
-                update.message.reply_text(
-                    "❌ <b>Google Sheets недоступен</b>\n\n"
-                    "📵 Интеграция с Google Sheets не настроена.\n"
-                    "Обратитесь к администратору для настройки.",
-                    parse_mode=ParseMode.HTML
-                )
-            except:
-                update.message.reply_text("❌ Google Sheets недоступен")
             return
         
-        if not sheets_manager.is_initialized:
+        # Локальное удаление до подключения к таблице вернула бы ближайшая автосинхронизация
+        if sheets_connecting():
+            reply_sheets_connecting(update)
+            return
+        
+        if not (SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized):
+            if SHEETS_AVAILABLE and sheets_manager:
+                logger.warning(f"📵 Google Sheets not initialized - mass deletion of {reminders_count} reminders not synced")
+                logger.warning("   Check GOOGLE_SHEETS_ID and GOOGLE_SHEETS_CREDENTIALS environment variables")
+            else:
+                logger.warning("📵 Google Sheets not available for mass deletion sync")
+            
+            # Без Google Sheets удаление только локальное - быстро, прямо в обработчике
+            removed = remove_reminders([r.get('id') for r in all_reminders])
+            for reminder in removed:
+                unschedule_reminder(context.dispatcher.job_queue, reminder.get('id'))
             try:
                 update.message.reply_text(
-                    "❌ <b>Google Sheets не инициализирован</b>\n\n"
-                    "🔧 Проверьте переменные окружения:\n"
-                    "• GOOGLE_SHEETS_ID\n"
-                    "• GOOGLE_SHEETS_CREDENTIALS",
+                    f"🗑 <b>Все напоминания удалены ({reminders_count})</b>\n<i>⚠️ Google Sheets недоступен</i>",
                     parse_mode=ParseMode.HTML
                 )
             except:
-                update.message.reply_text("❌ Google Sheets не инициализирован")
+                update.message.reply_text(f"🗑 Все напоминания удалены ({reminders_count})")
             return
         
-        # Отправляем сообщение о начале восстановления
-        try:
-            progress_message = update.message.reply_text(
-                "🔄 <b>Восстановление данных...</b>\n\n"
-                "📊 Получение данных из Google Sheets...\n"
-                "🔄 Восстановление напоминаний и чатов...",
-                parse_mode=ParseMode.HTML
-            )
-        except:
-            progress_message = update.message.reply_text("🔄 Восстановление данных...")
-        
-        # Получаем информацию о пользователе для логирования
         chat_id = update.effective_chat.id
+        chat = update.effective_chat
+        chat_name = chat.title if chat.title else f"@{chat.username}" if chat.username else str(chat.first_name or "Private")
         user_id = update.effective_user.id
         username = update.effective_user.username or update.effective_user.first_name or "Unknown"
+        job_queue = context.dispatcher.job_queue
         
-        # Логируем начало операции восстановления
-        if sheets_manager.is_initialized:
-            try:
-                moscow_time = get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
-                sheets_manager.log_operation(
-                    timestamp=moscow_time,
-                    action="RESTORE_ALL_START",
-                    user_id=str(user_id),
-                    username=username,
-                    chat_id=chat_id,
-                    details="Manual restore reminders and chats command initiated",
-                    reminder_id=""
-                )
-            except Exception as e:
-                logger.error(f"Error logging restore start: {e}")
+        def run_clear(task, progress_message):
+            clear_reminders_task(task, context.bot, job_queue, progress_message, all_reminders,
+                                 chat_id, chat_name, user_id, username)
         
-        # Обновляем сообщение о прогрессе
-        try:
-            context.bot.edit_message_text(
-                chat_id=progress_message.chat_id,
-                message_id=progress_message.message_id,
-                text="🔄 <b>Восстановление данных...</b>\n\n"
-                     "📱 Восстановление подписанных чатов...",
-                parse_mode=ParseMode.HTML
-            )
-        except:
-            pass
+        # ✅ СИНХРОНИЗАЦИЯ С GOOGLE SHEETS ПРИ МАССОВОМ УДАЛЕНИИ - в фоновой задаче
+        start_background_command(
+            update, context, "clear_reminders", "Удаление напоминаний", run_clear,
+            f"🔄 <b>Удаление всех напоминаний...</b>\n\n"
+            f"📊 Обновление Google Sheets для {reminders_count} напоминаний...",
+            key=f"clear_reminders:{chat_id}"
+        )
+            
+    except Exception as e:
+        logger.error(f"Error in clear_reminders: {e}")
+        update.message.reply_text("❌ Ошибка при очистке напоминаний")
+
+def clear_reminders_task(task, bot, job_queue, progress_message, all_reminders, chat_id, chat_name, user_id, username):
+    """
+    Фоновая часть /clear_reminders: помечает напоминания Deleted в Google Sheets
+    одним пакетным запросом (или откладывает статус в spool) и удаляет их локально.
+    Отмена до записи в Google Sheets оставляет напоминания нетронутыми. Если статус
+    Deleted не записан и не отложен, напоминания тоже остаются: иначе автосинхронизация
+    вернула бы их из таблицы, где они еще активны.
+    """
+    reminders_count = len(all_reminders)
+    synced_count = 0
+    deferred_count = 0
+    failed_count = 0
+    marked = False
+    
+    try:
+        # Логируем начало массового удаления
+        sheets_manager.log_reminder_action("CLEAR_ALL", user_id, username, chat_id, f"Started mass deletion of {reminders_count} reminders", "")
+        task.check_cancelled()
+        
+        reminders_data = [
+            {
+                "id": reminder.get('id'),
+                "text": reminder.get('text', ''),
+                "time": schedule_text(reminder),
+                "type": reminder.get('type', ''),
+                "chat_id": reminder.get('chat_id') or chat_id,
+                "chat_name": reminder.get('chat_name') or chat_name,
+                "created_at": reminder.get('created_at', ''),
+                "username": reminder.get('username', username),
+                "last_sent": reminder.get('last_sent', ''),
+                "days_of_week": reminder.get('day', '') if reminder.get('type') == 'weekly' else reminder.get('days_of_week', '')
+            }
+            for reminder in all_reminders
+        ]
+        
+        # Статус "Deleted" для всех напоминаний - одно чтение листа и одна пакетная запись
+        marked, updated, appended, deferred_count = sheets_manager.mark_reminders_deleted(reminders_data)
+        if not marked:
+            failed_count = reminders_count
+            logger.warning(f"⚠️ Failed to sync deletion of {reminders_count} reminders, keeping them locally")
+        else:
+            synced_count = reminders_count - deferred_count
+            if deferred_count:
+                logger.warning(f"📦 Deletion of {deferred_count} reminders deferred to the Google Sheets spool")
+        
+        # Обновляем сообщение о прогрессе после синхронизации напоминаний
+        edit_task_message(
+            bot, progress_message, task,
+            f"🔄 <b>Обновление статистики...</b>\n\n"
+            f"✅ Напоминания: {synced_count}/{reminders_count}\n"
+            f"⏳ Отложено: {deferred_count}\n"
+            f"❌ Ошибки: {failed_count}"
+        )
         
-        # ДОПОЛНИТЕЛЬНО: Восстанавливаем подписанные чаты
-        chats_restored = False
-        chats_count = 0
-        chats_message = ""
+        # Обновляем количество напоминаний для чата (должно стать 0)
+        count_update_success = sheets_manager.update_reminders_count(chat_id)
+        if count_update_success is False:
+            logger.warning("⚠️ Chat stats reminders count was not updated")
         
-        try:
-            success_chats = sheets_manager.restore_subscribed_chats_file()
-            if success_chats:
-                # Получаем количество восстановленных чатов
-                try:
-                    with open("subscribed_chats.json", "r") as f:
-                        restored_chats = json.load(f)
-                        chats_count = len(restored_chats)
-                        chats_restored = True
-                        chats_message = f"Восстановлено чатов: {chats_count}"
-                        logger.info(f"✅ Successfully restored {chats_count} chats for user {username}")
-                except:
-                    chats_message = "Чаты восстановлены (количество не определено)"
-                    chats_restored = True
-            else:
-                chats_message = "Чаты не восстановлены (возможно, список пуст в Google Sheets)"
-                logger.warning(f"⚠️ Failed to restore chats for user {username}")
-        except Exception as e:
-            chats_message = f"Ошибка восстановления чатов: {str(e)}"
-            logger.error(f"❌ Error restoring chats for user {username}: {e}")
+        # Финальное логирование
+        sheets_manager.log_reminder_action("CLEAR_ALL_COMPLETE", user_id, username, chat_id, f"Completed mass deletion. Synced: {synced_count}/{reminders_count}, Deferred: {deferred_count}, Failed: {failed_count}", "")
         
-        # Обновляем сообщение о прогрессе
-        try:
-            context.bot.edit_message_text(
-                chat_id=progress_message.chat_id,
-                message_id=progress_message.message_id,
-                text="🔄 <b>Восстановление данных...</b>\n\n"
-                     "📋 Восстановление напоминаний...",
-                parse_mode=ParseMode.HTML
-            )
-        except:
-            pass
+        logger.info(f"📊 Mass deletion summary: {synced_count}/{reminders_count} reminders synced, {deferred_count} deferred, {failed_count} failed")
         
-        # Восстанавливаем напоминания
-        success, message = sheets_manager.restore_reminders_from_sheets()
+    except TaskCancelled:
+        logger.info(f"🛑 Mass deletion of {reminders_count} reminders cancelled before Google Sheets update")
+        edit_task_message(bot, progress_message, task,
+                          "⛔ <b>Удаление отменено</b>\n<i>Напоминания сохранены</i>", final=True)
+        return
+    except Exception as e:
+        logger.error(f"❌ Error syncing mass deletion to Google Sheets: {e}")
+        if not marked:
+            failed_count = reminders_count
+        # Статус Deleted уже записан или отложен - удаление продолжается
+    
+    if not marked:
+        edit_task_message(
+            bot, progress_message, task,
+            f"❌ <b>Не удалось удалить напоминания</b>\n\n"
+            f"Google Sheets не принял изменения, напоминания ({reminders_count}) сохранены.\n"
+            f"<i>Повторите /clear_reminders позже</i>",
+            final=True
+        )
+        return
+    
+    # Удаляем из локального файла именно те напоминания, что были очищены
+    # (созданные во время синхронизации с Google Sheets не теряются)
+    removed = remove_reminders([r.get('id') for r in all_reminders])
+    
+    # Останавливаем задания удаленных напоминаний
+    for reminder in removed:
+        unschedule_reminder(job_queue, reminder.get('id'))
+    
+    # Финальное сообщение пользователю
+    if deferred_count == 0:
+        final_text = f"🗑 <b>Все напоминания удалены ({reminders_count})</b>\n<i>✅ Статус всех напоминаний в Google Sheets изменен на Deleted</i>"
+    else:
+        final_text = (f"🗑 <b>Все напоминания удалены ({reminders_count})</b>\n"
+                      f"<i>⏳ Google Sheets временно недоступен: статус Deleted ({deferred_count}) будет записан автоматически</i>")
+    edit_task_message(bot, progress_message, task, final_text, final=True)
+
+# --- Восстановление напоминаний из Google Sheets ---
+def restore_reminders(update: Update, context: CallbackContext):
+    """Восстановление активных напоминаний из Google Sheets"""
+    try:
+        if sheets_connecting():
+            reply_sheets_connecting(update)
+            return
         
-        if success:
-            # Перепланируем все напоминания
-            reschedule_all_reminders(context.dispatcher.job_queue)
-            
-            # Получаем количество восстановленных напоминаний
+        # Проверяем доступность Google Sheets
+        if not SHEETS_AVAILABLE or not sheets_manager:
             try:
-                restored_reminders = load_reminders()
-                count = len(restored_reminders)
-                
-                # Подсчитываем по типам
-                once_count = sum(1 for r in restored_reminders if r.get('type') == 'once')
-                daily_count = sum(1 for r in restored_reminders if r.get('type') == 'daily')
-                weekly_count = sum(1 for r in restored_reminders if r.get('type') == 'weekly')
-                
-                # Формируем итоговое сообщение
-                final_message = (
-                    f"✅ <b>Восстановление завершено успешно!</b>\n\n"
-                    f"📋 <b>Восстановлено напоминаний: {count}</b>\n"
-                    f"📅 Разовых: {once_count}\n"
-                    f"🔄 Ежедневных: {daily_count}\n"
-                    f"📆 Еженедельных: {weekly_count}\n\n"
-                    f"📱 <b>Подписанные чаты:</b>\n"
-                    f"{'✅ ' + chats_message if chats_restored else '⚠️ ' + chats_message}\n\n"
-                    f"⏰ Все напоминания перепланированы и активны!\n"
-                    f"<i>Команды: /list_reminders для просмотра</i>"
+                update.message.reply_text(
+                    "❌ <b>Google Sheets недоступен</b>\n\n"
+                    "📵 Интеграция с Google Sheets не настроена.\n"
+                    "Обратитесь к администратору для настройки.",
+                    parse_mode=ParseMode.HTML
                 )
-                
-                try:
-                    context.bot.edit_message_text(
-                        chat_id=progress_message.chat_id,
-                        message_id=progress_message.message_id,
-                        text=final_message,
-                        parse_mode=ParseMode.HTML
-                    )
-                except:
-                    # Fallback без HTML
-                    clean_message = (
-                        f"✅ Восстановление завершено успешно!\n\n"
-                        f"📋 Восстановлено напоминаний: {count}\n"
-                        f"📅 Разовых: {once_count}\n"
-                        f"🔄 Ежедневных: {daily_count}\n"
-                        f"📆 Еженедельных: {weekly_count}\n\n"
-                        f"📱 Подписанные чаты:\n"
-                        f"{chats_message}\n\n"
-                        f"⏰ Все напоминания перепланированы и активны!"
-                    )
-                    update.message.reply_text(clean_message)
-                
-                logger.info(f"✅ Successfully restored {count} reminders and {chats_count if chats_restored else 0} chats for user {username} (ID: {user_id})")
-                
-            except Exception as e:
-                logger.error(f"Error getting restored data count: {e}")
-                try:
-                    context.bot.edit_message_text(
-                        chat_id=progress_message.chat_id,
-                        message_id=progress_message.message_id,
-                        text=f"✅ <b>Восстановление завершено!</b>\n\n"
-                             f"📋 {message}\n"
-                             f"📱 {chats_message}",
-                        parse_mode=ParseMode.HTML
-                    )
-                except:
-                    update.message.reply_text(f"✅ Восстановление завершено!\n\n📋 {message}\n📱 {chats_message}")
+            except:
+                update.message.reply_text("❌ Google Sheets недоступен")
+            return
         
-        else:
-            # Ошибка восстановления напоминаний
+        if not sheets_manager.is_initialized:
             try:
-                context.bot.edit_message_text(
-                    chat_id=progress_message.chat_id,
-                    message_id=progress_message.message_id,
-                    text=f"❌ <b>Ошибка восстановления напоминаний</b>\n\n"
-                         f"📋 {message}\n\n"
-                         f"📱 <b>Подписанные чаты:</b>\n"
-                         f"{'✅ ' + chats_message if chats_restored else '⚠️ ' + chats_message}\n\n"
-                         f"💡 <i>Попробуйте:</i>\n"
-                         f"• Проверить доступ к Google Sheets\n"
-                         f"• Убедиться, что в листе есть активные напоминания\n"
-                         f"• Обратиться к администратору",
+                update.message.reply_text(
+                    "❌ <b>Google Sheets не инициализирован</b>\n\n"
+                    "🔧 Проверьте переменные окружения:\n"
+                    "• GOOGLE_SHEETS_ID\n"
+                    "• GOOGLE_SHEETS_CREDENTIALS",
                     parse_mode=ParseMode.HTML
                 )
             except:
-                update.message.reply_text(f"❌ Ошибка восстановления напоминаний\n\n📋 {message}\n📱 {chats_message}")
-            
-            logger.error(f"❌ Failed to restore reminders for user {username}: {message}")
+                update.message.reply_text("❌ Google Sheets не инициализирован")
+            return
+        
+        # Получаем информацию о пользователе для логирования
+        chat_id = update.effective_chat.id
+        user_id = update.effective_user.id
+        username = update.effective_user.username or update.effective_user.first_name or "Unknown"
+        job_queue = context.dispatcher.job_queue
+        
+        def run_restore(task, progress_message):
+            restore_reminders_task(task, context.bot, job_queue, progress_message, chat_id, user_id, username)
+        
+        # Восстановление - сетевые вызовы Google Sheets, выполняется фоновой задачей
+        start_background_command(
+            update, context, "restore_reminders", "Восстановление данных", run_restore,
+            "🔄 <b>Восстановление данных...</b>\n\n"
+            "📊 Получение данных из Google Sheets...\n"
+            "🔄 Восстановление напоминаний и чатов...",
+            key="restore_reminders"
+        )
         
-        # Логируем завершение операции
-        if sheets_manager.is_initialized:
-            try:
-                moscow_time = get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
-                sheets_manager.log_operation(
-                    timestamp=moscow_time,
-                    action="RESTORE_ALL_COMPLETE",
-                    user_id=str(user_id),
-                    username=username,
-                    chat_id=chat_id,
-                    details=f"Manual restore {'successful' if success else 'failed'}: Reminders: {message}, Chats: {chats_message}",
-                    reminder_id=""
-                )
-            except Exception as e:
-                logger.error(f"Error logging restore completion: {e}")
-                
     except Exception as e:
         logger.error(f"Error in restore_reminders: {e}")
         try:
@@ -1276,58 +1726,209 @@ def restore_reminders(update: Update, context: CallbackContext):
         except:
             update.message.reply_text("❌ Критическая ошибка восстановления")
 
-# --- Следующее напоминание ---
-def next_notification(update: Update, context: CallbackContext):
+def restore_reminders_task(task, bot, job_queue, progress_message, chat_id, user_id, username):
+    """
+    Фоновая часть /restore_reminders: чаты и напоминания из Google Sheets.
+    Отмена срабатывает между этапами (один запрос к Google Sheets не прерывается).
+    """
     try:
-        reminders = load_reminders()
-        if not reminders:
+        restore_reminders_stages(task, bot, job_queue, progress_message, chat_id, user_id, username)
+    except TaskCancelled:
+        logger.info(f"🛑 Restore cancelled by user {username}")
+        edit_task_message(bot, progress_message, task,
+                          "⛔ <b>Восстановление отменено</b>\n<i>Уже восстановленные данные сохранены</i>",
+                          final=True)
+
+def restore_reminders_stages(task, bot, job_queue, progress_message, chat_id, user_id, username):
+    """Этапы восстановления с проверкой отмены между ними"""
+    # Логируем начало операции восстановления
+    if sheets_manager.is_initialized:
+        try:
+            moscow_time = get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
+            sheets_manager.log_operation(
+                timestamp=moscow_time,
+                action="RESTORE_ALL_START",
+                user_id=str(user_id),
+                username=username,
+                chat_id=chat_id,
+                details="Manual restore reminders and chats command initiated",
+                reminder_id=""
+            )
+        except Exception as e:
+            logger.error(f"Error logging restore start: {e}")
+    
+    # Обновляем сообщение о прогрессе
+    task.check_cancelled()
+    edit_task_message(
+        bot, progress_message, task,
+        "🔄 <b>Восстановление данных...</b>\n\n"
+        "📱 Восстановление подписанных чатов..."
+    )
+    
+    # ДОПОЛНИТЕЛЬНО: Восстанавливаем подписанные чаты
+    chats_restored = False
+    chats_count = 0
+    chats_message = ""
+    
+    # Оба листа читаются одним запросом, дальше восстановление работает с готовыми записями
+    views = sheets_manager.fetch_sheet_views() or {}
+
+    try:
+        success_chats = sheets_manager.restore_subscribed_chats_file(chat_rows=views.get('chats'))
+        if success_chats:
+            # Получаем количество восстановленных чатов
             try:
-                update.message.reply_text("📭 <b>Нет запланированных напоминаний</b>", parse_mode=ParseMode.HTML)
+                restored_chats = load_chats()
+                chats_count = len(restored_chats)
+                chats_restored = True
+                chats_message = f"Восстановлено чатов: {chats_count}"
+                logger.info(f"✅ Successfully restored {chats_count} chats for user {username}")
             except:
-                update.message.reply_text("📭 Нет запланированных напоминаний")
-            return
-        
-        now_moscow = get_moscow_time()
-        soonest = None
-        soonest_time = None
-        days = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"]
+                chats_message = "Чаты восстановлены (количество не определено)"
+                chats_restored = True
+        else:
+            chats_message = "Чаты не восстановлены (возможно, список пуст в Google Sheets)"
+            logger.warning(f"⚠️ Failed to restore chats for user {username}")
+    except Exception as e:
+        chats_message = f"Ошибка восстановления чатов: {str(e)}"
+        logger.error(f"❌ Error restoring chats for user {username}: {e}")
+    
+    # Обновляем сообщение о прогрессе
+    task.check_cancelled()
+    edit_task_message(
+        bot, progress_message, task,
+        "🔄 <b>Восстановление данных...</b>\n\n"
+        "📋 Восстановление напоминаний..."
+    )
+    
+    # Восстанавливаем напоминания
+    success, message = sheets_manager.restore_reminders_from_sheets(records=views.get('reminders'))
+    
+    if success:
+        # Перепланируем все напоминания
+        reschedule_all_reminders(job_queue)
         
-        for r in reminders:
-            t = None
-            if r["type"] == "once":
-                try:
-                    # Парсим как московское время
-                    naive_dt = datetime.strptime(r["datetime"], "%Y-%m-%d %H:%M")
-                    t = MOSCOW_TZ.localize(naive_dt)
-                    if t < now_moscow:  # Пропускаем прошедшие разовые напоминания
-                        continue
-                except ValueError:
-                    continue
-            elif r["type"] == "daily":
-                try:
-                    h, m = map(int, r["time"].split(":"))
-                    candidate = now_moscow.replace(hour=h, minute=m, second=0, microsecond=0)
-                    if candidate < now_moscow:
-                        candidate += timedelta(days=1)
-                    t = candidate
-                except ValueError:
-                    continue
-            elif r["type"] == "weekly":
-                try:
-                    weekday = days.index(r["day"])
-                    h, m = map(int, r["time"].split(":"))
-                    candidate = now_moscow.replace(hour=h, minute=m, second=0, microsecond=0)
-                    days_ahead = (weekday - now_moscow.weekday() + 7) % 7
-                    if days_ahead == 0 and candidate < now_moscow:
-                        days_ahead = 7
-                    t = candidate + timedelta(days=days_ahead)
-                except (ValueError, IndexError):
-                    continue
+        # Получаем количество восстановленных напоминаний
+        try:
+            restored_reminders = load_reminders()
+            count = len(restored_reminders)
+            
+            # Подсчитываем по типам
+            once_count = sum(1 for r in restored_reminders if r.get('type') == 'once')
+            daily_count = sum(1 for r in restored_reminders if r.get('type') == 'daily')
+            weekly_count = sum(1 for r in restored_reminders if r.get('type') == 'weekly')
+            custom_count = sum(1 for r in restored_reminders if r.get('type') == 'custom')
+            
+            # Формируем итоговое сообщение
+            final_message = (
+                f"✅ <b>Восстановление завершено успешно!</b>\n\n"
+                f"📋 <b>Восстановлено напоминаний: {count}</b>\n"
+                f"📅 Разовых: {once_count}\n"
+                f"🔄 Ежедневных: {daily_count}\n"
+                f"📆 Еженедельных: {weekly_count}\n"
+                f"🧭 По правилу: {custom_count}\n\n"
+                f"📱 <b>Подписанные чаты:</b>\n"
+                f"{'✅ ' + chats_message if chats_restored else '⚠️ ' + chats_message}\n\n"
+                f"⏰ Все напоминания перепланированы и активны!\n"
+                f"<i>Команды: /list_reminders для просмотра</i>"
+            )
+            
+            try:
+                bot.edit_message_text(
+                    chat_id=progress_message.chat_id,
+                    message_id=progress_message.message_id,
+                    text=final_message,
+                    parse_mode=ParseMode.HTML
+                )
+            except:
+                # Fallback без HTML
+                clean_message = (
+                    f"✅ Восстановление завершено успешно!\n\n"
+                    f"📋 Восстановлено напоминаний: {count}\n"
+                    f"📅 Разовых: {once_count}\n"
+                    f"🔄 Ежедневных: {daily_count}\n"
+                    f"📆 Еженедельных: {weekly_count}\n"
+                    f"🧭 По правилу: {custom_count}\n\n"
+                    f"📱 Подписанные чаты:\n"
+                    f"{chats_message}\n\n"
+                    f"⏰ Все напоминания перепланированы и активны!"
+                )
+                bot.send_message(chat_id=chat_id, text=clean_message)
+            
+            logger.info(f"✅ Successfully restored {count} reminders and {chats_count if chats_restored else 0} chats for user {username} (ID: {user_id})")
             
-            if t and (soonest_time is None or t < soonest_time):
-                soonest_time = t
-                soonest = r
+        except Exception as e:
+            logger.error(f"Error getting restored data count: {e}")
+            try:
+                bot.edit_message_text(
+                    chat_id=progress_message.chat_id,
+                    message_id=progress_message.message_id,
+                    text=f"✅ <b>Восстановление завершено!</b>\n\n"
+                         f"📋 {message}\n"
+                         f"📱 {chats_message}",
+                    parse_mode=ParseMode.HTML
+                )
+            except:
+                bot.send_message(chat_id=chat_id, text=f"✅ Восстановление завершено!\n\n📋 {message}\n📱 {chats_message}")
+    
+    else:
+        # Ошибка восстановления напоминаний
+        try:
+            bot.edit_message_text(
+                chat_id=progress_message.chat_id,
+                message_id=progress_message.message_id,
+                text=f"❌ <b>Ошибка восстановления напоминаний</b>\n\n"
+                     f"📋 {message}\n\n"
+                     f"📱 <b>Подписанные чаты:</b>\n"
+                     f"{'✅ ' + chats_message if chats_restored else '⚠️ ' + chats_message}\n\n"
+                     f"💡 <i>Попробуйте:</i>\n"
+                     f"• Проверить доступ к Google Sheets\n"
+                     f"• Убедиться, что в листе есть активные напоминания\n"
+                     f"• Обратиться к администратору",
+                parse_mode=ParseMode.HTML
+            )
+        except:
+            bot.send_message(chat_id=chat_id, text=f"❌ Ошибка восстановления напоминаний\n\n📋 {message}\n📱 {chats_message}")
         
+        logger.error(f"❌ Failed to restore reminders for user {username}: {message}")
+    
+    # Логируем завершение операции
+    if sheets_manager.is_initialized:
+        try:
+            moscow_time = get_moscow_time().strftime("%Y-%m-%d %H:%M:%S")
+            sheets_manager.log_operation(
+                timestamp=moscow_time,
+                action="RESTORE_ALL_COMPLETE",
+                user_id=str(user_id),
+                username=username,
+                chat_id=chat_id,
+                details=f"Manual restore {'successful' if success else 'failed'}: Reminders: {message}, Chats: {chats_message}",
+                reminder_id=""
+            )
+        except Exception as e:
+            logger.error(f"Error logging restore completion: {e}")
+
+# --- Следующее напоминание ---
+def _chat_upcoming_groups(chat_id):
+    """Группы индекса ближайших срабатываний, видимые чату: свои + старые без владельца"""
+    return (str(chat_id), "")
+
+def describe_reminder_schedule(reminder, fire_at_msk):
+    """Иконка и описание расписания напоминания для конкретного срабатывания"""
+    reminder_type = reminder.get("type")
+    if reminder_type == "daily":
+        return "🔄", f"Ежедневно: {fire_at_msk.strftime('%H:%M MSK')}"
+    if reminder_type == "weekly":
+        day = WEEKDAYS[fire_at_msk.weekday()].title()
+        return "📆", f"Еженедельно: {day} {fire_at_msk.strftime('%H:%M MSK')}"
+    if reminder_type == "custom":
+        return "🧭", f"{compile_reminder(reminder).describe()} (MSK)"
+    return "📅", f"Разово: {fire_at_msk.strftime('%Y-%m-%d %H:%M MSK')}"
+
+def next_notification(update: Update, context: CallbackContext):
+    try:
+        # Ближайшее срабатывание - голова списка чата в индексе, без перебора напоминаний
+        soonest = upcoming_index.head(_chat_upcoming_groups(update.effective_chat.id))
         if soonest is None:
             try:
                 update.message.reply_text("📭 <b>Нет запланированных напоминаний</b>", parse_mode=ParseMode.HTML)
@@ -1335,7 +1936,10 @@ def next_notification(update: Update, context: CallbackContext):
                 update.message.reply_text("📭 Нет запланированных напоминаний")
             return
         
-        time_diff = soonest_time - now_moscow
+        reminder, fire_at = soonest
+        now_moscow = get_moscow_time()
+        soonest_time = fire_at.astimezone(MOSCOW_TZ)
+        time_diff = max(soonest_time - now_moscow, timedelta(0))
         
         if time_diff.days > 0:
             time_str = f"через {time_diff.days} дн."
@@ -1348,18 +1952,10 @@ def next_notification(update: Update, context: CallbackContext):
         else:
             time_str = "менее чем через минуту"
         
-        safe_text = safe_html_escape(soonest.get('text', ''))
+        safe_text = safe_html_escape(reminder.get('text', ''))
         current_time = now_moscow.strftime("%H:%M MSK")
-        
-        if soonest["type"] == "once":
-            reminder_time = soonest_time.strftime("%Y-%m-%d %H:%M MSK")
-            msg = f"📅 <b>Ближайшее напоминание</b>\n\n🕐 Разово: {reminder_time}\n⏰ {time_str}\n💬 {safe_text}\n\n<i>Сейчас: {current_time}</i>"
-        elif soonest["type"] == "daily":
-            reminder_time = soonest_time.strftime("%H:%M MSK")
-            msg = f"🔄 <b>Ближайшее напоминание</b>\n\n🕐 Ежедневно: {reminder_time}\n⏰ {time_str}\n💬 {safe_text}\n\n<i>Сейчас: {current_time}</i>"
-        elif soonest["type"] == "weekly":
-            reminder_time = soonest_time.strftime("%H:%M MSK")
-            msg = f"📆 <b>Ближайшее напоминание</b>\n\n🕐 Еженедельно: {soonest['day'].title()} {reminder_time}\n⏰ {time_str}\n💬 {safe_text}\n\n<i>Сейчас: {current_time}</i>"
+        icon, schedule_str = describe_reminder_schedule(reminder, soonest_time)
+        msg = f"{icon} <b>Ближайшее напоминание</b>\n\n🕐 {schedule_str}\n⏰ {time_str}\n💬 {safe_text}\n\n<i>Сейчас: {current_time}</i>"
         
         try:
             update.message.reply_text(msg, parse_mode=ParseMode.HTML)
@@ -1372,6 +1968,91 @@ def next_notification(update: Update, context: CallbackContext):
         logger.error(f"Error in next_notification: {e}")
         update.message.reply_text("❌ Ошибка при поиске ближайшего напоминания")
 
+# --- Ближайшие срабатывания ---
+UPCOMING_DEFAULT = 10
+UPCOMING_PAGE_MAX = 25
+UPCOMING_TOTAL_MAX = 200
+
+def build_upcoming_page(chat_id, offset, count):
+    """
+    Текст и клавиатура страницы /upcoming: срабатывания offset..offset+count
+    (повторяющиеся напоминания попадают в список столько раз, сколько сработают).
+    """
+    firings = upcoming_index.firings(_chat_upcoming_groups(chat_id), offset + count + 1, next_fire_time)
+    page = firings[offset:offset + count]
+    if not page:
+        return "📭 <b>Нет запланированных напоминаний</b>", None
+    
+    lines = [f"🗓 <b>Ближайшие срабатывания ({offset + 1}–{offset + len(page)}):</b>\n"]
+    for number, (reminder, fire_at) in enumerate(page, offset + 1):
+        fire_at_msk = fire_at.astimezone(MOSCOW_TZ)
+        icon, _ = describe_reminder_schedule(reminder, fire_at_msk)
+        safe_text = safe_html_escape(reminder.get('text', ''))
+        if len(safe_text) > 100:
+            safe_text = safe_text[:100] + "..."
+        lines.append(f"{number}. {icon} {format_moscow_time(fire_at_msk)}\n💬 {safe_text}\n")
+    
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"upcoming:{max(offset - count, 0)}:{count}"))
+    if len(firings) > offset + count and offset + count < UPCOMING_TOTAL_MAX:
+        buttons.append(InlineKeyboardButton("Далее ▶️", callback_data=f"upcoming:{offset + count}:{count}"))
+    keyboard = InlineKeyboardMarkup([buttons]) if buttons else None
+    return "\n".join(lines), keyboard
+
+def upcoming_notifications(update: Update, context: CallbackContext):
+    """
+    Команда /upcoming N - следующие N срабатываний напоминаний этого чата.
+    """
+    try:
+        count = UPCOMING_DEFAULT
+        if context.args:
+            try:
+                count = int(context.args[0])
+            except ValueError:
+                update.message.reply_text("❌ Укажите число, например: /upcoming 10")
+                return
+        count = min(max(count, 1), UPCOMING_PAGE_MAX)
+        
+        text, keyboard = build_upcoming_page(update.effective_chat.id, 0, count)
+        try:
+            update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+        except:
+            clean_text = text.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
+            update.message.reply_text(clean_text, reply_markup=keyboard)
+            
+    except Exception as e:
+        logger.error(f"Error in upcoming_notifications: {e}")
+        update.message.reply_text("❌ Ошибка при загрузке ближайших напоминаний")
+
+def handle_upcoming_button(update: Update, context: CallbackContext):
+    """
+    Обработчик кнопок листания /upcoming (callback_data: upcoming:<offset>:<count>)
+    """
+    try:
+        query = update.callback_query
+        query.answer()
+        
+        _, offset, count = query.data.split(":")
+        offset = min(max(int(offset), 0), UPCOMING_TOTAL_MAX)
+        count = min(max(int(count), 1), UPCOMING_PAGE_MAX)
+        
+        text, keyboard = build_upcoming_page(query.message.chat_id, offset, count)
+        try:
+            query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+        except BadRequest as e:
+            # Страница не изменилась - Telegram отвечает "Message is not modified"
+            if "not modified" not in str(e).lower():
+                clean_text = text.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
+                query.edit_message_text(clean_text, reply_markup=keyboard)
+                
+    except Exception as e:
+        logger.error(f"Error in upcoming button handler: {e}")
+        try:
+            update.callback_query.answer("❌ Ошибка при загрузке страницы", show_alert=True)
+        except:
+            pass
+
 def cancel_reminder(update: Update, context: CallbackContext):
     """
     Отмена создания напоминания.
@@ -1385,32 +2066,107 @@ def cancel_reminder(update: Update, context: CallbackContext):
 # --- Scheduling helpers ---
 
 def send_reminder(context: CallbackContext):
+    """
+    Callback JobQueue: отправляет напоминание из context.job.context.
+    """
+    reminder = context.job.context
+    try:
+        deliver_live_reminder(context.bot, reminder)
+    finally:
+        _advance_reminder_job(context.job_queue, reminder, context.job)
+
+# Тип чата (private/group/...) по ID: get_chat не вызывается при каждой отправке
+_chat_types = {}
+_chat_types_lock = threading.Lock()
+
+def remember_chat_type(chat_id, chat_type):
+    if chat_type:
+        with _chat_types_lock:
+            _chat_types[str(chat_id)] = chat_type
+
+def get_chat_type(bot, chat_id):
+    """Тип чата из кэша; при промахе - один запрос get_chat (None, если не удалось)"""
+    with _chat_types_lock:
+        chat_type = _chat_types.get(str(chat_id))
+    if chat_type is not None:
+        return chat_type
+    try:
+        chat_type = bot.get_chat(chat_id).type
+    except Exception:
+        return None
+    remember_chat_type(chat_id, chat_type)
+    return chat_type
+
+# Прогрев соединения с Telegram перед рассылкой (не чаще раза в CONNECTION_WARM_INTERVAL секунд)
+CONNECTION_WARM_INTERVAL = 30
+_last_connection_warm = 0.0
+
+def warm_connection(bot):
+    global _last_connection_warm
+    now = time.monotonic()
+    if now - _last_connection_warm < CONNECTION_WARM_INTERVAL:
+        return
+    _last_connection_warm = now
+    try:
+        bot.get_me()
+    except Exception as e:
+        logger.warning(f"⚠️ Connection warm-up failed: {e}")
+
+def prepare_fanout(bot, reminder, fire_at=None, missed_at=None):
+    """
+    Подготовка рассылки: получатели, типы чатов, готовые тексты и прогретое
+    соединение. Вызывается заранее (за PREPARE_LEAD_SECONDS до срабатывания),
+    чтобы в момент срабатывания сразу начинать отправку.
+    None - подписанных чатов нет и восстановить их не удалось.
+    """
+    # Пытаемся загрузить чаты с автовосстановлением
+    chats = load_chats()
+    if not chats:
+        logger.warning("⚠️ Problem with subscribed_chats.json: missing, corrupted or empty")
+        logger.info("🔧 Attempting emergency restore...")
+        if ensure_subscribed_chats_file():
+            chats = load_chats()
+            logger.info(f"✅ Emergency restore successful, loaded {len(chats)} chats")
+        else:
+            logger.error("❌ Emergency restore failed, no reminders will be sent")
+            return None
+    
+    # Оставляем только получателей этого напоминания (все чаты или чат-владелец)
+    chats = get_reminder_recipients(reminder, chats)
+    
+    moscow_time = (fire_at or get_moscow_time()).astimezone(MOSCOW_TZ).strftime("%H:%M MSK")
+    reminder_text = f"🔔 <b>НАПОМИНАНИЕ</b> <i>({moscow_time})</i>\n\n{reminder.get('text', '')}"
+    if missed_at is not None:
+        moscow_time = get_moscow_time().strftime("%H:%M MSK")
+        planned_time = missed_at.astimezone(MOSCOW_TZ).strftime("%H:%M MSK")
+        reminder_text = (f"🔔 <b>НАПОМИНАНИЕ</b> <i>({moscow_time}, запланировано на {planned_time} — "
+                         f"доставлено с задержкой)</i>\n\n{reminder.get('text', '')}")
+    
+    # Если тип чата неизвестен, считаем что это личка (для безопасности)
+    private_chats = {cid for cid in chats if get_chat_type(bot, cid) in ('private', None)}
+    if chats:
+        warm_connection(bot)
+    
+    return {
+        "chats": chats,
+        "moscow_time": moscow_time,
+        "text": reminder_text,
+        "clean_text": reminder_text.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', ''),
+        "private_chats": private_chats,
+    }
+
+def deliver_reminder(bot, reminder, missed_at=None, prepared=None):
     """
     Отправляет текст напоминания всем подписанным чатам.
+    missed_at - плановое время пропущенного срабатывания (догоняющая отправка),
+    prepared - результат prepare_fanout, если рассылка подготовлена заранее.
     """
     try:
-        reminder = context.job.context
-        
-        # Пытаемся загрузить чаты с автовосстановлением
-        try:
-            with open("subscribed_chats.json", "r") as f:
-                chats = json.load(f)
-                if not chats or len(chats) == 0:
-                    raise ValueError("Empty chats list")
-        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-            logger.warning(f"⚠️ Problem with subscribed_chats.json: {e}")
-            logger.info("🔧 Attempting emergency restore...")
-            if ensure_subscribed_chats_file():
-                try:
-                    with open("subscribed_chats.json", "r") as f:
-                        chats = json.load(f)
-                    logger.info(f"✅ Emergency restore successful, loaded {len(chats)} chats")
-                except:
-                    logger.error("❌ Emergency restore failed, no reminders will be sent")
-                    return
-            else:
-                logger.error("❌ Emergency restore failed, no reminders will be sent")
+        if prepared is None:
+            prepared = prepare_fanout(bot, reminder, missed_at=missed_at)
+            if prepared is None:
                 return
+        chats = prepared["chats"]
         
         # 🆕 ОБРАБОТКА СЛУЧАЯ "НЕТ АКТИВНЫХ ЧАТОВ"
         if not chats or len(chats) == 0:
@@ -1447,9 +2203,7 @@ def send_reminder(context: CallbackContext):
                 updated_reminder['delivery_status'] = "No recipients available - auto-deleted"
                 
                 # Удаляем из локального файла
-                reminders = load_reminders()
-                reminders = [r for r in reminders if r.get("id") != reminder.get("id")]
-                save_reminders(reminders)
+                remove_reminders([reminder.get("id")])
                 logger.info(f"🗑️ One-time reminder #{reminder_id} auto-deleted: no recipients available")
                 
                 # 📊 СИНХРОНИЗИРУЕМ УДАЛЕНИЕ В GOOGLE SHEETS
@@ -1488,9 +2242,9 @@ def send_reminder(context: CallbackContext):
                 
             return  # Завершаем выполнение функции
         
-        moscow_time = get_moscow_time().strftime("%H:%M MSK")
+        moscow_time = prepared["moscow_time"]
         utc_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        reminder_text = f"🔔 <b>НАПОМИНАНИЕ</b> <i>({moscow_time})</i>\n\n{reminder.get('text', '')}"
+        reminder_text = prepared["text"]
         reminder_id = reminder.get('id', 'unknown')
         
         # 📊 Логируем начало отправки в Google Sheets
@@ -1512,6 +2266,7 @@ def send_reminder(context: CallbackContext):
             logger.warning(f"📵 Google Sheets not initialized - reminder #{reminder_id} sending start not logged")
         
         # Отправляем каждому чату
+        fanout_started = time.monotonic()
         total_sent = 0
         total_failed = 0
         blocked_chats = []  # 🆕 Список заблокированных чатов для удаления
@@ -1521,21 +2276,14 @@ def send_reminder(context: CallbackContext):
             error_details = ""
             
             try:
-                # 🆕 Определяем тип чата для INLINE кнопки
-                try:
-                    chat_info = context.bot.get_chat(cid)
-                    is_private_chat = chat_info.type == 'private'
-                except:
-                    # Если не можем получить информацию о чате, считаем что это личка (для безопасности)
-                    is_private_chat = True
-                
-                # 🆕 Создаем INLINE кнопку "Отписаться" только для личных чатов
+                # 🆕 Создаем INLINE кнопку "Отписаться" только для личных чатов (тип чата из подготовки)
+                is_private_chat = cid in prepared["private_chats"]
                 reply_markup = None
                 if is_private_chat:
                     keyboard = [[InlineKeyboardButton("🚫 Отписаться от бота", callback_data="unsubscribe")]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
                 
-                context.bot.send_message(
+                bot.send_message(
                     chat_id=cid, 
                     text=reminder_text, 
                     parse_mode=ParseMode.HTML,
@@ -1561,18 +2309,12 @@ def send_reminder(context: CallbackContext):
                     delivery_status = "BLOCKED_AUTO_REMOVE"
                     error_details = f"Auto-removed due to: {error_str}"
                     total_failed += 1
+                    metrics.incr("message_failures", error_class=type(e).__name__)
                     continue  # Пропускаем fallback для заблокированных чатов
                 
                 # Fallback без HTML для остальных ошибок
                 try:
-                    clean_text = reminder_text.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
-                    
-                    # Определяем тип чата для fallback
-                    try:
-                        chat_info = context.bot.get_chat(cid)
-                        is_private_chat = chat_info.type == 'private'
-                    except:
-                        is_private_chat = True
+                    clean_text = prepared["clean_text"]
                     
                     # Создаем INLINE кнопку для fallback
                     reply_markup = None
@@ -1580,7 +2322,7 @@ def send_reminder(context: CallbackContext):
                         keyboard = [[InlineKeyboardButton("🚫 Отписаться от бота", callback_data="unsubscribe")]]
                         reply_markup = InlineKeyboardMarkup(keyboard)
                     
-                    context.bot.send_message(
+                    bot.send_message(
                         chat_id=cid, 
                         text=clean_text,
                         reply_markup=reply_markup
@@ -1608,6 +2350,7 @@ def send_reminder(context: CallbackContext):
                         error_details = f"HTML failed: {str(e)}, Plain text failed: {str(e2)}"
                     
                     total_failed += 1
+                    metrics.incr("message_failures", error_class=type(e2).__name__)
             
             # 📊 Логируем каждую отправку в Google Sheets
             if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
@@ -1624,15 +2367,20 @@ def send_reminder(context: CallbackContext):
                 except Exception as e:
                     logger.error(f"❌ Error logging send to Google Sheets for chat {cid}: {e}")
         
+        metrics.observe("fanout", time.monotonic() - fanout_started, error=total_failed > 0)
+        metrics.incr("reminders_fired")
+        if missed_at is not None:
+            metrics.incr("reminders_replayed")
+        metrics.incr("messages_sent", total_sent)
+        metrics.incr("messages_failed", total_failed)
+        metrics.incr("chats_blocked", len(blocked_chats))
+        
         # 🆕 АВТОМАТИЧЕСКОЕ УДАЛЕНИЕ ЗАБЛОКИРОВАННЫХ ЧАТОВ
         if blocked_chats:
             logger.info(f"🚫 Processing {len(blocked_chats)} blocked chats for auto-removal")
             
-            # Обновляем локальный файл
-            updated_chats = [cid for cid in chats if cid not in blocked_chats]
-            save_chats(updated_chats)
-            
-            # Обновляем Google Sheets
+            # Удаляем из локального файла и Google Sheets: unsubscribe_user делает
+            # это транзакцией, поэтому чаты, подписанные во время рассылки, сохраняются
             for blocked_chat_id in blocked_chats:
                 try:
                     success, result = unsubscribe_user(blocked_chat_id, "BlockedUser", "AUTO_BLOCKED")
@@ -1679,9 +2427,7 @@ def send_reminder(context: CallbackContext):
             updated_reminder['delivery_status'] = f"Sent to {total_sent} chats, failed to {total_failed} chats, removed {len(blocked_chats)} blocked"
             
             # Удаляем из локального файла
-            reminders = load_reminders()
-            reminders = [r for r in reminders if r.get("id") != reminder.get("id")]
-            save_reminders(reminders)
+            remove_reminders([reminder.get("id")])
             logger.info(f"🗑️ One-time reminder #{reminder_id} removed from local storage after successful delivery")
             
             # 📊 СИНХРОНИЗИРУЕМ УДАЛЕНИЕ В GOOGLE SHEETS
@@ -1716,6 +2462,9 @@ def send_reminder(context: CallbackContext):
                 logger.warning(f"📵 Google Sheets not available - reminder #{reminder_id} removed locally only")
             
             logger.info(f"✅ One-time reminder #{reminder_id} processing completed: delivered and removed")
+        else:
+            # Повторяющееся напоминание: запоминаем отправку для догоняющей отправки после рестарта
+            record_last_sent(reminder_id, get_moscow_time().strftime("%Y-%m-%d %H:%M:%S"))
         
     except Exception as e:
         logger.error(f"❌ Critical error in send_reminder: {e}")
@@ -1737,58 +2486,133 @@ def send_reminder(context: CallbackContext):
             except:
                 pass  # Не логируем ошибку логирования, чтобы не создать бесконечный цикл
 
+def next_fire_time(reminder, after=None):
+    """
+    Следующее время срабатывания напоминания (MSK) строго после after.
+    None - напоминание больше не сработает (разовое в прошлом).
+    Расписание компилируется один раз (recurrence.compile_reminder) и общее
+    для планировщика, /next, /upcoming и догоняющей отправки.
+    """
+    return compile_reminder(reminder).next_after(after or get_moscow_time())
+
+# Планировщик на куче (создается в main); None - используются задания JobQueue
+reminder_scheduler = None
+SCHEDULER_BACKEND = os.environ.get('SCHEDULER_BACKEND', 'heap').strip().lower()
+
+# Индекс ближайших срабатываний по чатам-владельцам (для /next и /upcoming).
+# Поддерживается обоими бэкендами и сдвигается после каждого срабатывания
+upcoming_index = UpcomingIndex(group_key=reminder_owner)
+
 def schedule_reminder(job_queue, reminder):
     """
-    Добавляет задание в JobQueue для данного напоминания с учетом московского времени.
+    Планирует напоминание (или перепланирует, если оно уже запланировано).
+    """
+    if reminder_scheduler is None:
+        _schedule_reminder_job(job_queue, reminder)
+        return
+    
+    try:
+        fire_at = reminder_scheduler.schedule(reminder)
+        if fire_at:
+            logger.info(f"Scheduled {reminder.get('type')} reminder {reminder.get('id')} for {format_moscow_time(fire_at)}")
+        else:
+            logger.info(f"Reminder {reminder.get('id')} has no future fire time, not scheduled")
+    except Exception as e:
+        logger.error(f"Error scheduling reminder {reminder.get('id', 'unknown')}: {e}")
+
+def unschedule_reminder(job_queue, reminder_id):
+    """Снимает напоминание с расписания"""
+    if reminder_scheduler is not None:
+        reminder_scheduler.unschedule(reminder_id)
+        return
+    
+    _cancel_reminder_job(reminder_id)
+
+def count_scheduled_reminders(job_queue):
+    """Количество запланированных напоминаний"""
+    if reminder_scheduler is not None:
+        return len(reminder_scheduler)
+    with _reminder_jobs_lock:
+        return len(_reminder_jobs)
+
+def get_scheduled_reminders(job_queue, limit=None):
+    """
+    Запланированные напоминания: [(reminder_id, next_run)] в порядке срабатывания,
+    next_run - aware datetime или None, если время недоступно.
+    """
+    if reminder_scheduler is not None:
+        return reminder_scheduler.entries(limit)
+    
+    with _reminder_jobs_lock:
+        jobs = list(_reminder_jobs.items())
+    
+    scheduled = []
+    for reminder_id, job in jobs:
+        try:
+            next_run = job.next_t
+        except Exception:
+            next_run = None
+        scheduled.append((reminder_id, next_run))
+    far_future = datetime.max.replace(tzinfo=pytz.UTC)
+    scheduled.sort(key=lambda item: item[1] or far_future)
+    return scheduled[:limit] if limit is not None else scheduled
+
+# Реестр заданий JobQueue: ID напоминания -> живое задание (бэкенд jobqueue).
+# Отмена и замена задания - O(1) вместо перебора job_queue.jobs()
+_reminder_jobs = {}
+_reminder_jobs_lock = threading.Lock()
+
+def _register_reminder_job(reminder_id, job):
+    with _reminder_jobs_lock:
+        _reminder_jobs[str(reminder_id)] = job
+
+def _unregister_reminder_job(reminder_id, job=None):
+    """Убирает задание из реестра (если job указан - только если зарегистрировано именно оно)"""
+    with _reminder_jobs_lock:
+        current = _reminder_jobs.get(str(reminder_id))
+        if current is None or (job is not None and current is not job):
+            return None
+        return _reminder_jobs.pop(str(reminder_id))
+
+def _cancel_reminder_job(reminder_id):
+    job = _unregister_reminder_job(reminder_id)
+    upcoming_index.remove(reminder_id)
+    if job is not None and not job.removed:
+        job.schedule_removal()
+    return job is not None
+
+def _advance_reminder_job(job_queue, reminder, job):
+    """
+    После срабатывания задания ставит задание на следующее срабатывание
+    (разовое напоминание просто убирается из реестра и индекса).
+    """
+    reminder_id = str(reminder.get("id"))
+    with _reminder_jobs_lock:
+        # Напоминание могли удалить или перепланировать, пока шла отправка
+        if _reminder_jobs.get(reminder_id) is not job:
+            return
+        _reminder_jobs.pop(reminder_id)
+    _schedule_reminder_job(job_queue, reminder)
+
+def _schedule_reminder_job(job_queue, reminder):
+    """
+    Ставит задание JobQueue на следующее срабатывание напоминания
+    (бэкенд SCHEDULER_BACKEND=jobqueue). Время берется из общего
+    скомпилированного расписания, следующее задание ставится после срабатывания.
     """
     try:
         # Сначала удаляем существующее задание с таким же ID, если есть
-        current_jobs = job_queue.jobs()
-        for job in current_jobs:
-            if hasattr(job, 'name') and job.name == f"reminder_{reminder.get('id')}":
-                job.schedule_removal()
+        _cancel_reminder_job(reminder.get('id'))
         
-        if reminder["type"] == "once":
-            # Парсим как московское время и конвертируем в UTC для планировщика
-            moscow_dt = datetime.strptime(reminder["datetime"], "%Y-%m-%d %H:%M")
-            moscow_dt = MOSCOW_TZ.localize(moscow_dt)
-            utc_dt = moscow_dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            
-            if moscow_dt > get_moscow_time():  # Планируем только будущие напоминания
-                job_queue.run_once(send_reminder, utc_dt, context=reminder, name=f"reminder_{reminder.get('id')}")
-                logger.info(f"Scheduled one-time reminder {reminder.get('id')} for {moscow_dt.strftime('%Y-%m-%d %H:%M MSK')}")
-                
-        elif reminder["type"] == "daily":
-            h, m = map(int, reminder["time"].split(":"))
-            # Создаем время в московском часовом поясе, затем конвертируем в UTC
-            moscow_time = dt_time(hour=h, minute=m)
-            # Для ежедневных напоминаний нужно учесть смещение UTC
-            utc_hour = (h - 3) % 24  # MSK = UTC+3
-            utc_time = dt_time(hour=utc_hour, minute=m)
-            
-            job_queue.run_daily(send_reminder, utc_time, context=reminder, name=f"reminder_{reminder.get('id')}")
-            logger.info(f"Scheduled daily reminder {reminder.get('id')} for {h:02d}:{m:02d} MSK (UTC: {utc_hour:02d}:{m:02d})")
-            
-        elif reminder["type"] == "weekly":
-            days_map = {
-                "понедельник": 0, "вторник": 1, "среда": 2,
-                "четверг": 3, "пятница": 4, "суббота": 5, "воскресенье": 6
-            }
-            weekday = days_map[reminder["day"].lower()]
-            h, m = map(int, reminder["time"].split(":"))
-            
-            # Конвертируем московское время в UTC
-            utc_hour = (h - 3) % 24  # MSK = UTC+3
-            utc_time = dt_time(hour=utc_hour, minute=m)
-            
-            job_queue.run_daily(
-                send_reminder,
-                utc_time,
-                context=reminder,
-                days=(weekday,),
-                name=f"reminder_{reminder.get('id')}"
-            )
-            logger.info(f"Scheduled weekly reminder {reminder.get('id')} for {reminder['day']} {h:02d}:{m:02d} MSK")
+        fire_at = next_fire_time(reminder)
+        if fire_at is None:
+            logger.info(f"Reminder {reminder.get('id')} has no future fire time, not scheduled")
+            return
+        
+        job = job_queue.run_once(send_reminder, fire_at, context=reminder, name=f"reminder_{reminder.get('id')}")
+        _register_reminder_job(reminder.get('id'), job)
+        upcoming_index.update(reminder, fire_at)
+        logger.info(f"Scheduled {reminder.get('type')} reminder {reminder.get('id')} for {format_moscow_time(fire_at)}")
             
     except Exception as e:
         logger.error(f"Error scheduling reminder {reminder.get('id', 'unknown')}: {e}")
@@ -1810,9 +2634,14 @@ def reschedule_all_reminders(job_queue):
     """
     try:
         # Останавливаем все текущие задания
-        current_jobs = job_queue.jobs()
-        for job in current_jobs:
-            if hasattr(job, 'name') and job.name and job.name.startswith('reminder_'):
+        if reminder_scheduler is not None:
+            reminder_scheduler.clear()
+        else:
+            with _reminder_jobs_lock:
+                jobs = list(_reminder_jobs.values())
+                _reminder_jobs.clear()
+                upcoming_index.clear()
+            for job in jobs:
                 job.schedule_removal()
         
         # Планируем заново
@@ -1820,19 +2649,245 @@ def reschedule_all_reminders(job_queue):
     except Exception as e:
         logger.error(f"Error rescheduling reminders: {e}")
 
-# --- Функции автовосстановления подписок ---
+# --- Подготовка рассылки заранее (бэкенд heap) ---
+
+PREPARE_TIMEOUT_SECONDS = 60
+
+# (ID напоминания, время срабатывания) -> Promise подготовки рассылки
+_prepared_fanouts = {}
+_prepared_fanouts_lock = threading.Lock()
+
+def prepare_scheduled_reminder(dispatcher, reminder, fire_at):
+    """on_prepare планировщика: запускает prepare_fanout в пуле диспетчера"""
+    key = (str(reminder.get("id")), fire_at.timestamp())
+    promise = dispatcher.run_async(prepare_fanout, dispatcher.bot, reminder, fire_at)
+    with _prepared_fanouts_lock:
+        # Подготовки срабатываний, которые так и не наступили (напоминание удалили)
+        stale_before = time.time() - PREPARE_TIMEOUT_SECONDS
+        for stale_key in [k for k in _prepared_fanouts if k[1] < stale_before]:
+            del _prepared_fanouts[stale_key]
+        _prepared_fanouts[key] = promise
+
+def fire_scheduled_reminder(dispatcher, reminder, fire_at):
+    """on_fire планировщика: доставка с подготовленной заранее рассылкой"""
+    with _prepared_fanouts_lock:
+        preparation = _prepared_fanouts.pop((str(reminder.get("id")), fire_at.timestamp()), None)
+    dispatcher.run_async(deliver_live_reminder, dispatcher.bot, reminder, preparation)
 
-def ensure_subscribed_chats_file():
-    """Проверяет и восстанавливает subscribed_chats.json при необходимости"""
+# --- Догоняющая отправка пропущенных напоминаний ---
+
+# Плановые отправки, которые выполняются прямо сейчас: догоняющая отправка их пропускает вперед
+_live_deliveries = 0
+_live_deliveries_cond = threading.Condition()
+
+def deliver_live_reminder(bot, reminder, preparation=None):
+    """
+    Плановая доставка напоминания (учитывается догоняющей отправкой).
+    preparation - Promise заранее запущенной prepare_fanout.
+    """
+    global _live_deliveries
+    with _live_deliveries_cond:
+        _live_deliveries += 1
     try:
-        # Проверяем существует ли файл и не пустой ли он
-        with open("subscribed_chats.json", "r") as f:
-            chats = json.load(f)
-            if chats and len(chats) > 0:
-                logger.info(f"✅ Found {len(chats)} existing subscribed chats")
-                return True  # Файл в порядке
-    except (FileNotFoundError, json.JSONDecodeError, TypeError):
-        pass  # Файл отсутствует или поврежден
+        prepared = None
+        if preparation is not None:
+            # Подготовка еще идет - дожидаемся ее, а не начинаем заново
+            try:
+                prepared = preparation.result(timeout=PREPARE_TIMEOUT_SECONDS)
+            except Exception as e:
+                # Promise.result пробрасывает исключение подготовки - готовим рассылку заново
+                logger.error(f"❌ Fanout preparation failed for reminder #{reminder.get('id')}, preparing inline: {e}")
+                prepared = None
+            else:
+                if prepared is None and preparation.done.is_set():
+                    # Подготовка завершилась без чатов: экстренное восстановление уже не удалось,
+                    # повторять его в deliver_reminder незачем
+                    return
+        deliver_reminder(bot, reminder, prepared=prepared)
+    finally:
+        with _live_deliveries_cond:
+            _live_deliveries -= 1
+            _live_deliveries_cond.notify_all()
+
+# ID напоминания -> время последней отправки, еще не записанное в хранилище
+_pending_last_sent = {}
+_pending_last_sent_cond = threading.Condition()
+_last_sent_writer = None
+
+def record_last_sent(reminder_id, sent_at):
+    """
+    Ставит время последней отправки напоминания в очередь локальной записи
+    (flush_local_last_sent) и записи в Google Sheets.
+    """
+    global _last_sent_writer
+    with _pending_last_sent_cond:
+        _pending_last_sent[str(reminder_id)] = sent_at
+        if _last_sent_writer is None:
+            _last_sent_writer = threading.Thread(target=_last_sent_writer_loop, name="last-sent-writer", daemon=True)
+            _last_sent_writer.start()
+        _pending_last_sent_cond.notify()
+    
+    if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
+        try:
+            sheets_manager.update_last_sent(reminder_id, sent_at)
+        except Exception as e:
+            logger.error(f"❌ Error updating last_sent for reminder #{reminder_id} in Google Sheets: {e}")
+
+def flush_local_last_sent():
+    """
+    Записывает накопленные last_sent в хранилище одной транзакцией.
+    Возвращает число обновленных напоминаний.
+    """
+    with _pending_last_sent_cond:
+        pending = dict(_pending_last_sent)
+        _pending_last_sent.clear()
+    if not pending:
+        return 0
+    
+    updated = 0
+    try:
+        with reminders_store.transaction() as tx:
+            for reminder in tx.data:
+                sent_at = pending.get(str(reminder.get("id")))
+                if sent_at is not None:
+                    reminder["last_sent"] = sent_at
+                    updated += 1
+            if not updated:
+                tx.abort()
+    except Exception as e:
+        logger.error(f"❌ Error saving last_sent of {len(pending)} reminders: {e}")
+        # Вернем значения в очередь, более новые (пришедшие за время записи) побеждают
+        with _pending_last_sent_cond:
+            for reminder_id, sent_at in pending.items():
+                _pending_last_sent.setdefault(reminder_id, sent_at)
+        return 0
+    logger.debug(f"Saved last_sent of {updated} reminders")
+    return updated
+
+def _last_sent_writer_loop():
+    while True:
+        with _pending_last_sent_cond:
+            _pending_last_sent_cond.wait_for(lambda: _pending_last_sent)
+        # Срабатывания одной минуты попадают в одну запись
+        time.sleep(LAST_SENT_FLUSH_SECONDS)
+        flush_local_last_sent()
+
+def _parse_moscow_timestamp(value):
+    try:
+        return MOSCOW_TZ.localize(datetime.strptime(str(value).strip(), "%Y-%m-%d %H:%M:%S"))
+    except (TypeError, ValueError):
+        return None
+
+def find_missed_firing(reminder, now, window):
+    """
+    Последнее срабатывание напоминания в окне (now - window, now], которое
+    не было отправлено, или None. Повторяющиеся напоминания сверяются с
+    last_sent; разовое напоминание удаляется после отправки, поэтому
+    присутствие в хранилище уже означает, что оно не отправлено.
+    """
+    window_start = now - window
+    missed_at = None
+    try:
+        fire_at = next_fire_time(reminder, window_start)
+        while fire_at is not None and fire_at <= now:
+            missed_at = fire_at
+            if reminder.get("type") == "once":
+                break
+            fire_at = next_fire_time(reminder, fire_at)
+    except Exception as e:
+        logger.error(f"Error checking missed firings for reminder {reminder.get('id')}: {e}")
+        return None
+    
+    if missed_at is None or reminder.get("type") == "once":
+        return missed_at
+    
+    # Без last_sent нельзя отличить пропуск от отправки прошлым процессом - не дублируем
+    last_sent = _parse_moscow_timestamp(reminder.get("last_sent"))
+    if last_sent is None or last_sent >= missed_at:
+        return None
+    return missed_at
+
+def find_missed_reminders(reminders, now, window):
+    """[(reminder, missed_at)] - пропущенные срабатывания, не более одного на напоминание"""
+    missed = []
+    for reminder in reminders:
+        missed_at = find_missed_firing(reminder, now, window)
+        if missed_at is not None:
+            missed.append((reminder, missed_at))
+    missed.sort(key=lambda item: item[1])
+    return missed
+
+def _wait_for_live_window():
+    """
+    Ждет, пока не идут плановые отправки и ближайшее срабатывание не наступит
+    в течение паузы между догоняющими отправками.
+    """
+    while True:
+        with _live_deliveries_cond:
+            _live_deliveries_cond.wait_for(lambda: _live_deliveries == 0)
+        next_live = upcoming_index.peek()
+        if next_live is None:
+            return
+        delay = (next_live - datetime.now(pytz.UTC)).total_seconds()
+        if delay > CATCHUP_INTERVAL_SECONDS:
+            return
+        # Плановое срабатывание вот-вот начнется - пропускаем его вперед
+        time.sleep(max(delay, 0) + CATCHUP_INTERVAL_SECONDS)
+
+def replay_missed_reminders(bot, now):
+    """Отправляет пропущенные до now напоминания с ограничением скорости"""
+    try:
+        window = timedelta(minutes=CATCHUP_WINDOW_MINUTES)
+        missed = find_missed_reminders(load_reminders(), now, window)
+        if not missed:
+            logger.info(f"⏪ Catch-up: no reminders missed in the last {CATCHUP_WINDOW_MINUTES} min")
+            return 0
+        
+        logger.info(f"⏪ Catch-up: replaying {len(missed)} reminders missed in the last {CATCHUP_WINDOW_MINUTES} min")
+        replayed = 0
+        for reminder, missed_at in missed:
+            _wait_for_live_window()
+            
+            # Напоминание могли удалить, пока ждали своей очереди
+            reminder_id = str(reminder.get("id"))
+            if not any(str(r.get("id")) == reminder_id for r in get_chat_reminders(reminder_owner(reminder))):
+                continue
+            
+            logger.info(f"⏪ Replaying reminder #{reminder_id} missed at {format_moscow_time(missed_at)}")
+            deliver_reminder(bot, reminder, missed_at=missed_at)
+            replayed += 1
+            time.sleep(CATCHUP_INTERVAL_SECONDS)
+        
+        logger.info(f"✅ Catch-up completed: {replayed}/{len(missed)} missed reminders delivered")
+        return replayed
+    except Exception as e:
+        logger.error(f"❌ Error during catch-up replay: {e}")
+        return 0
+
+_catchup_thread = None
+
+def start_catchup_replay(bot, now):
+    """Запускает догоняющую отправку в фоновом потоке (один раз за процесс)"""
+    global _catchup_thread
+    if CATCHUP_WINDOW_MINUTES <= 0 or _catchup_thread is not None:
+        return _catchup_thread
+    _catchup_thread = threading.Thread(target=replay_missed_reminders, args=(bot, now),
+                                       name="catchup-replay", daemon=True)
+    _catchup_thread.start()
+    return _catchup_thread
+
+# --- Функции автовосстановления подписок ---
+
+def ensure_subscribed_chats_file(chat_rows=None):
+    """
+    Проверяет и восстанавливает subscribed_chats.json при необходимости.
+    chat_rows - заранее прочитанные колонки Chat_Stats (sheets_manager.fetch_sheet_views).
+    """
+    # Проверяем существует ли файл и не пустой ли он (поврежденный читается как пустой)
+    chats = load_chats()
+    if chats:
+        logger.info(f"✅ Found {len(chats)} existing subscribed chats")
+        return True  # Файл в порядке
     
     # Детальная диагностика доступности Google Sheets
     logger.warning("⚠️ subscribed_chats.json is missing or empty. Attempting restore from Google Sheets...")
@@ -1853,7 +2908,7 @@ def ensure_subscribed_chats_file():
             logger.info(f"   Using Sheet ID: {sheets_id[:20]}...{sheets_id[-10:] if len(sheets_id) > 30 else sheets_id}")
     
     if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
-        if sheets_manager.restore_subscribed_chats_file():
+        if sheets_manager.restore_subscribed_chats_file(chat_rows=chat_rows):
             logger.info("✅ Successfully restored subscribed chats from Google Sheets")
             return True
         else:
@@ -1872,13 +2927,18 @@ def ensure_subscribed_chats_file():
     logger.warning("   1. Запустить команду /start в Telegram чатах")
     logger.warning("   2. Настроить Google Sheets интеграцию")
     
-    with open("subscribed_chats.json", "w") as f:
-        json.dump([], f)
+    # Не перетираем чаты, подписанные пока шло восстановление
+    with chats_store.locked():
+        if not load_chats():
+            save_chats([])
     
     return False
 
-def ensure_reminders_file():
-    """🆕 Проверяет и восстанавливает reminders.json при необходимости"""
+def ensure_reminders_file(records=None):
+    """
+    🆕 Проверяет и восстанавливает reminders.json при необходимости.
+    records - заранее прочитанные записи Reminders (sheets_manager.fetch_sheet_views).
+    """
     try:
         # Проверяем существует ли файл и не пустой ли он
         existing_reminders = load_reminders()
@@ -1895,7 +2955,7 @@ def ensure_reminders_file():
     if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
         logger.info("   ✅ Google Sheets available for reminders restore")
         try:
-            success, message = sheets_manager.restore_reminders_from_sheets()
+            success, message = sheets_manager.restore_reminders_from_sheets(records=records)
             if success:
                 restored_reminders = load_reminders()
                 restored_count = len(restored_reminders)
@@ -1920,137 +2980,338 @@ def ensure_reminders_file():
     logger.warning("   1. Создать напоминания командами /remind, /remind_daily, /remind_weekly")
     logger.warning("   2. Или восстановить из Google Sheets командой /restore_reminders")
     
-    save_reminders([])
+    with reminders_store.locked():
+        if not load_reminders():
+            save_reminders([])
     return False, 0
 
-def auto_sync_subscribed_chats(context: CallbackContext):
-    """Автоматическая синхронизация subscribed_chats.json с Google Sheets каждый час"""
+# --- Фоновые этапы запуска ---
+
+def init_sheets_manager():
+    """
+    Подключается к Google Sheets (сетевые вызовы - только в фоновом потоке).
+    Используется общий экземпляр sheets_integration.get_sheets_manager().
+    """
+    global sheets_manager, SHEETS_AVAILABLE
     try:
-        moscow_time = get_moscow_time().strftime("%H:%M MSK")
-        logger.info(f"🔄 Starting hourly sync at {moscow_time}")
-        
-        if SHEETS_AVAILABLE and sheets_manager:
-            success = sheets_manager.sync_subscribed_chats_from_sheets()
-            if success:
-                logger.info(f"✅ Hourly sync completed successfully at {moscow_time}")
+        from sheets_integration import get_sheets_manager
+        sheets_manager = get_sheets_manager()
+        SHEETS_AVAILABLE = True
+        logger.info("✅ Google Sheets integration loaded successfully")
+    except Exception as e:
+        sheets_manager = None
+        SHEETS_AVAILABLE = False
+        logger.warning(f"📵 Google Sheets integration not available: {e}")
+    finally:
+        sheets_ready.set()
+
+def sheets_connecting():
+    """Подключение к Google Sheets еще идет (фоновый этап запуска)"""
+    return not sheets_ready.is_set()
+
+def reply_sheets_connecting(update):
+    try:
+        update.message.reply_text(
+            "⏳ <b>Google Sheets еще подключается</b>\n\n"
+            "Бот только что запустился. Повторите команду через минуту.",
+            parse_mode=ParseMode.HTML
+        )
+    except:
+        update.message.reply_text("⏳ Google Sheets еще подключается, повторите команду через минуту")
+
+def run_background_startup(job_queue, bot, catchup_cutoff, local_reminders_count):
+    """
+    Фоновая часть запуска: Google Sheets, восстановление пустых файлов
+    (оба листа читаются одним пакетным запросом), проверка заданий и догоняющая отправка.
+    Бот к этому моменту уже принимает команды и отправляет напоминания.
+    """
+    try:
+        with startup_stages.stage("sheets_init"):
+            init_sheets_manager()
+
+        with startup_stages.stage("sheets_restore"):
+            # Читаем из таблицы только листы, которые нужны для пустых файлов
+            views = {}
+            needed = [view for view, empty in (('chats', not load_chats()), ('reminders', local_reminders_count == 0)) if empty]
+            if needed and SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
+                views = sheets_manager.fetch_sheet_views(tuple(needed)) or {}
+
+            ensure_subscribed_chats_file(views.get('chats'))
+            reminders_restored, reminders_count = ensure_reminders_file(views.get('reminders'))
+
+            if reminders_restored:
+                logger.info(f"✅ Reminders status: {reminders_count} reminders ready for scheduling")
             else:
-                logger.warning(f"⚠️ Hourly sync had issues at {moscow_time}")
-        else:
-            logger.warning(f"📵 Google Sheets not available for sync at {moscow_time}")
-            
+                logger.warning("⚠️ Reminders status: starting with empty reminders list")
+                logger.warning("💡 TIP: Use /restore_reminders command to recover data from Google Sheets")
+
+            # Напоминания восстановлены из пустого файла - планируем заново;
+            # пропущенное до этого момента достается догоняющей отправке
+            if reminders_restored and local_reminders_count == 0:
+                catchup_cutoff = get_moscow_time()
+                reschedule_all_reminders(job_queue)
+
+        with startup_stages.stage("jobs_check"):
+            # 🆕 ПРОВЕРЯЕМ АКТИВНЫЕ ЗАДАНИЯ ПОСЛЕ ПЛАНИРОВАНИЯ
+            active_jobs_count = check_active_jobs(job_queue)
+            if active_jobs_count == 0:
+                logger.warning("⚠️ CRITICAL: No active reminder jobs scheduled!")
+                logger.warning("   Attempting immediate reminders restore...")
+
+                # Попытка экстренного восстановления
+                if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
+                    try:
+                        success, message = sheets_manager.restore_reminders_from_sheets()
+                        if success:
+                            logger.info("✅ Emergency restore successful, rescheduling...")
+                            catchup_cutoff = get_moscow_time()
+                            reschedule_all_reminders(job_queue)
+                            final_jobs_count = check_active_jobs(job_queue)
+                            logger.info(f"🔄 After emergency restore: {final_jobs_count} active jobs")
+                        else:
+                            logger.error(f"❌ Emergency restore failed: {message}")
+                    except Exception as e:
+                        logger.error(f"❌ Exception during emergency restore: {e}")
     except Exception as e:
-        logger.error(f"❌ Error in hourly sync: {e}")
+        logger.error(f"❌ Error in background startup: {e}")
+    finally:
+        # Догоняющая отправка - после восстановления, чтобы учесть восстановленные напоминания
+        start_catchup_replay(bot, catchup_cutoff)
+        startup_stages.complete()
 
-def auto_sync_reminders(context: CallbackContext):
-    """🆕 Автоматическая синхронизация напоминаний с Google Sheets каждые 2 часа"""
+# --- Автосинхронизация с Google Sheets ---
+
+# Интервал автосинхронизации: сразу после изменений в таблице - минимальный,
+# пока изменений нет - удваивается до максимального
+AUTO_SYNC_MIN_INTERVAL = int(os.environ.get('AUTO_SYNC_MIN_INTERVAL', 60))
+AUTO_SYNC_MAX_INTERVAL = int(os.environ.get('AUTO_SYNC_MAX_INTERVAL', 1800))
+auto_sync_interval = AdaptiveInterval(AUTO_SYNC_MIN_INTERVAL, AUTO_SYNC_MAX_INTERVAL, initial=300)
+
+def _reminder_changed(local, remote):
+    """Отличается ли напоминание из таблицы от локального (last_sent пишет сам бот - не сравнивается)"""
+    return any(str(local.get(key, '')) != str(value) for key, value in remote.items() if key != 'last_sent')
+
+def apply_sheet_sync(job_queue, sheet_chats, sheet_reminders, chat_ids=None, reminder_ids=None):
+    """
+    Применяет данные таблицы к подпискам и напоминаниям под блокировками обоих
+    хранилищ - другие потоки не видят обновленным только один файл.
+    chat_ids / reminder_ids ограничивают синхронизацию этими ID (точечная
+    пересинхронизация): ID из области, которых нет среди активных в таблице,
+    удаляются локально. Без области пустой список из таблицы локальные данные не трогает.
+    Напоминания, чьи записи еще ждут в spool, не трогаются: таблица по ним устарела.
+    Перепланируются только добавленные, измененные и удаленные напоминания.
+    Возвращает (добавленные чаты, удаленные чаты, измененные напоминания, ID удаленных напоминаний).
+    """
+    chats_added, chats_removed = set(), set()
+    changed, removed = [], []
+    
+    with chats_store.locked(), reminders_store.locked():
+        if sheet_chats or chat_ids is not None:
+            current_chats = load_chats()
+            in_scope = (lambda chat_id: True) if chat_ids is None else (lambda chat_id: chat_id in chat_ids)
+            sheet_set = {chat_id for chat_id in sheet_chats if in_scope(chat_id)}
+            kept = [chat_id for chat_id in current_chats if not in_scope(chat_id) or chat_id in sheet_set]
+            chats_removed = set(current_chats) - set(kept)
+            chats_added = sheet_set - set(current_chats)
+            if chats_added or chats_removed:
+                save_chats(kept + [chat_id for chat_id in sheet_chats if chat_id in chats_added])
+        
+        if sheet_reminders or reminder_ids is not None:
+            # Под блокировкой хранилища: запись, отложенная до этого момента, тоже учитывается
+            spooled = sheets_manager.spooled_reminder_ids() if sheets_manager else set()
+            in_scope = lambda reminder_id: reminder_id not in spooled and (reminder_ids is None or reminder_id in reminder_ids)
+            remote_by_id = {remote['id']: remote for remote in sheet_reminders if in_scope(remote['id'])}
+            merged = []
+            for local in load_reminders():
+                reminder_id = str(local.get('id'))
+                remote = remote_by_id.pop(reminder_id, None)
+                if not in_scope(reminder_id):
+                    merged.append(local)
+                elif remote is None:
+                    removed.append(reminder_id)
+                elif _reminder_changed(local, remote):
+                    # Локальные поля (audience и т.п.) сохраняются, last_sent - более поздний
+                    reminder = dict(local)
+                    reminder.update(remote)
+                    reminder['last_sent'] = max(str(local.get('last_sent') or ''), str(remote.get('last_sent') or ''))
+                    merged.append(reminder)
+                    changed.append(reminder)
+                else:
+                    merged.append(local)
+            # Оставшиеся - новые напоминания из таблицы
+            merged.extend(remote_by_id.values())
+            changed.extend(remote_by_id.values())
+            if changed or removed:
+                save_reminders(merged)
+    
+    for reminder_id in removed:
+        unschedule_reminder(job_queue, reminder_id)
+    for reminder in changed:
+        schedule_reminder(job_queue, reminder)
+    
+    return chats_added, chats_removed, changed, removed
+
+def sync_from_sheets(job_queue):
+    """
+    Один проход синхронизации: оба листа читаются одним запросом и применяются
+    вместе. Возвращает True, если локальные данные изменились.
+    """
+    views = sheets_manager.fetch_sheet_views()
+    if views is None:
+        logger.warning("⚠️ Auto-sync: could not read Google Sheets")
+        if not load_reminders():
+            logger.warning("🚨 CRITICAL: No local reminders AND auto-sync failed!")
+            logger.warning("   Recommended action: use /restore_reminders command")
+        return False
+    
+    sheet_chats = sheets_manager.get_subscribed_chats(views['chats'])
+    sheet_reminders, _ = sheets_manager.parse_reminder_records(views['reminders'])
+    if not sheet_chats:
+        logger.warning("No chats in Google Sheets, keeping current local file")
+    if not sheet_reminders:
+        logger.warning("No active reminders in Google Sheets, keeping current local file")
+    
+    chats_added, chats_removed, changed, removed = apply_sheet_sync(job_queue, sheet_chats, sheet_reminders)
+    if not (chats_added or chats_removed or changed or removed):
+        logger.info(f"✅ Auto-sync: already in sync ({len(sheet_chats)} chats, {len(sheet_reminders)} reminders)")
+        return False
+    
+    details = (f"chats +{len(chats_added)} -{len(chats_removed)}, "
+               f"reminders changed {len(changed)}, removed {len(removed)}")
+    logger.info(f"🔄 Auto-sync applied: {details}")
     try:
-        moscow_time = get_moscow_time().strftime("%H:%M MSK")
-        logger.info(f"🔄 Starting reminders auto-sync at {moscow_time}")
-        
-        if not SHEETS_AVAILABLE or not sheets_manager or not sheets_manager.is_initialized:
-            logger.warning(f"📵 Google Sheets not available for reminders sync at {moscow_time}")
+        sheets_manager.log_operation(
+            timestamp=get_moscow_time().strftime("%Y-%m-%d %H:%M:%S"),
+            action="AUTO_SYNC",
+            user_id="SYSTEM",
+            username="AutoSync",
+            chat_id=0,
+            details=f"Auto-sync: {details}",
+            reminder_id=""
+        )
+    except Exception:
+        pass
+    return True
+
+def auto_sync(context: CallbackContext):
+    """
+    Единая автосинхронизация подписок и напоминаний с Google Sheets.
+    Сама планирует следующий запуск через адаптивный интервал.
+    """
+    changed = False
+    try:
+        if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
+            changed = sync_from_sheets(context.dispatcher.job_queue)
+        else:
+            logger.warning("📵 Google Sheets not available for auto-sync")
+    except Exception as e:
+        logger.error(f"❌ Error in auto-sync: {e}")
+    finally:
+        interval = auto_sync_interval.next(changed)
+        context.job_queue.run_once(auto_sync, interval, name="auto_sync")
+        logger.info(f"⏱️ Next auto-sync in {interval:.0f}s")
+
+# --- Точечная пересинхронизация по запросу (POST /resync) ---
+
+# Запросы копятся и обрабатываются одним заданием JobQueue; проходы не
+# пересекаются, поэтому более старое чтение не перетрет более новое
+_resync_pending = {"Reminders": {"ids": set(), "rows": set()}, "Chat_Stats": {"ids": set(), "rows": set()}}
+_resync_lock = threading.Lock()
+_resync_run_lock = threading.Lock()
+_resync_queued = False
+
+def request_resync(sheet, ids=(), rows=()):
+    """Ставит строки листа в очередь пересинхронизации, возвращает True, если запущен новый проход"""
+    global _resync_queued
+    with _resync_lock:
+        pending = _resync_pending[sheet]
+        pending["ids"].update(str(value).strip() for value in ids if str(value).strip())
+        pending["rows"].update(int(row) for row in rows)
+        if _resync_queued:
+            return False
+        _resync_queued = True
+    _updater.job_queue.run_once(run_targeted_resync, 0, name="targeted_resync")
+    return True
+
+def run_targeted_resync(context: CallbackContext):
+    """
+    Перечитывает из таблицы только запрошенные строки и перепланирует только
+    затронутые напоминания. Строки, которых больше нет, удаляются локально.
+    """
+    global _resync_queued
+    with _resync_run_lock:
+        with _resync_lock:
+            pending = {sheet: {key: set(values) for key, values in scope.items()} for sheet, scope in _resync_pending.items()}
+            for scope in _resync_pending.values():
+                for values in scope.values():
+                    values.clear()
+            _resync_queued = False
+        
+        if not (SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized):
+            logger.warning("📵 Google Sheets not available for targeted resync")
             return
         
         try:
-            # Проверяем есть ли локальные напоминания
-            current_reminders = load_reminders()
-            current_count = len(current_reminders)
-            
-            logger.info(f"📋 Current local reminders: {current_count}")
-            
-            # Пытаемся получить напоминания из Google Sheets
-            success, message = sheets_manager.restore_reminders_from_sheets()
-            
-            if success:
-                synced_reminders = load_reminders()
-                synced_count = len(synced_reminders)
-                
-                if synced_count != current_count:
-                    logger.info(f"🔄 Auto-sync: Updated reminders {current_count} → {synced_count}")
-                    logger.info(f"🛡️ File completely overwritten - no duplicates possible")
-                    
-                    # Перепланируем все напоминания
-                    reschedule_all_reminders(context.dispatcher.job_queue)
-                    logger.info(f"✅ Reminders rescheduled after auto-sync at {moscow_time}")
-                    
-                    # Проверяем активные задания после перепланирования
-                    active_jobs_after = check_active_jobs(context.dispatcher.job_queue)
-                    logger.info(f"📊 Active jobs after auto-sync: {active_jobs_after}")
-                    
-                    # Логируем в Google Sheets
-                    if sheets_manager.is_initialized:
-                        try:
-                            sheets_manager.log_operation(
-                                timestamp=moscow_time,
-                                action="AUTO_SYNC_REMINDERS",
-                                user_id="SYSTEM",
-                                username="AutoSync",
-                                chat_id=0,
-                                details=f"Auto-sync updated reminders: {current_count} → {synced_count}, active jobs: {active_jobs_after}, no duplicates",
-                                reminder_id=""
-                            )
-                        except:
-                            pass
+            sheet_reminders, reminder_ids = [], None
+            scope = pending["Reminders"]
+            if scope["ids"] or scope["rows"]:
+                records = sheets_manager.fetch_rows('Reminders', scope["ids"], scope["rows"])
+                if records is None:
+                    logger.warning("⚠️ Targeted resync: could not read Reminders rows")
                 else:
-                    logger.info(f"✅ Auto-sync: Reminders already in sync ({current_count} items) at {moscow_time}")
-                    logger.info(f"🛡️ No changes needed - all reminders unique")
-            else:
-                logger.warning(f"⚠️ Auto-sync reminders failed at {moscow_time}: {message}")
-                
-                # При неудаче автосинхронизации проверяем есть ли хотя бы локальные напоминания
-                if current_count == 0:
-                    logger.warning("🚨 CRITICAL: No local reminders AND auto-sync failed!")
-                    logger.warning("   This means NO reminders will be sent until manual intervention")
-                    logger.warning("   Recommended action: use /restore_reminders command")
-                
-        except Exception as e:
-            logger.error(f"❌ Error during reminders auto-sync: {e}")
+                    sheet_reminders, _ = sheets_manager.parse_reminder_records(records)
+                    # Область - запрошенные ID и ID из запрошенных строк (в том числе неактивные)
+                    reminder_ids = scope["ids"] | {str(record.get('ID', '')).strip() for record in records}
+            
+            sheet_chats, chat_ids = [], None
+            scope = pending["Chat_Stats"]
+            if scope["ids"] or scope["rows"]:
+                records = sheets_manager.fetch_rows('Chat_Stats', scope["ids"], scope["rows"])
+                if records is None:
+                    logger.warning("⚠️ Targeted resync: could not read Chat_Stats rows")
+                else:
+                    sheet_chats = sheets_manager.get_subscribed_chats(
+                        (record.get('Chat_ID'), record.get('Status')) for record in records
+                    )
+                    chat_ids = set()
+                    for value in list(scope["ids"]) + [record.get('Chat_ID') for record in records]:
+                        try:
+                            chat_ids.add(int(value))
+                        except (TypeError, ValueError):
+                            continue
             
-            # Проверяем критическое состояние
-            try:
-                current_reminders = load_reminders()
-                if len(current_reminders) == 0:
-                    logger.error("🚨 CRITICAL ERROR: No reminders available after auto-sync failure!")
-            except:
-                logger.error("🚨 CRITICAL ERROR: Cannot access reminders file!")
+            if reminder_ids is None and chat_ids is None:
+                return
+            chats_added, chats_removed, changed, removed = apply_sheet_sync(
+                context.dispatcher.job_queue, sheet_chats, sheet_reminders,
+                chat_ids=chat_ids, reminder_ids=reminder_ids
+            )
+            metrics.incr("targeted_resyncs")
+            logger.info(f"🎯 Targeted resync: chats +{len(chats_added)} -{len(chats_removed)}, "
+                        f"reminders changed {len(changed)}, removed {len(removed)}")
             
-    except Exception as e:
-        logger.error(f"❌ Critical error in auto_sync_reminders: {e}")
+            # Изменения приходят push-запросами - фоновому опросу таблицы можно реже
+            auto_sync_interval.reset(AUTO_SYNC_MAX_INTERVAL)
+        except Exception as e:
+            logger.error(f"❌ Error in targeted resync: {e}")
 
 def check_active_jobs(job_queue):
     """🆕 Проверяет активные задания напоминаний и выводит статистику"""
     try:
-        current_jobs = job_queue.jobs()
-        reminder_jobs = [job for job in current_jobs if hasattr(job, 'name') and job.name and job.name.startswith('reminder_')]
+        reminder_jobs = get_scheduled_reminders(job_queue)
         
         logger.info(f"📊 Active reminder jobs: {len(reminder_jobs)}")
         
         if len(reminder_jobs) > 0:
             logger.info("📋 Active reminder jobs list:")
-            for job in reminder_jobs:
-                # 🔧 ИСПРАВЛЕНО: безопасная проверка атрибута next_run
-                try:
-                        # Универсальная проверка времени следующего выполнения
-                        next_run = None
-                        if hasattr(job, 'next_run_time') and job.next_run_time:
-                            next_run = job.next_run_time
-                        elif hasattr(job, 'next_run') and job.next_run:
-                            next_run = job.next_run
-                        elif hasattr(job, 'trigger'):
-                            try:
-                                from datetime import datetime
-                                import pytz
-                                utc_now = datetime.now(pytz.UTC)
-                                next_run = job.trigger.get_next_fire_time(None, utc_now)
-                            except: pass
-                        
-                        if next_run:
-                            next_run_moscow = utc_to_moscow_time(next_run)
-                            logger.info(f"   • {job.name}: next run at {next_run_moscow}")
-                        else:
-                            logger.info(f"   • {job.name}: scheduled (time info unavailable)")
-                except Exception as attr_error:
-                    logger.info(f"   • {job.name}: scheduled (next_run attribute error)")
+            # Логируем только ближайшие задания, чтобы не засорять лог при тысячах напоминаний
+            for reminder_id, next_run in reminder_jobs[:20]:
+                if next_run:
+                    logger.info(f"   • reminder_{reminder_id}: next run at {utc_to_moscow_time(next_run)}")
+                else:
+                    logger.info(f"   • reminder_{reminder_id}: scheduled (time info unavailable)")
+            if len(reminder_jobs) > 20:
+                logger.info(f"   • ... and {len(reminder_jobs) - 20} more")
         else:
             logger.warning("⚠️ NO ACTIVE REMINDER JOBS FOUND!")
             logger.warning("   This means reminders will not be sent!")
@@ -2071,14 +3332,10 @@ def emergency_restore_subscribed_chats(context: CallbackContext):
         logger.warning("🚨 Emergency restore triggered - checking subscribed_chats.json")
         
         # Проверяем текущий файл
-        try:
-            with open("subscribed_chats.json", "r") as f:
-                chats = json.load(f)
-                if chats and len(chats) > 0:
-                    logger.info(f"📋 Current file contains {len(chats)} chats - no restore needed")
-                    return
-        except:
-            pass
+        chats = load_chats()
+        if chats:
+            logger.info(f"📋 Current file contains {len(chats)} chats - no restore needed")
+            return
         
         # Файл поврежден или пуст - восстанавливаем
         logger.warning("🔧 Attempting emergency restore from Google Sheets")
@@ -2087,6 +3344,9 @@ def emergency_restore_subscribed_chats(context: CallbackContext):
     except Exception as e:
         logger.error(f"❌ Error in emergency restore: {e}")
 
+# Сколько самых затратных методов Google Sheets показывать в /status
+SHEETS_STATUS_TOP_METHODS = 5
+
 def bot_status(update: Update, context: CallbackContext):
     """🆕 Диагностика состояния бота"""
     try:
@@ -2103,6 +3363,16 @@ def bot_status(update: Update, context: CallbackContext):
             else:
                 uptime_info = f"⏱️ <i>Работает: {hours}ч {minutes}м</i>\n"
         
+        # Этапы запуска
+        stage_icons = {"done": "✅", "running": "⏳", "failed": "❌"}
+        startup_info = "🚦 <b>Запуск:</b>\n"
+        for name, stage_status, seconds in startup_stages.snapshot():
+            duration = f" — {seconds:.2f}с" if seconds is not None else ""
+            startup_info += f"• {stage_icons.get(stage_status, '•')} {name}{duration}\n"
+        if startup_stages.is_complete:
+            startup_info += f"• Всего: {startup_stages.total_seconds:.2f}с\n"
+        startup_info += "\n"
+        
         # Проверяем локальные файлы
         try:
             reminders = load_reminders()
@@ -2111,16 +3381,14 @@ def bot_status(update: Update, context: CallbackContext):
             reminders_count = 0
             
         try:
-            with open("subscribed_chats.json", "r") as f:
-                chats = json.load(f)
-                chats_count = len(chats)
+            chats_count = len(load_chats())
         except:
             chats_count = 0
         
         # Проверяем активные задания
         current_jobs = context.dispatcher.job_queue.jobs()
-        reminder_jobs = [job for job in current_jobs if hasattr(job, 'name') and job.name and job.name.startswith('reminder_')]
-        active_jobs_count = len(reminder_jobs)
+        reminder_jobs = get_scheduled_reminders(context.dispatcher.job_queue, limit=3)
+        active_jobs_count = count_scheduled_reminders(context.dispatcher.job_queue)
         
         # Проверяем Google Sheets
         sheets_status = "❌ Недоступен"
@@ -2130,26 +3398,55 @@ def bot_status(update: Update, context: CallbackContext):
             if sheets_manager.is_initialized:
                 sheets_status = "✅ Подключен"
                 sheets_details = "Готов к работе"
+                spool_depth = sheets_manager.spool_depth
+                if spool_depth:
+                    sheets_details = f"Отложенных записей: {spool_depth} (отправятся, когда таблица снова доступна)"
+                if sheets_manager.breaker.is_open:
+                    sheets_status = "🔌 Временно отключен"
+                    sheets_details = (f"Много ошибок подряд, пробный запрос через {sheets_manager.breaker.retry_in:.0f}с. "
+                                      f"Записи откладываются (в очереди: {spool_depth})")
             else:
                 sheets_status = "⚠️ Не инициализирован"
                 sheets_details = "Проверьте переменные окружения"
         
+        # Запросы к Sheets API по методам (самые затратные)
+        sheets_api_info = ""
+        if SHEETS_AVAILABLE and sheets_manager:
+            try:
+                api_stats = [item for item in sheets_manager.api_stats() if item["api_requests"] or item["calls"]]
+                for item in api_stats[:SHEETS_STATUS_TOP_METHODS]:
+                    p95 = f"{item['p95_seconds']:.2f}с" if item["p95_seconds"] is not None else "—"
+                    sheets_api_info += (
+                        f"  • {item['method']}: {item['calls']} выз., {item['api_requests']} запр., "
+                        f"Σ {item['total_seconds']:.1f}с, p95 {p95}"
+                    )
+                    if item["rate_limited"]:
+                        sheets_api_info += f", 429: {item['rate_limited']} (пауз {item['retry_sleep_seconds']:.1f}с)"
+                    sheets_api_info += "\n"
+                if sheets_api_info:
+                    sheets_api_info = "• Запросы к API по методам:\n" + sheets_api_info
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to collect Sheets API stats: {e}")
+        
         # Подсчитываем типы напоминаний
         once_count = sum(1 for r in reminders if r.get('type') == 'once')
         daily_count = sum(1 for r in reminders if r.get('type') == 'daily')
         weekly_count = sum(1 for r in reminders if r.get('type') == 'weekly')
+        custom_count = sum(1 for r in reminders if r.get('type') == 'custom')
         
         # Формируем сообщение
         status_msg = (
             f"🤖 <b>Статус бота</b>\n"
             f"⏰ <i>{current_time}</i>\n"
             f"{uptime_info}\n"
+            f"{startup_info}"
             
             f"📋 <b>Локальные данные:</b>\n"
             f"• Напоминания: {reminders_count}\n"
             f"  📅 Разовых: {once_count}\n"
             f"  🔄 Ежедневных: {daily_count}\n"
             f"  📆 Еженедельных: {weekly_count}\n"
+            f"  🧭 По правилу: {custom_count}\n"
             f"• Подписанные чаты: {chats_count}\n\n"
             
             f"⚙️ <b>Планировщик заданий:</b>\n"
@@ -2158,7 +3455,8 @@ def bot_status(update: Update, context: CallbackContext):
             
             f"📊 <b>Google Sheets:</b>\n"
             f"• Статус: {sheets_status}\n"
-            f"• Детали: {sheets_details}\n\n"
+            f"• Детали: {sheets_details}\n"
+            f"{sheets_api_info}\n"
             
             f"🔧 <b>Диагностика:</b>\n"
         )
@@ -2171,10 +3469,9 @@ def bot_status(update: Update, context: CallbackContext):
             
             for job in current_jobs:
                 if hasattr(job, 'callback') and job.callback:
-                    if job.callback.__name__ == 'auto_sync_subscribed_chats':
-                        sync_jobs.append(('chats', job, '🔄 Чаты', 'каждые 5 мин'))
-                    elif job.callback.__name__ == 'auto_sync_reminders':
-                        sync_jobs.append(('reminders', job, '📋 Напоминания', 'каждые 5 мин'))
+                    if job.callback.__name__ == 'auto_sync':
+                        sync_jobs.append(('sheets', job, '🔄 Чаты и напоминания',
+                                          f'адаптивно, {AUTO_SYNC_MIN_INTERVAL}-{AUTO_SYNC_MAX_INTERVAL} с'))
                     elif job.callback.__name__ == 'ping_self':
                         sync_jobs.append(('ping', job, '🏓 Ping', 'каждые 5 мин'))
             
@@ -2250,19 +3547,12 @@ def bot_status(update: Update, context: CallbackContext):
         if active_jobs_count > 0:
             status_msg += f"\n📅 <b>Ближайшие задания:</b>\n"
             jobs_info = []
-            for job in reminder_jobs[:3]:  # Показываем только 3 ближайших
-                # 🔧 ИСПРАВЛЕНО: безопасная проверка атрибута next_run
-                try:
-                    if hasattr(job, 'next_run') and job.next_run:
-                        next_run_moscow = utc_to_moscow_time(next_run)
-                        job_name = job.name.replace('reminder_', '#')
-                        jobs_info.append(f"• {job_name}: {next_run_moscow.strftime('%d.%m %H:%M')}")
-                    else:
-                        job_name = job.name.replace('reminder_', '#')
-                        jobs_info.append(f"• {job_name}: запланировано")
-                except Exception:
-                    job_name = job.name.replace('reminder_', '#')
-                    jobs_info.append(f"• {job_name}: запланировано")
+            for reminder_id, next_run in reminder_jobs[:3]:  # Показываем только 3 ближайших
+                if next_run:
+                    next_run_moscow = utc_to_moscow_time(next_run)
+                    jobs_info.append(f"• #{reminder_id}: {next_run_moscow.strftime('%d.%m %H:%M')}")
+                else:
+                    jobs_info.append(f"• #{reminder_id}: запланировано")
             
             if jobs_info:
                 status_msg += "\n".join(jobs_info)
@@ -2309,11 +3599,13 @@ def about_bot(update: Update, context: CallbackContext):
             "📝 <b>Создание напоминаний:</b>\n"
             "/remind — разовое напоминание\n"
             "/remind_daily — ежедневное напоминание\n"
-            "/remind_weekly — еженедельное напоминание\n\n"
+            "/remind_weekly — еженедельное напоминание\n"
+            "/remind_custom — по правилу (будни, несколько дней, числа месяца, каждые N часов, cron)\n\n"
             
             "📊 <b>Управление:</b>\n"
-            "/list_reminders — просмотр всех напоминаний\n"
+            "/list_reminders — просмотр напоминаний этого чата\n"
             "/next — ближайшее напоминание\n"
+            "/upcoming N — следующие N срабатываний\n"
             "/del_reminder — удалить одно напоминание\n"
             "/clear_reminders — удалить все напоминания\n\n"
             
@@ -2321,6 +3613,7 @@ def about_bot(update: Update, context: CallbackContext):
             "/start — активация бота в чате\n"
             "/test — проверка работы бота\n"
             "/status — диагностика состояния\n"
+            "/tasks — фоновые операции (удаление, восстановление) и их отмена\n"
             "/restore_reminders — восстановление из резервной копии (необходимо при этом в Google-таблице поставить статус Active на нужные уведомления, которые нужно восстановить)\n"
             "/about — информация о боте\n"
             "/cancel — отмена операции\n\n"
@@ -2381,19 +3674,15 @@ def unsubscribe_user(chat_id, user_name="Unknown", reason="USER_REQUEST"):
     Удаляет пользователя из рассылки (локально и в Google Sheets)
     """
     try:
-        # Загружаем текущий список чатов
-        try:
-            with open("subscribed_chats.json", "r") as f:
-                chats = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            chats = []
+        # Проверяем подписку и удаляем из локального файла в одной транзакции
+        with chats_store.transaction() as tx:
+            was_subscribed = chat_id in tx.data
+            if was_subscribed:
+                tx.data.remove(chat_id)
+            chats = list(tx.data)
         
         # Проверяем, был ли пользователь подписан
-        if chat_id in chats:
-            # Удаляем из локального файла
-            chats.remove(chat_id)
-            save_chats(chats)
-            
+        if was_subscribed:
             logger.info(f"🚫 User {chat_id} ({user_name}) unsubscribed: {reason}")
             
             # Удаляем из Google Sheets
@@ -2544,36 +3833,81 @@ def handle_unsubscribe_button(update: Update, context: CallbackContext):
         except:
             pass
 
+def start_webhook_mode(updater):
+    """
+    Запускает JobQueue и диспетчер без polling-потока и регистрирует webhook.
+    Обновления принимает health-сервер (POST WEBHOOK_PATH) и кладет в update_queue.
+    """
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL (или BASE_URL) не задан для BOT_MODE=webhook")
+    
+    updater.job_queue.start()
+    dispatcher_ready = threading.Event()
+    threading.Thread(target=updater.dispatcher.start, kwargs={"ready": dispatcher_ready},
+                     name="dispatcher", daemon=True).start()
+    dispatcher_ready.wait()
+    # Updater.running ставит только start_polling/start_webhook. Без него обработчик
+    # сигналов idle() на SIGTERM делает os._exit(1) вместо остановки диспетчера и JobQueue
+    updater.running = True
+    
+    url = WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH
+    updater.bot.set_webhook(
+        url=url,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        drop_pending_updates=True
+    )
+    logger.info(f"🌐 Webhook set: {url} (max connections: {WEBHOOK_MAX_CONNECTIONS})")
+
+def start_receiving_updates(updater):
+    """Запускает получение обновлений в режиме BOT_MODE и планировщик напоминаний"""
+    with startup_stages.stage(UPDATES_STAGE):
+        if BOT_MODE == 'webhook':
+            start_webhook_mode(updater)
+        else:
+            # start_polling сам сбрасывает webhook (drop_pending_updates) перед первым getUpdates
+            updater.start_polling(drop_pending_updates=True, timeout=10, read_latency=5)
+        if reminder_scheduler is not None:
+            reminder_scheduler.start()
+
+def shutdown():
+    """После остановки Updater (SIGTERM/SIGINT): останавливает планировщик и дописывает очереди Google Sheets"""
+    logger.info("🛑 Bot stopped, flushing pending Google Sheets writes...")
+    if reminder_scheduler is not None:
+        reminder_scheduler.stop()
+    # last_sent нужен догоняющей отправке после рестарта
+    flush_local_last_sent()
+    if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
+        try:
+            sheets_manager.flush_send_history()
+            sheets_manager.flush_last_sent()
+        except Exception as e:
+            logger.error(f"❌ Error flushing Google Sheets queues on shutdown: {e}")
+
 def main():
     try:
-        global BOT_START_TIME
+        global BOT_START_TIME, reminder_scheduler, _updater
         BOT_START_TIME = get_moscow_time()
         
         token = os.environ['BOT_TOKEN']
         port = int(os.environ.get('PORT', 8000))
-        updater = Updater(token=token, use_context=True)
+        # Пул соединений как у Updater по умолчанию: по одному на воркер + диспетчер, polling, JobQueue, main
+        bot_request = InstrumentedRequest(con_pool_size=DISPATCHER_WORKERS + 4)
+        updater = Updater(bot=ExtBot(token, request=bot_request), use_context=True, workers=DISPATCHER_WORKERS)
+        _updater = updater
         
-        # Reset any existing webhook so polling can start cleanly
-        try:
-            res = updater.bot.delete_webhook(drop_pending_updates=True)
-            logger.info("Webhook deleted: %s", res)
-        except Exception as e:
-            logger.error("Error deleting webhook: %s", e)
+        # Health server поднимается первым: пробы отвечают уже во время запуска
+        _register_metrics_gauges()
+        threading.Thread(target=start_health_server, name="health-server", daemon=True).start()
         
         dp = updater.dispatcher
         
-        # ✅ ПРОВЕРЯЕМ И ВОССТАНАВЛИВАЕМ ПОДПИСКИ ПРИ ЗАПУСКЕ
-        logger.info("🔧 Checking subscribed_chats.json...")
-        ensure_subscribed_chats_file()
-        
-        # 🆕 ПРОВЕРЯЕМ И ВОССТАНАВЛИВАЕМ НАПОМИНАНИЯ ПРИ ЗАПУСКЕ
-        logger.info("🔧 Checking reminders.json...")
-        reminders_restored, reminders_count = ensure_reminders_file()
-        if reminders_restored:
-            logger.info(f"✅ Reminders status: {reminders_count} reminders ready for scheduling")
-        else:
-            logger.warning(f"⚠️ Reminders status: starting with empty reminders list")
-            logger.warning("💡 TIP: Use /restore_reminders command to recover data from Google Sheets")
+        # ✅ ЛОКАЛЬНОЕ СОСТОЯНИЕ: только файлы, без сетевых вызовов.
+        # Пустые файлы восстанавливаются из Google Sheets в фоне (run_background_startup)
+        with startup_stages.stage("local_state"):
+            local_chats_count = len(load_chats())
+            local_reminders_count = len(load_reminders())
+            logger.info(f"📂 Local state: {local_chats_count} subscribed chats, {local_reminders_count} reminders")
         
         # Добавляем обработчики команд ПЕРВЫМИ
         dp.add_handler(CommandHandler("start", start))
@@ -2613,6 +3947,17 @@ def main():
             allow_reentry=True,
         )
         dp.add_handler(conv_weekly)
+
+        conv_custom = ConversationHandler(
+            entry_points=[CommandHandler("remind_custom", start_add_custom_reminder)],
+            states={
+                CUSTOM_RULE: [MessageHandler(Filters.text & ~Filters.command, receive_custom_rule)],
+                CUSTOM_TEXT: [MessageHandler(Filters.text & ~Filters.command, receive_custom_text)],
+            },
+            fallbacks=[CommandHandler("cancel", cancel_reminder)],
+            allow_reentry=True,
+        )
+        dp.add_handler(conv_custom)
         
         dp.add_handler(CommandHandler("list_reminders", list_reminders))
         
@@ -2627,98 +3972,68 @@ def main():
         dp.add_handler(CommandHandler("clear_reminders", clear_reminders))
         dp.add_handler(CommandHandler("restore_reminders", restore_reminders))
         dp.add_handler(CommandHandler("next", next_notification))
+        dp.add_handler(CommandHandler("upcoming", upcoming_notifications))
         dp.add_handler(CommandHandler("status", bot_status))
+        dp.add_handler(CommandHandler("tasks", list_tasks))
         dp.add_handler(CommandHandler("unsubscribe", unsubscribe_command))  # 🆕 Команда отписки
         
         # 🆕 Обработчик INLINE кнопок
         dp.add_handler(CallbackQueryHandler(handle_unsubscribe_button, pattern="^unsubscribe$"))
+        dp.add_handler(CallbackQueryHandler(handle_upcoming_button, pattern=r"^upcoming:\d+:\d+$"))
+        dp.add_handler(CallbackQueryHandler(handle_task_cancel_button, pattern=r"^task_cancel:\d+$"))
 
         # Добавляем обработчик ошибок
         dp.add_error_handler(error_handler)
-
-        # Запланировать все сохранённые напоминания
-        logger.info("📋 Scheduling all reminders...")
-        schedule_all_reminders(updater.job_queue)
-        
-        # 🆕 ПРОВЕРЯЕМ АКТИВНЫЕ ЗАДАНИЯ ПОСЛЕ ПЛАНИРОВАНИЯ
-        active_jobs_count = check_active_jobs(updater.job_queue)
-        if active_jobs_count == 0:
-            logger.warning("⚠️ CRITICAL: No active reminder jobs scheduled!")
-            logger.warning("   Attempting immediate reminders restore...")
+        instrument_handlers(dp)
+
+        with startup_stages.stage("schedule"):
+            # Планировщик напоминаний: одна куча вместо задания JobQueue на каждое напоминание
+            if SCHEDULER_BACKEND == 'heap':
+                reminder_scheduler = ReminderScheduler(
+                    on_fire=lambda reminder, fire_at: fire_scheduled_reminder(dp, reminder, fire_at),
+                    next_fire=next_fire_time,
+                    index=upcoming_index,
+                    shaper=LoadShaper(predicted_fanout, FIRE_SPREAD_RATE, FIRE_SPREAD_SECONDS) if FIRE_SPREAD_SECONDS > 0 else None,
+                    on_prepare=lambda reminder, fire_at: prepare_scheduled_reminder(dp, reminder, fire_at),
+                    prepare_lead=PREPARE_LEAD_SECONDS
+                )
             
-            # Попытка экстренного восстановления
-            if SHEETS_AVAILABLE and sheets_manager and sheets_manager.is_initialized:
-                try:
-                    success, message = sheets_manager.restore_reminders_from_sheets()
-                    if success:
-                        logger.info("✅ Emergency restore successful, rescheduling...")
-                        reschedule_all_reminders(updater.job_queue)
-                        final_jobs_count = check_active_jobs(updater.job_queue)
-                        logger.info(f"🔄 After emergency restore: {final_jobs_count} active jobs")
-                    else:
-                        logger.error(f"❌ Emergency restore failed: {message}")
-                except Exception as e:
-                    logger.error(f"❌ Exception during emergency restore: {e}")
+            # Запланировать все сохранённые напоминания; все, что должно было сработать
+            # до этого момента, достается догоняющей отправке
+            logger.info(f"📋 Scheduling all reminders (backend: {SCHEDULER_BACKEND})...")
+            catchup_cutoff = get_moscow_time()
+            schedule_all_reminders(updater.job_queue)
         
         # Добавляем ping каждые 5 минут для предотвращения засыпания на Render
         updater.job_queue.run_repeating(ping_self, interval=300, first=30)
         
-        # ✅ АВТОМАТИЧЕСКАЯ СИНХРОНИЗАЦИЯ ПОДПИСОК КАЖДЫЕ 5 МИНУТ
-        updater.job_queue.run_repeating(auto_sync_subscribed_chats, interval=300, first=300)  # Каждые 5 минут, первый через 5 мин
-        logger.info("🔄 Scheduled 5-minute subscribed chats sync")
-        
-        # 🆕 АВТОМАТИЧЕСКАЯ СИНХРОНИЗАЦИЯ НАПОМИНАНИЙ КАЖДЫЕ 5 МИНУТ
-        updater.job_queue.run_repeating(auto_sync_reminders, interval=300, first=300)  # Каждые 5 минут, первый через 5 мин
-        logger.info("🔄 Scheduled 5-minute reminders auto-sync")
+        # ✅ АВТОМАТИЧЕСКАЯ СИНХРОНИЗАЦИЯ ПОДПИСОК И НАПОМИНАНИЙ (первая - через 5 минут)
+        updater.job_queue.run_once(auto_sync, auto_sync_interval.current, name="auto_sync")
+        logger.info(f"🔄 Scheduled adaptive auto-sync ({AUTO_SYNC_MIN_INTERVAL}-{AUTO_SYNC_MAX_INTERVAL}s)")
 
-        # Health check server for Render free tier
-        threading.Thread(target=start_health_server, daemon=True).start()
-        
         # Улучшенная обработка конфликтов при запуске
         logger.info("🚀 Starting bot with enhanced conflict handling...")
         
-        # Always run in polling mode
         try:
-            updater.bot.delete_webhook(drop_pending_updates=True)
-            
-            # Дополнительная пауза для разрешения конфликтов
-            time.sleep(2)
-            
-            updater.start_polling(drop_pending_updates=True, timeout=10, read_latency=5)
-            logger.info("✅ Bot started successfully in polling mode")
-            
-            # Финальная проверка состояния через 30 секунд
-            time.sleep(30)
-            final_check_jobs = check_active_jobs(updater.job_queue)
-            logger.info(f"🔍 Final status check: {final_check_jobs} reminder jobs active")
-            
-            # Проверяем подписанные чаты
-            try:
-                with open("subscribed_chats.json", "r") as f:
-                    final_chats = json.load(f)
-                    logger.info(f"📱 Final chats check: {len(final_chats)} subscribed chats")
-            except:
-                logger.warning("⚠️ Final chats check: subscribed_chats.json not accessible")
-            
-            # Проверяем напоминания  
-            try:
-                final_reminders = load_reminders()
-                logger.info(f"📋 Final reminders check: {len(final_reminders)} reminders loaded")
-            except:
-                logger.warning("⚠️ Final reminders check: reminders.json not accessible")
-            
-            logger.info("🚀 Bot startup completed successfully!")
-            
-            updater.idle()
-            
+            start_receiving_updates(updater)
+            logger.info(f"✅ Bot started successfully in {BOT_MODE} mode")
         except Exception as e:
-            logger.error(f"❌ Error starting bot polling: {e}")
+            logger.error(f"❌ Error starting bot in {BOT_MODE} mode: {e}")
             # Fallback: попытка повторного запуска через 10 секунд
             logger.info("🔄 Attempting fallback restart in 10 seconds...")
             time.sleep(10)
-            updater.start_polling(drop_pending_updates=True)
+            start_receiving_updates(updater)
             logger.info("✅ Bot started successfully (fallback mode)")
-            updater.idle()
+        
+        # Google Sheets, восстановление и догоняющая отправка - в фоне
+        threading.Thread(
+            target=run_background_startup,
+            args=(updater.job_queue, updater.bot, catchup_cutoff, local_reminders_count),
+            name="startup-background", daemon=True
+        ).start()
+        
+        updater.idle()
+        shutdown()
         
     except Exception as e:
         logger.error(f"Critical error in main: {e}")
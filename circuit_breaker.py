@@ -0,0 +1,119 @@
+# circuit_breaker.py
+
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонен без обращения к сервису: цепь разомкнута"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для внешнего сервиса.
+
+    closed - вызовы проходят; failure_threshold сбоев подряд размыкают цепь.
+    open - вызовы сразу отклоняются (allow() -> False) на cooldown секунд.
+    half_open - после cooldown пропускается один пробный вызов: успех замыкает
+    цепь, сбой снова размыкает ее, а cooldown удваивается (не выше max_cooldown).
+
+    on_change(old, new) вызывается при каждой смене состояния (вне блокировки).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 60.0,
+                 max_cooldown: float = 600.0, on_change: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.base_cooldown = max(float(cooldown), 0.0)
+        self.max_cooldown = max(float(max_cooldown), self.base_cooldown)
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._cooldown = self.base_cooldown
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._cooldown_elapsed():
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Цепь разомкнута и cooldown не истек (проверка без пробного вызова)"""
+        with self._lock:
+            return self._state == OPEN and not self._cooldown_elapsed()
+
+    @property
+    def retry_in(self) -> float:
+        """Секунд до пробного вызова (0 - вызовы разрешены)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._cooldown - time.monotonic())
+
+    def _cooldown_elapsed(self) -> bool:
+        return time.monotonic() - self._opened_at >= self._cooldown
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; в half_open разрешает только один пробный"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if not self._cooldown_elapsed():
+                    return False
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            old = self._state
+            self._state = CLOSED
+            self._failures = 0
+            self._cooldown = self.base_cooldown
+            self._probe_in_flight = False
+        if old != CLOSED:
+            logger.info(f"✅ {self.name} circuit closed: service recovered")
+            self._changed(old, CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            old = self._state
+            if old == HALF_OPEN:
+                # Пробный вызов не прошел - ждем дольше
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            else:
+                self._failures += 1
+                if old == OPEN or self._failures < self.failure_threshold:
+                    return
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+            cooldown = self._cooldown
+        logger.warning(f"🔌 {self.name} circuit opened for {cooldown:.0f}s "
+                       f"({'probe failed' if old == HALF_OPEN else f'{self.failure_threshold} failures in a row'})")
+        self._changed(old, OPEN)
+
+    def _changed(self, old: str, new: str):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(old, new)
+        except Exception as e:
+            logger.debug(f"⚠️ Circuit breaker callback failed: {e}")
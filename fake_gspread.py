@@ -0,0 +1,540 @@
+# fake_gspread.py
+
+"""
+Фейковый gspread в памяти процесса: та часть API, которую использует
+SheetsManager, без сети и учетных данных.
+
+Каждый вызов, который в настоящем gspread - запрос к Google API,
+считается и замеряется (FakeClient.stats), поэтому число запросов на
+действие бота можно проверять и замерять офлайн. Можно добавлять
+задержку и ответы 429:
+
+    client = FakeClient(latency=0.05)
+    manager = SheetsManager(client=client, spool_path=":memory:")
+    client.stats.reset()
+    with client.stats.budget(2):
+        manager.sync_reminder(reminder, "UPDATE")
+    client.inject_rate_limit(3)   # следующие 3 запроса ответят 429
+
+python fake_gspread.py - замер запросов на типовые действия с лимитами
+(код выхода 1, если лимит превышен).
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from gspread.cell import Cell
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import column_letter_to_index, numericise_all
+
+
+class FakeRateLimitError(Exception):
+    """Ответ 429 (текст как у gspread APIError - его распознает handle_rate_limit_with_retry)"""
+
+    def __init__(self, method: str):
+        super().__init__(f"APIError: [429]: Quota exceeded for quota metric 'Read requests' (RATE_LIMIT_EXCEEDED) in {method}")
+
+
+class CallBudgetExceeded(AssertionError):
+    """Действие сделало больше запросов, чем разрешено лимитом"""
+
+
+class CallStats:
+    """Счетчики и длительность вызовов API по методам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls: List[str] = []
+            self._methods: Dict[str, Dict[str, float]] = {}
+
+    def record(self, method: str, seconds: float, error: bool = False):
+        with self._lock:
+            self.calls.append(method)
+            stats = self._methods.setdefault(method, {"count": 0, "errors": 0, "total_seconds": 0.0})
+            stats["count"] += 1
+            stats["errors"] += int(error)
+            stats["total_seconds"] += seconds
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return len(self.calls)
+
+    def count(self, method: str) -> int:
+        with self._lock:
+            return int(self._methods.get(method, {}).get("count", 0))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {method: dict(stats) for method, stats in self._methods.items()}
+
+    @contextmanager
+    def budget(self, max_calls: int, label: str = "action"):
+        """Бросает CallBudgetExceeded, если внутри блока сделано больше max_calls запросов"""
+        with self._lock:
+            start = len(self.calls)
+        yield
+        with self._lock:
+            made = self.calls[start:]
+        if len(made) > max_calls:
+            raise CallBudgetExceeded(f"{label}: {len(made)} API calls > budget {max_calls}: {made}")
+
+
+def _api_call(method_name: str):
+    """Декоратор метода фейка: вызов идет через client.request (задержка, внедренные 429, учет)"""
+    def decorator(func):
+        def wrapper(self, *args, **kwargs):
+            return self._client.request(method_name, lambda: func(self, *args, **kwargs))
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+_RANGE_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _transpose(values: List[List[str]]) -> List[List[str]]:
+    """Строки в колонки как в ответе API с majorDimension=COLUMNS (без пустых ячеек в конце колонок)"""
+    width = max((len(row) for row in values), default=0)
+    columns = []
+    for index in range(width):
+        column = [row[index] if index < len(row) else "" for row in values]
+        while column and column[-1] == "":
+            column.pop()
+        columns.append(column)
+    return columns
+
+
+def _split_range(range_name: str):
+    """"'Лист'!A1:K2" -> (лист, "A1:K2"); без имени листа - (None, диапазон)"""
+    if "!" not in range_name:
+        return None, range_name
+    sheet, cells = range_name.rsplit("!", 1)
+    if sheet.startswith("'") and sheet.endswith("'"):
+        sheet = sheet[1:-1].replace("''", "'")
+    return sheet, cells
+
+
+def _parse_cells(cells: str):
+    """Диапазон A1 в (первая строка, первая колонка, последняя строка, последняя колонка), 1-based, None - без границы"""
+    start, _, end = cells.partition(":")
+    end = end or start
+
+    def parse(part):
+        match = _RANGE_RE.match(part.upper())
+        if not match:
+            raise ValueError(f"Unsupported range: {cells}")
+        letters, digits = match.groups()
+        return (int(digits) if digits else None), (column_letter_to_index(letters) if letters else None)
+
+    first_row, first_col = parse(start)
+    last_row, last_col = parse(end)
+    return first_row or 1, first_col or 1, last_row, last_col
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", sheet_id: int, title: str, rows: int = 1000, cols: int = 26):
+        self._spreadsheet = spreadsheet
+        self._client = spreadsheet._client
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self._rows: List[List[str]] = []
+
+    # --- Хранение (под блокировкой клиента) ---
+
+    @staticmethod
+    def _cell(value) -> str:
+        return "" if value is None else str(value)
+
+    def _set_cell(self, row: int, col: int, value):
+        while len(self._rows) < row:
+            self._rows.append([])
+        cells = self._rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = self._cell(value)
+        self.row_count = max(self.row_count, row)
+        self.col_count = max(self.col_count, col)
+
+    def _last_data_row(self) -> int:
+        for index in range(len(self._rows), 0, -1):
+            if any(self._rows[index - 1]):
+                return index
+        return 0
+
+    def _append(self, rows: List[List[Any]]):
+        start = self._last_data_row() + 1
+        for offset, values in enumerate(rows):
+            self._rows[start - 1 + offset:start + offset] = [[self._cell(value) for value in values]]
+            self.col_count = max(self.col_count, len(values))
+        self.row_count = max(self.row_count, start - 1 + len(rows))
+
+    def _values(self, first_row=1, first_col=1, last_row=None, last_col=None) -> List[List[str]]:
+        """Значения диапазона как в ответе API: без пустых ячеек в конце строк и пустых строк в конце"""
+        last_row = min(last_row or len(self._rows), len(self._rows))
+        result = []
+        for row in self._rows[first_row - 1:last_row]:
+            cells = row[first_col - 1:last_col]
+            while cells and cells[-1] == "":
+                cells = cells[:-1]
+            result.append(list(cells))
+        while result and not result[-1]:
+            result.pop()
+        return result
+
+    def _properties(self, index: int) -> Dict[str, Any]:
+        return {"sheetId": self.id, "title": self.title, "index": index, "sheetType": "GRID",
+                "gridProperties": {"rowCount": self.row_count, "columnCount": self.col_count}}
+
+    # --- API ---
+
+    @_api_call("get_all_values")
+    def get_all_values(self) -> List[List[str]]:
+        with self._client._lock:
+            values = self._values()
+        width = max((len(row) for row in values), default=0)
+        return [row + [""] * (width - len(row)) for row in values]
+
+    @_api_call("get_all_records")
+    def get_all_records(self, head: int = 1, **kwargs) -> List[Dict[str, Any]]:
+        with self._client._lock:
+            values = self._values()
+        if len(values) < head:
+            return []
+        headers = values[head - 1]
+        records = []
+        for row in values[head:]:
+            row = row + [""] * (len(headers) - len(row))
+            records.append(dict(zip(headers, numericise_all(row[:len(headers)]))))
+        return records
+
+    @_api_call("row_values")
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        with self._client._lock:
+            values = self._values(row, 1, row, None)
+        return values[0] if values else []
+
+    @_api_call("append_row")
+    def append_row(self, values: List[Any], **kwargs):
+        with self._client._lock:
+            self._append([values])
+
+    @_api_call("append_rows")
+    def append_rows(self, values: List[List[Any]], **kwargs):
+        with self._client._lock:
+            self._append(values)
+
+    @_api_call("update_cell")
+    def update_cell(self, row: int, col: int, value):
+        with self._client._lock:
+            self._set_cell(row, col, value)
+
+    def _update_range(self, range_name: str, values: List[List[Any]]):
+        _, cells = _split_range(range_name)
+        first_row, first_col, _, _ = _parse_cells(cells)
+        for row_offset, row in enumerate(values):
+            for col_offset, value in enumerate(row):
+                self._set_cell(first_row + row_offset, first_col + col_offset, value)
+
+    @_api_call("update")
+    def update(self, range_name=None, values=None, **kwargs):
+        # Как в gspread 5: update(values) пишет с A1
+        if values is None and isinstance(range_name, list):
+            range_name, values = "A1", range_name
+        with self._client._lock:
+            self._update_range(range_name or "A1", values or [])
+
+    @_api_call("batch_update")
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs):
+        with self._client._lock:
+            for item in data:
+                self._update_range(item["range"], item["values"])
+
+    @_api_call("clear")
+    def clear(self):
+        with self._client._lock:
+            self._rows = []
+
+    @_api_call("find")
+    def find(self, query, in_row: Optional[int] = None, in_column: Optional[int] = None, **kwargs) -> Optional[Cell]:
+        with self._client._lock:
+            for row_index, row in enumerate(self._rows, start=1):
+                if in_row is not None and row_index != in_row:
+                    continue
+                for col_index, value in enumerate(row, start=1):
+                    if in_column is not None and col_index != in_column:
+                        continue
+                    if value == str(query):
+                        return Cell(row_index, col_index, value)
+        return None
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeClient", key: str, title: str = "Fake spreadsheet"):
+        self._client = client
+        self.id = key
+        self.title = title
+        self._sheets: "OrderedDict[str, FakeWorksheet]" = OrderedDict()
+        self._next_sheet_id = 0
+
+    def _add(self, title: str, rows: int, cols: int, sheet_id: Optional[int] = None) -> FakeWorksheet:
+        if sheet_id is None:
+            sheet_id = self._next_sheet_id
+        self._next_sheet_id = max(self._next_sheet_id, sheet_id) + 1
+        worksheet = FakeWorksheet(self, sheet_id, title, rows, cols)
+        self._sheets[title] = worksheet
+        return worksheet
+
+    def _by_id(self, sheet_id: int) -> FakeWorksheet:
+        for worksheet in self._sheets.values():
+            if worksheet.id == sheet_id:
+                return worksheet
+        raise WorksheetNotFound(sheet_id)
+
+    def _get(self, title: str) -> FakeWorksheet:
+        try:
+            return self._sheets[title]
+        except KeyError:
+            raise WorksheetNotFound(title)
+
+    # --- Заполнение фейка (без учета вызовов) ---
+
+    def seed(self, title: str, rows: List[List[Any]]) -> FakeWorksheet:
+        """Создает (или заменяет) лист с данными"""
+        with self._client._lock:
+            worksheet = self._sheets.get(title) or self._add(title, 1000, max((len(row) for row in rows), default=26))
+            worksheet._rows = [[FakeWorksheet._cell(value) for value in row] for row in rows]
+            return worksheet
+
+    # --- API ---
+
+    @_api_call("worksheets")
+    def worksheets(self) -> List[FakeWorksheet]:
+        with self._client._lock:
+            return list(self._sheets.values())
+
+    @_api_call("worksheet")
+    def worksheet(self, title: str) -> FakeWorksheet:
+        with self._client._lock:
+            return self._get(title)
+
+    @_api_call("add_worksheet")
+    def add_worksheet(self, title: str, rows: int, cols: int, index: Optional[int] = None) -> FakeWorksheet:
+        with self._client._lock:
+            return self._add(title, int(rows), int(cols))
+
+    @_api_call("fetch_sheet_metadata")
+    def fetch_sheet_metadata(self, params=None) -> Dict[str, Any]:
+        with self._client._lock:
+            return {
+                "spreadsheetId": self.id,
+                "properties": {"title": self.title},
+                "sheets": [{"properties": worksheet._properties(index)}
+                           for index, worksheet in enumerate(self._sheets.values())],
+            }
+
+    @_api_call("values_batch_get")
+    def values_batch_get(self, ranges: List[str], params=None) -> Dict[str, Any]:
+        """Поддерживается параметр majorDimension (ROWS или COLUMNS)"""
+        dimension = (params or {}).get("majorDimension", "ROWS")
+        value_ranges = []
+        with self._client._lock:
+            for range_name in ranges:
+                sheet, cells = _split_range(range_name)
+                values = self._get(sheet)._values(*_parse_cells(cells))
+                if dimension == "COLUMNS":
+                    values = _transpose(values)
+                value_range = {"range": range_name, "majorDimension": dimension}
+                if values:
+                    value_range["values"] = values
+                value_ranges.append(value_range)
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    @_api_call("values_batch_update")
+    def values_batch_update(self, params=None, body=None) -> Dict[str, Any]:
+        data = (body or {}).get("data", [])
+        with self._client._lock:
+            for item in data:
+                sheet, _ = _split_range(item["range"])
+                self._get(sheet)._update_range(item["range"], item["values"])
+        return {"spreadsheetId": self.id, "totalUpdatedCells": sum(len(row) for item in data for row in item["values"])}
+
+    @_api_call("spreadsheet_batch_update")
+    def batch_update(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Поддерживаются запросы addSheet, updateCells и updateSheetProperties"""
+        replies = []
+        with self._client._lock:
+            for request in body.get("requests", []):
+                if "addSheet" in request:
+                    properties = request["addSheet"]["properties"]
+                    grid = properties.get("gridProperties", {})
+                    worksheet = self._add(properties["title"], grid.get("rowCount", 1000),
+                                          grid.get("columnCount", 26), properties.get("sheetId"))
+                    replies.append({"addSheet": {"properties": worksheet._properties(len(self._sheets) - 1)}})
+                elif "updateCells" in request:
+                    update = request["updateCells"]
+                    worksheet = self._by_id(update["start"]["sheetId"])
+                    for row_offset, row in enumerate(update.get("rows", [])):
+                        for col_offset, cell in enumerate(row.get("values", [])):
+                            value = next(iter(cell.get("userEnteredValue", {"stringValue": ""}).values()))
+                            worksheet._set_cell(update["start"].get("rowIndex", 0) + row_offset + 1,
+                                                update["start"].get("columnIndex", 0) + col_offset + 1, value)
+                    replies.append({})
+                elif "updateSheetProperties" in request:
+                    properties = request["updateSheetProperties"]["properties"]
+                    worksheet = self._by_id(properties["sheetId"])
+                    grid = properties.get("gridProperties", {})
+                    worksheet.row_count = grid.get("rowCount", worksheet.row_count)
+                    worksheet.col_count = grid.get("columnCount", worksheet.col_count)
+                    replies.append({})
+                else:
+                    raise NotImplementedError(f"Unsupported batch_update request: {list(request)}")
+        return {"spreadsheetId": self.id, "replies": replies}
+
+
+class FakeClient:
+    """
+    Клиент фейка (вместо gspread.authorize(...)).
+
+    latency - задержка каждого запроса в секундах; rate_limit_every=N -
+    каждый N-й запрос отвечает 429; inject_rate_limit(count) - следующие
+    count запросов отвечают 429. Как и у настоящего клиента, каждый запрос
+    идет через client.request - его можно обернуть (учет, circuit breaker).
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit_every: Optional[int] = None):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.stats = CallStats()
+        self._lock = threading.RLock()
+        self._spreadsheets: Dict[str, FakeSpreadsheet] = {}
+        self._pending_rate_limits = 0
+        self._call_number = 0
+
+    def inject_rate_limit(self, count: int = 1):
+        with self._lock:
+            self._pending_rate_limits += count
+
+    def request(self, method: str, call: Callable[[], Any]) -> Any:
+        """Один запрос к API: задержка, внедренные 429 и учет в stats"""
+        started = time.perf_counter()
+        error = False
+        try:
+            self._before_call(method)
+            return call()
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.stats.record(method, time.perf_counter() - started, error)
+
+    def _before_call(self, method: str):
+        with self._lock:
+            self._call_number += 1
+            limited = self._pending_rate_limits > 0 or (
+                self.rate_limit_every and self._call_number % self.rate_limit_every == 0
+            )
+            if self._pending_rate_limits > 0:
+                self._pending_rate_limits -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            raise FakeRateLimitError(method)
+
+    def spreadsheet(self, key: str = "fake") -> FakeSpreadsheet:
+        """Таблица фейка без учета вызова (для заполнения и проверок)"""
+        with self._lock:
+            if key not in self._spreadsheets:
+                self._spreadsheets[key] = FakeSpreadsheet(self, key)
+            return self._spreadsheets[key]
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.request("open_by_key", lambda: self.spreadsheet(key))
+
+
+# --- Замер запросов на типовые действия ---
+
+# Лимиты запросов к API на действие: регрессия по числу запросов - код выхода 1
+ACTION_BUDGETS = {
+    "init": 3,
+    "sync_reminder CREATE": 2,
+    "sync_reminder UPDATE": 13,
+    "log_operation": 2,
+    "flush_send_history": 2,
+    "fetch_sheet_views": 1,
+    "restore_reminders_from_sheets": 3,
+    "mark_reminders_deleted": 4,
+    "update_chat_stats": 5,
+    "flush_last_sent": 2,
+}
+
+
+def run_benchmark(reminders: int = 200, latency: float = 0.0) -> bool:
+    """Замеряет запросы и время типовых действий SheetsManager, возвращает True, если лимиты соблюдены"""
+    import tempfile
+    from sheets_integration import SheetsManager
+
+    client = FakeClient(latency=latency)
+    sample = [{"id": str(i), "text": f"Reminder {i}", "type": "daily", "time": "09:00",
+               "chat_id": -100, "chat_name": "Chat", "created_at": "", "username": "bench"}
+              for i in range(1, reminders + 1)]
+    created = dict(sample[0], id=str(reminders + 1))
+    target = tempfile.NamedTemporaryFile(suffix=".json", delete=False).name
+
+    actions = [
+        ("init", lambda manager: None),
+        ("sync_reminder CREATE", lambda manager: manager.sync_reminder(created, "CREATE")),
+        ("sync_reminder UPDATE", lambda manager: manager.sync_reminder(sample[0], "UPDATE")),
+        ("log_operation", lambda manager: manager.log_operation("t", "BENCH", "0", "bench", 0, "details")),
+        ("flush_send_history", lambda manager: (manager.log_send_history("u", "m", "1", "-100", "SUCCESS"),
+                                                manager.flush_send_history())),
+        ("fetch_sheet_views", lambda manager: manager.fetch_sheet_views()),
+        ("restore_reminders_from_sheets", lambda manager: manager.restore_reminders_from_sheets(target)),
+        ("mark_reminders_deleted", lambda manager: manager.mark_reminders_deleted(sample[:50])),
+        ("update_chat_stats", lambda manager: manager.update_chat_stats(-100, "Chat", "group")),
+        ("flush_last_sent", lambda manager: ([manager.update_last_sent(r["id"], "2030-01-01 09:00:00") for r in sample[:100]],
+                                             manager.flush_last_sent())),
+    ]
+
+    manager = None
+    ok = True
+    print(f"{'action':32} {'calls':>5} {'budget':>6} {'seconds':>8}")
+    for name, action in actions:
+        client.stats.reset()
+        started = time.perf_counter()
+        if manager is None:
+            manager = SheetsManager(client=client, sheet_id="bench", spool_path=":memory:")
+            # Заполняем лист напоминаний для действий чтения
+            client.spreadsheet("bench").seed("Reminders", [
+                ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+                 "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+            ] + [[r["id"], r["text"], r["time"], r["type"], r["chat_id"], r["chat_name"], "Active", "", "bench", "", ""]
+                 for r in sample])
+        else:
+            action(manager)
+        seconds = time.perf_counter() - started
+        calls = client.stats.total
+        budget = ACTION_BUDGETS.get(name)
+        within = budget is None or calls <= budget
+        ok = ok and within
+        print(f"{name:32} {calls:>5} {budget if budget is not None else '-':>6} {seconds:>8.3f}{'' if within else '  ❌ over budget'}")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+    import logging
+
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,293 @@
+# metrics.py
+
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RateWindow:
+    """Счетчик событий в скользящем окне: посекундные корзины за последние window секунд"""
+
+    def __init__(self, window: int = 300):
+        self.window = window
+        self._buckets = deque()  # [секунда, количество]
+
+    def add(self, value: int = 1, now: float = None):
+        second = int(now if now is not None else time.time())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += value
+        else:
+            self._buckets.append([second, value])
+        self._trim(second)
+
+    def _trim(self, second: int):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+    def count(self, seconds: int = None, now: float = None) -> int:
+        """Сумма событий за последние seconds секунд (по умолчанию - за все окно)"""
+        second = int(now if now is not None else time.time())
+        self._trim(second)
+        since = second - min(seconds or self.window, self.window)
+        return sum(value for bucket_second, value in self._buckets if bucket_second > since)
+
+
+# Границы корзин гистограмм длительности, секунды
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+# Сколько последних длительностей хранится для перцентилей
+RECENT_SAMPLES = 512
+
+
+class Timing:
+    """Количество, ошибки и длительность вызовов одной операции (с гистограммой и p95 по последним вызовам)"""
+
+    __slots__ = ("count", "errors", "total", "max", "last", "buckets", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        self.recent.append(seconds)
+        index = bisect_left(HISTOGRAM_BUCKETS, seconds)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+
+    def percentile(self, q: float):
+        """Перцентиль q (0-100) по последним RECENT_SAMPLES вызовам, None - вызовов не было"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        p95 = self.percentile(95)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": round(self.total, 4),
+            "avg_seconds": round(self.total / self.count, 4) if self.count else None,
+            "p95_seconds": round(p95, 4) if p95 is not None else None,
+            "max_seconds": round(self.max, 4),
+            "last_seconds": round(self.last, 4) if self.last is not None else None,
+        }
+
+
+def _labels_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _series_name(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Имя серии в JSON документе: name или name{label="value",...}"""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _prometheus_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _prometheus_number(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Metrics:
+    """
+    Реестр метрик процесса: счетчики (с частотой за последние минуты),
+    тайминги операций с гистограммами и gauges - функции, которые
+    вычисляются при снимке. Счетчики и тайминги принимают метки (labels).
+
+    Запись - короткая блокировка без ввода-вывода, поэтому метрики можно
+    обновлять из потоков рассылки, а snapshot() и render_prometheus() -
+    вызывать из health-сервера.
+    """
+
+    def __init__(self, rate_window: int = 300, prefix: str = "reminder_bot"):
+        self._lock = threading.Lock()
+        self._rate_window = rate_window
+        self.prefix = prefix
+        self._counters: Dict[Tuple[str, tuple], int] = {}
+        self._rates: Dict[Tuple[str, tuple], RateWindow] = {}
+        self._timings: Dict[Tuple[str, tuple], Timing] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._started = time.time()
+
+    def incr(self, name: str, value: int = 1, **labels):
+        """Увеличивает счетчик name (с метками labels) на value"""
+        if value <= 0:
+            return
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            rate = self._rates.get(key)
+            if rate is None:
+                rate = self._rates[key] = RateWindow(self._rate_window)
+            rate.add(value)
+
+    def observe(self, name: str, seconds: float, error: bool = False, **labels):
+        """Записывает длительность одного вызова операции name"""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = self._timings[key] = Timing()
+            timing.add(seconds, error)
+
+    def gauge(self, name: str, func: Callable[[], Any]):
+        """Регистрирует gauge: func() вызывается при каждом снимке"""
+        with self._lock:
+            self._gauges[name] = func
+
+    def timed(self, name: str, **labels):
+        """
+        Декоратор: считает вызовы и длительность функции под именем name.
+        Ошибкой считается исключение или результат False / (False, ...).
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.monotonic()
+                error = True
+                try:
+                    result = func(*args, **kwargs)
+                    error = result is False or (isinstance(result, tuple) and bool(result) and result[0] is False)
+                    return result
+                finally:
+                    self.observe(name, time.monotonic() - started, error, **labels)
+            return wrapper
+        return decorator
+
+    def counter(self, name: str, **labels) -> int:
+        with self._lock:
+            return self._counters.get((name, _labels_key(labels)), 0)
+
+    def counters(self, name: str, label: str) -> Dict[str, int]:
+        """Значения счетчика name по значениям метки label"""
+        with self._lock:
+            return {dict(labels).get(label, ""): value
+                    for (series, labels), value in self._counters.items() if series == name}
+
+    def timings(self, name: str, label: str) -> Dict[str, Dict[str, Any]]:
+        """Тайминги операции name (as_dict) по значениям метки label"""
+        with self._lock:
+            return {dict(labels).get(label, ""): timing.as_dict()
+                    for (series, labels), timing in self._timings.items() if series == name}
+
+    def _gauge_values(self) -> Dict[str, Any]:
+        # Gauges вычисляются без блокировки реестра: одна упавшая не ломает снимок
+        with self._lock:
+            gauges = dict(self._gauges)
+        values = {}
+        for name, func in gauges.items():
+            try:
+                values[name] = func()
+            except Exception as e:
+                logger.debug(f"⚠️ Gauge {name} failed: {e}")
+                values[name] = None
+        return values
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Документ метрик: счетчики с частотами, тайминги и значения gauges"""
+        with self._lock:
+            counters = {
+                _series_name(name, labels): {
+                    "total": value,
+                    "last_1m": self._rates[(name, labels)].count(60),
+                    "last_5m": self._rates[(name, labels)].count(300),
+                }
+                for (name, labels), value in self._counters.items()
+            }
+            timings = {_series_name(name, labels): timing.as_dict()
+                       for (name, labels), timing in self._timings.items()}
+
+        return {
+            "uptime_seconds": round(time.time() - self._started, 1),
+            "counters": counters,
+            "timings": timings,
+            "gauges": self._gauge_values(),
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        Метрики в текстовом формате Prometheus (exposition format 0.0.4):
+        счетчики - <prefix>_<name>_total, тайминги - гистограммы
+        <prefix>_<name>_seconds и счетчики ошибок, числовые gauges - как есть.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted((key, (timing.count, timing.errors, timing.total, list(timing.buckets)))
+                             for key, timing in self._timings.items())
+
+        lines: List[str] = []
+        declared = set()
+
+        def declare(metric, kind):
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            declare(metric, "counter")
+            lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+
+        for (name, labels), (count, errors, total, buckets) in timings:
+            metric = f"{self.prefix}_{name}_seconds"
+            declare(metric, "histogram")
+            cumulative = 0
+            for bound, bucket in zip(HISTOGRAM_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{metric}_bucket{_prometheus_labels(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{metric}_bucket{_prometheus_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{metric}_sum{_prometheus_labels(labels)} {total!r}")
+            lines.append(f"{metric}_count{_prometheus_labels(labels)} {count}")
+        for (name, labels), (count, errors, total, buckets) in timings:
+            metric = f"{self.prefix}_{name}_errors_total"
+            declare(metric, "counter")
+            lines.append(f"{metric}{_prometheus_labels(labels)} {errors}")
+
+        gauges = self._gauge_values()
+        gauges["uptime_seconds"] = round(time.time() - self._started, 1)
+        for name, value in sorted(gauges.items()):
+            # Нечисловые gauges (словари, None) есть только в JSON документе
+            if not isinstance(value, (int, float)):
+                continue
+            metric = f"{self.prefix}_{name}"
+            declare(metric, "gauge")
+            lines.append(f"{metric} {_prometheus_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса
+metrics = Metrics()
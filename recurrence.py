@@ -0,0 +1,366 @@
+# recurrence.py
+
+import bisect
+import logging
+from datetime import datetime, time as dt_time, timedelta
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+WEEKDAYS = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"]
+WEEKDAYS_SHORT = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+_WEEKDAYS_EN = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+_WEEKDAY_ALIASES = {}
+for _index, _names in enumerate(zip(WEEKDAYS, WEEKDAYS_SHORT, _WEEKDAYS_EN)):
+    for _name in _names:
+        _WEEKDAY_ALIASES[_name] = _index
+
+# Русские синонимы ключевых слов правил
+_KEYWORD_ALIASES = {
+    "ежедневно": "daily",
+    "будни": "weekdays",
+    "еженедельно": "weekly",
+    "ежемесячно": "monthly",
+    "каждые": "every",
+}
+
+# Сколько дней вперед ищем подходящую дату (cron на 29 февраля и т.п.)
+MAX_SEARCH_DAYS = 366 * 5
+
+
+class RecurrenceError(ValueError):
+    """Некорректное расписание напоминания"""
+
+
+class Recurrence:
+    """
+    Скомпилированное расписание: next_after(after) возвращает следующее
+    срабатывание (aware datetime в MSK) строго после after или None.
+    rule - каноническая строка правила, describe() - описание для пользователя.
+    """
+
+    rule = ""
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.rule
+
+
+class OnceRecurrence(Recurrence):
+    def __init__(self, fire_at: datetime):
+        self.fire_at = fire_at
+        self.rule = fire_at.strftime("%Y-%m-%d %H:%M")
+
+    def next_after(self, after):
+        return self.fire_at if self.fire_at > after else None
+
+    def describe(self):
+        return f"Разово: {self.rule}"
+
+
+class CalendarRecurrence(Recurrence):
+    """
+    Срабатывания в заданные времена суток в подходящие дни.
+    Дни фильтруются как в cron: если ограничены и числа месяца, и дни недели,
+    достаточно совпадения любого из них; при match_any_day=False (поле cron
+    начинается с '*', например */2) день должен подходить под оба.
+    """
+
+    def __init__(self, times: List[Tuple[int, int]], weekdays: Optional[FrozenSet[int]] = None,
+                 monthdays: Optional[FrozenSet[int]] = None, months: Optional[FrozenSet[int]] = None,
+                 rule: str = "", description: str = "", match_any_day: bool = True):
+        if not times:
+            raise RecurrenceError("не указано время")
+        self.times = sorted(set(times))
+        self._clock = [dt_time(hour=h, minute=m) for h, m in self.times]
+        self.weekdays = weekdays
+        self.monthdays = monthdays
+        self.months = months
+        self.match_any_day = match_any_day
+        self.rule = rule
+        self._description = description or rule
+
+    def _day_matches(self, day) -> bool:
+        if self.months is not None and day.month not in self.months:
+            return False
+        if self.weekdays is not None and self.monthdays is not None:
+            if self.match_any_day:
+                return day.weekday() in self.weekdays or day.day in self.monthdays
+            return day.weekday() in self.weekdays and day.day in self.monthdays
+        if self.weekdays is not None:
+            return day.weekday() in self.weekdays
+        if self.monthdays is not None:
+            return day.day in self.monthdays
+        return True
+
+    def next_after(self, after):
+        after_msk = after.astimezone(MOSCOW_TZ)
+        day = after_msk.date()
+        # В первый день - только времена не раньше текущего
+        start = bisect.bisect_left(self.times, (after_msk.hour, after_msk.minute))
+        for _ in range(MAX_SEARCH_DAYS):
+            if self._day_matches(day):
+                for clock in self._clock[start:]:
+                    fire_at = MOSCOW_TZ.localize(datetime.combine(day, clock))
+                    if fire_at > after_msk:
+                        return fire_at
+            day += timedelta(days=1)
+            start = 0
+        return None
+
+    def describe(self):
+        return self._description
+
+
+class IntervalRecurrence(Recurrence):
+    """
+    Каждые N часов от времени суток anchor. Серия начинается заново каждый день
+    в anchor: если N не делит 24, последний интервал суток короче, но время
+    anchor не теряется (every 5h 09:00 - 09:00, 14:00, 19:00, 00:00, 05:00, 09:00...).
+    """
+
+    def __init__(self, hours: int, anchor: Tuple[int, int], rule: str = ""):
+        if not 1 <= hours <= 24:
+            raise RecurrenceError("интервал должен быть от 1 до 24 часов")
+        self.step = timedelta(hours=hours)
+        self.anchor = dt_time(hour=anchor[0], minute=anchor[1])
+        self.hours = hours
+        self.rule = rule
+
+    def next_after(self, after):
+        after_msk = after.astimezone(MOSCOW_TZ)
+        # Начало серии, в которую попадает after: anchor сегодня или вчера
+        day = after_msk.date()
+        start = MOSCOW_TZ.localize(datetime.combine(day, self.anchor))
+        if start > after_msk:
+            day -= timedelta(days=1)
+            start = MOSCOW_TZ.localize(datetime.combine(day, self.anchor))
+        next_start = MOSCOW_TZ.localize(datetime.combine(day + timedelta(days=1), self.anchor))
+        steps = (after_msk - start) // self.step + 1
+        return min(start + steps * self.step, next_start).astimezone(MOSCOW_TZ)
+
+    def describe(self):
+        return f"Каждые {self.hours} ч. (от {self.anchor.strftime('%H:%M')})"
+
+
+# --- Разбор правил ---
+
+def _parse_times(text: str) -> List[Tuple[int, int]]:
+    times = []
+    for part in text.split(","):
+        try:
+            parsed = datetime.strptime(part.strip(), "%H:%M")
+        except ValueError:
+            raise RecurrenceError(f"некорректное время '{part.strip()}', нужен формат ЧЧ:ММ")
+        times.append((parsed.hour, parsed.minute))
+    return times
+
+
+def _format_times(times) -> str:
+    return ",".join(f"{h:02d}:{m:02d}" for h, m in sorted(set(times)))
+
+
+def _parse_weekdays(text: str) -> FrozenSet[int]:
+    days = set()
+    for part in text.lower().split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = (p.strip() for p in part.split("-", 1))
+            if first not in _WEEKDAY_ALIASES or last not in _WEEKDAY_ALIASES:
+                raise RecurrenceError(f"некорректный диапазон дней '{part}'")
+            start, end = _WEEKDAY_ALIASES[first], _WEEKDAY_ALIASES[last]
+            days.update(range(start, end + 1) if start <= end else list(range(start, 7)) + list(range(0, end + 1)))
+        elif part in _WEEKDAY_ALIASES:
+            days.add(_WEEKDAY_ALIASES[part])
+        else:
+            raise RecurrenceError(f"некорректный день недели '{part}'")
+    return frozenset(days)
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> Optional[FrozenSet[int]]:
+    """Поле cron: *, */n, a, a/n (от a до конца диапазона), a-b, a-b/n и списки через запятую. None - без ограничения"""
+    if text == "*":
+        return None
+    values = set()
+    for text_part in text.split(","):
+        part, step = text_part, 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) < 1:
+                raise RecurrenceError(f"некорректный шаг '{step_text}'")
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise RecurrenceError(f"некорректный диапазон '{part}'")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            # a/n - от a до конца диапазона с шагом n
+            start, end = int(part), (high if "/" in text_part else int(part))
+        else:
+            raise RecurrenceError(f"некорректное значение '{part}'")
+        if start < low or end > high or start > end:
+            raise RecurrenceError(f"значение '{part}' вне диапазона {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def _parse_cron(fields: List[str]) -> Recurrence:
+    if len(fields) != 5:
+        raise RecurrenceError("cron: нужно 5 полей (минута час день месяц день_недели)")
+    # Как в cron: если день месяца или день недели начинается с '*' (в том числе */n),
+    # дни должны подходить под оба поля, иначе - под любое из них
+    match_any_day = not (fields[2].startswith("*") or fields[4].startswith("*"))
+    minutes = _parse_cron_field(fields[0], 0, 59)
+    hours = _parse_cron_field(fields[1], 0, 23)
+    monthdays = _parse_cron_field(fields[2], 1, 31)
+    months = _parse_cron_field(fields[3], 1, 12)
+    cron_weekdays = _parse_cron_field(fields[4], 0, 7)
+    # В cron 0 и 7 - воскресенье, в Python понедельник = 0
+    weekdays = frozenset((d + 6) % 7 for d in cron_weekdays) if cron_weekdays is not None else None
+    times = [(h, m) for h in sorted(hours if hours is not None else range(24))
+             for m in sorted(minutes if minutes is not None else range(60))]
+    rule = "cron " + " ".join(fields)
+    return CalendarRecurrence(times, weekdays=weekdays, monthdays=monthdays, months=months,
+                              rule=rule, description=f"По расписанию cron: {' '.join(fields)}",
+                              match_any_day=match_any_day)
+
+
+@lru_cache(maxsize=4096)
+def parse_rule(text: str) -> Recurrence:
+    """
+    Компилирует текстовое правило (результат кэшируется):
+      daily 09:00[,18:00]           - ежедневно
+      weekdays 09:00                - по будням (пн-пт)
+      weekly пн,ср,пт 09:00         - по дням недели (также пн-пт, mon, понедельник)
+      monthly 1,15 09:00            - по числам месяца
+      every 3h [09:00]              - каждые N часов от указанного времени (ежедневно с него)
+      cron 0 9 * * 1-5              - выражение cron (MSK)
+    """
+    parts = (text or "").strip().split()
+    if not parts:
+        raise RecurrenceError("пустое правило")
+    keyword = parts[0].lower()
+    keyword = _KEYWORD_ALIASES.get(keyword, keyword)
+    args = parts[1:]
+
+    if keyword == "cron":
+        return _parse_cron(args)
+
+    if keyword == "daily" and len(args) == 1:
+        times = _parse_times(args[0])
+        return CalendarRecurrence(times, rule=f"daily {_format_times(times)}",
+                                  description=f"Ежедневно в {_format_times(times)}")
+
+    if keyword == "weekdays" and len(args) == 1:
+        times = _parse_times(args[0])
+        return CalendarRecurrence(times, weekdays=frozenset(range(5)), rule=f"weekdays {_format_times(times)}",
+                                  description=f"По будням в {_format_times(times)}")
+
+    if keyword == "weekly" and len(args) == 2:
+        weekdays = _parse_weekdays(args[0])
+        times = _parse_times(args[1])
+        days_text = ",".join(WEEKDAYS_SHORT[d] for d in sorted(weekdays))
+        return CalendarRecurrence(times, weekdays=weekdays, rule=f"weekly {days_text} {_format_times(times)}",
+                                  description=f"Еженедельно: {days_text.replace(',', ', ').title()} в {_format_times(times)}")
+
+    if keyword == "monthly" and len(args) == 2:
+        monthdays = _parse_cron_field(args[0], 1, 31)
+        if monthdays is None:
+            raise RecurrenceError("monthly: укажите числа месяца, например 1,15")
+        times = _parse_times(args[1])
+        days_text = ",".join(str(d) for d in sorted(monthdays))
+        return CalendarRecurrence(times, monthdays=monthdays, rule=f"monthly {days_text} {_format_times(times)}",
+                                  description=f"Ежемесячно {days_text.replace(',', ', ')} числа в {_format_times(times)}")
+
+    if keyword == "every" and len(args) in (1, 2):
+        interval = args[0].lower().rstrip("hч")
+        if not interval.isdigit():
+            raise RecurrenceError(f"некорректный интервал '{args[0]}', например: every 3h")
+        anchor = _parse_times(args[1])[0] if len(args) == 2 else (0, 0)
+        hours = int(interval)
+        return IntervalRecurrence(hours, anchor, rule=f"every {hours}h {_format_times([anchor])}")
+
+    raise RecurrenceError(f"неизвестное правило '{text.strip()}'")
+
+
+@lru_cache(maxsize=4096)
+def _compile(reminder_type: str, datetime_text: str, time_text: str, day: str, rule: str) -> Recurrence:
+    if reminder_type == "once":
+        try:
+            fire_at = MOSCOW_TZ.localize(datetime.strptime(datetime_text.strip(), "%Y-%m-%d %H:%M"))
+        except ValueError:
+            raise RecurrenceError(f"некорректная дата '{datetime_text}'")
+        return OnceRecurrence(fire_at)
+    if reminder_type == "daily":
+        return parse_rule(f"daily {time_text}")
+    if reminder_type == "weekly":
+        weekday = _WEEKDAY_ALIASES.get(day.strip().lower())
+        if weekday is None:
+            raise RecurrenceError(f"некорректный день недели '{day}'")
+        times = _parse_times(time_text)
+        return CalendarRecurrence(times, weekdays=frozenset([weekday]),
+                                  rule=f"weekly {WEEKDAYS_SHORT[weekday]} {_format_times(times)}",
+                                  description=f"Еженедельно: {WEEKDAYS[weekday].title()} {_format_times(times)}")
+    if reminder_type == "custom":
+        return parse_rule(rule)
+    raise RecurrenceError(f"неизвестный тип напоминания '{reminder_type}'")
+
+
+def compile_reminder(reminder: Dict[str, Any]) -> Recurrence:
+    """Скомпилированное расписание напоминания (общий кэш для всех потребителей)"""
+    return _compile(
+        str(reminder.get("type") or ""),
+        str(reminder.get("datetime") or ""),
+        str(reminder.get("time") or ""),
+        str(reminder.get("day") or ""),
+        str(reminder.get("rule") or ""),
+    )
+
+
+def schedule_text(reminder: Dict[str, Any]) -> str:
+    """Значение колонки Time_MSK в Google Sheets для напоминания"""
+    reminder_type = reminder.get("type")
+    if reminder_type == "custom":
+        return reminder.get("rule") or reminder.get("time", "")
+    if reminder_type == "once":
+        return reminder.get("datetime") or reminder.get("time", "")
+    if reminder_type == "weekly" and reminder.get("day") and " " not in str(reminder.get("time", "")):
+        return f"{reminder['day']} {reminder.get('time', '')}"
+    return reminder.get("time", "")
+
+
+def schedule_fields(reminder_type: str, value: str, days_of_week: str = "") -> Dict[str, Any]:
+    """
+    Поля расписания напоминания из колонок Time_MSK/Days_Of_Week Google Sheets.
+    Бросает RecurrenceError, если расписание не компилируется.
+    """
+    value = str(value or "").strip()
+    if reminder_type == "once":
+        fields = {"type": "once", "datetime": value}
+    elif reminder_type == "daily":
+        fields = {"type": "daily", "time": value}
+    elif reminder_type == "weekly":
+        parts = value.split()
+        if len(parts) >= 2:
+            # Формат: "понедельник 10:00"
+            day, time_text = parts[0].lower(), parts[1]
+        else:
+            day, time_text = (days_of_week.strip().lower() or "понедельник"), value or "10:00"
+        fields = {"type": "weekly", "day": day, "time": time_text, "days_of_week": day}
+    elif reminder_type == "custom":
+        fields = {"type": "custom", "rule": parse_rule(value).rule}
+    else:
+        raise RecurrenceError(f"неизвестный тип напоминания '{reminder_type}'")
+    compile_reminder(fields)
+    return fields
@@ -0,0 +1,474 @@
+# scheduler.py
+
+import bisect
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+
+# Фазы записей кучи: подготовка рассылки и само срабатывание
+PREPARE, FIRE = 0, 1
+
+
+class _Entry:
+    __slots__ = ("reminder", "fire_ts", "seq", "prepare_pending")
+
+    def __init__(self, reminder, fire_ts, seq):
+        self.reminder = reminder
+        self.fire_ts = fire_ts
+        self.seq = seq
+        self.prepare_pending = False
+
+
+class UpcomingIndex:
+    """
+    Отсортированный индекс ближайших срабатываний, разбитый на группы (чаты).
+
+    Каждое напоминание хранится один раз вместе со своим следующим временем
+    срабатывания; индекс обновляется при планировании, снятии с расписания и
+    после каждого срабатывания. Ближайшее напоминание группы - первый элемент
+    ее списка, а следующие N срабатываний собираются ленивым слиянием без
+    перебора всех напоминаний.
+    """
+
+    def __init__(self, group_key: Callable[[Dict[str, Any]], str]):
+        self._group_key = group_key
+        self._groups: Dict[str, List[Tuple[float, str]]] = {}
+        self._items: Dict[str, Tuple[str, float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, reminder: Dict[str, Any], fire_at: Optional[datetime]):
+        """Записывает следующее срабатывание напоминания (None - убирает его из индекса)"""
+        reminder_id = str(reminder.get("id"))
+        with self._lock:
+            self._remove_locked(reminder_id)
+            if fire_at is None:
+                return
+            group = str(self._group_key(reminder))
+            fire_ts = fire_at.timestamp()
+            bisect.insort(self._groups.setdefault(group, []), (fire_ts, reminder_id))
+            self._items[reminder_id] = (group, fire_ts, reminder)
+
+    def remove(self, reminder_id) -> bool:
+        with self._lock:
+            return self._remove_locked(str(reminder_id))
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+            self._items.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def head(self, groups) -> Optional[Tuple[Dict[str, Any], datetime]]:
+        """Ближайшее срабатывание среди групп: (reminder, fire_at UTC) или None"""
+        best = None
+        with self._lock:
+            for group in groups:
+                bucket = self._groups.get(str(group))
+                if bucket and (best is None or bucket[0] < best):
+                    best = bucket[0]
+            if best is None:
+                return None
+            reminder = self._items[best[1]][2]
+        return reminder, datetime.fromtimestamp(best[0], pytz.UTC)
+
+    def peek(self) -> Optional[datetime]:
+        """Ближайшее срабатывание среди всех групп (UTC) или None"""
+        with self._lock:
+            heads = [bucket[0][0] for bucket in self._groups.values()]
+        return datetime.fromtimestamp(min(heads), pytz.UTC) if heads else None
+
+    def firings(self, groups, limit: int,
+                next_fire: Callable[[Dict[str, Any], datetime], Optional[datetime]]
+                ) -> List[Tuple[Dict[str, Any], datetime]]:
+        """
+        Следующие limit срабатываний групп по времени, включая повторы
+        ежедневных и еженедельных напоминаний: [(reminder, fire_at UTC)].
+        """
+        if limit <= 0:
+            return []
+        # Любое из первых limit срабатываний начинается среди первых limit
+        # элементов какой-то группы - остальные можно не смотреть
+        with self._lock:
+            heap = [(fire_ts, reminder_id, self._items[reminder_id][2])
+                    for group in groups
+                    for fire_ts, reminder_id in self._groups.get(str(group), [])[:limit]]
+        heapq.heapify(heap)
+
+        result = []
+        while heap and len(result) < limit:
+            fire_ts, reminder_id, reminder = heapq.heappop(heap)
+            fire_at = datetime.fromtimestamp(fire_ts, pytz.UTC)
+            result.append((reminder, fire_at))
+            try:
+                next_at = next_fire(reminder, fire_at)
+            except Exception:
+                next_at = None
+            if next_at is not None:
+                heapq.heappush(heap, (next_at.timestamp(), reminder_id, reminder))
+        return result
+
+    def _remove_locked(self, reminder_id) -> bool:
+        item = self._items.pop(reminder_id, None)
+        if item is None:
+            return False
+        group, fire_ts, _ = item
+        bucket = self._groups[group]
+        position = bisect.bisect_left(bucket, (fire_ts, reminder_id))
+        if position < len(bucket) and bucket[position] == (fire_ts, reminder_id):
+            del bucket[position]
+        if not bucket:
+            del self._groups[group]
+        return True
+
+
+class LoadShaper:
+    """
+    Разносит срабатывания, попавшие на одну минуту, внутри этой минуты.
+
+    Напоминания на круглое время (09:00, 18:00) иначе стартуют одновременно
+    и упираются в лимиты Telegram и Google Sheets. Каждому срабатыванию
+    назначается сдвиг в [0, spread] секунд: суммарная ожидаемая рассылка
+    (число сообщений) уже размещенных в этой минуте напоминаний, деленная на
+    устойчивую скорость rate (сообщений в секунду). Сдвиг только вперед и не
+    больше spread < 60, поэтому напоминание приходит в обещанную минуту.
+
+    fanout(reminder) - ожидаемое число сообщений одного срабатывания.
+    Методы place/release вызываются под блокировкой планировщика.
+    """
+
+    def __init__(self, fanout: Callable[[Dict[str, Any]], int], rate: float, spread: float):
+        self._fanout = fanout
+        self._rate = max(float(rate), 0.001)
+        self._spread = min(max(float(spread), 0.0), 59.0)
+        self._slots: Dict[int, List[Any]] = {}  # минута -> [нагрузка, {id: (сдвиг, вес)}]
+        self._placement: Dict[str, int] = {}
+
+    def weight(self, reminder: Dict[str, Any]) -> int:
+        """Ожидаемая рассылка срабатывания (вызывается без блокировки)"""
+        try:
+            return max(int(self._fanout(reminder)), 1)
+        except Exception:
+            return 1
+
+    def place(self, reminder_id: str, weight: int, fire_ts: float) -> float:
+        """Возвращает сдвинутое время срабатывания и учитывает его нагрузку в минуте"""
+        slot = int(fire_ts // 60)
+        if self._placement.get(reminder_id) == slot:
+            return fire_ts + self._slots[slot][1][reminder_id][0]
+
+        self.release(reminder_id)
+        bucket = self._slots.setdefault(slot, [0, {}])
+        offset = min(self._spread, bucket[0] / self._rate)
+        bucket[0] += weight
+        bucket[1][reminder_id] = (offset, weight)
+        self._placement[reminder_id] = slot
+        return fire_ts + offset
+
+    def release(self, reminder_id: str):
+        slot = self._placement.pop(reminder_id, None)
+        if slot is None:
+            return
+        bucket = self._slots[slot]
+        _, weight = bucket[1].pop(reminder_id)
+        bucket[0] -= weight
+        if not bucket[1]:
+            del self._slots[slot]
+
+    def clear(self):
+        self._slots.clear()
+        self._placement.clear()
+
+    def peak_load(self) -> int:
+        """Наибольшая ожидаемая рассылка, приходящаяся на одну минуту"""
+        return max((bucket[0] for bucket in self._slots.values()), default=0)
+
+
+class AdaptiveInterval:
+    """
+    Интервал периодической задачи, подстраивающийся под частоту изменений.
+
+    После изменения интервал сбрасывается до minimum; каждый запуск без
+    изменений умножает его на factor, но не выше maximum.
+    """
+
+    def __init__(self, minimum: float, maximum: float, initial: Optional[float] = None, factor: float = 2.0):
+        self.minimum = max(float(minimum), 1.0)
+        self.maximum = max(float(maximum), self.minimum)
+        self.factor = max(float(factor), 1.0)
+        self.current = min(max(float(initial or minimum), self.minimum), self.maximum)
+        self._lock = threading.Lock()
+
+    def next(self, changed: bool) -> float:
+        """Учитывает результат запуска и возвращает паузу до следующего"""
+        with self._lock:
+            if changed:
+                self.current = self.minimum
+            else:
+                self.current = min(self.current * self.factor, self.maximum)
+            return self.current
+
+    def reset(self, value: Optional[float] = None):
+        with self._lock:
+            self.current = min(max(float(value or self.minimum), self.minimum), self.maximum)
+
+
+class ReminderScheduler:
+    """
+    Планировщик напоминаний на min-heap вместо отдельного задания JobQueue
+    на каждое напоминание.
+
+    Один поток спит до ближайшего времени срабатывания и передает сработавшие
+    напоминания в on_fire(reminder, fire_at). Добавление, удаление и
+    перепланирование - O(log n): удаленные записи помечаются устаревшими
+    (ленивое удаление) и выбрасываются при извлечении из кучи.
+
+    next_fire(reminder, after) вычисляет следующее время срабатывания строго
+    после after (aware datetime) или возвращает None, если напоминание
+    больше не должно срабатывать (разовое).
+
+    Если передан index (UpcomingIndex), планировщик поддерживает его в
+    актуальном состоянии под той же блокировкой; shaper (LoadShaper) разносит
+    одновременные срабатывания внутри их минуты.
+
+    on_prepare(reminder, fire_at) вызывается за prepare_lead секунд до
+    срабатывания, чтобы заранее подготовить рассылку; вызов не должен
+    блокировать поток планировщика.
+    """
+
+    # Перестраиваем кучу, когда устаревших записей больше, чем живых
+    COMPACT_MIN_STALE = 1024
+
+    def __init__(self, on_fire: Callable[[Dict[str, Any], datetime], None],
+                 next_fire: Callable[[Dict[str, Any], datetime], Optional[datetime]],
+                 name: str = "reminder-scheduler", index: Optional[UpcomingIndex] = None,
+                 shaper: Optional[LoadShaper] = None,
+                 on_prepare: Optional[Callable[[Dict[str, Any], datetime], None]] = None,
+                 prepare_lead: float = 0.0):
+        self._on_fire = on_fire
+        self._on_prepare = on_prepare
+        self._prepare_lead = prepare_lead if on_prepare is not None else 0.0
+        self._next_fire = next_fire
+        self._name = name
+        self._index = index
+        self._shaper = shaper
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._entries: Dict[str, _Entry] = {}
+        self._pending_prepares = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Управление записями ---
+
+    def schedule(self, reminder: Dict[str, Any], after: Optional[datetime] = None) -> Optional[datetime]:
+        """Планирует (или перепланирует) напоминание, возвращает время срабатывания"""
+        reminder_id = str(reminder.get("id"))
+        after = after or datetime.now(pytz.UTC)
+        fire_at = self._next_fire(reminder, after)
+        weight = self._shaper.weight(reminder) if self._shaper is not None and fire_at is not None else 1
+
+        with self._cond:
+            if fire_at is None:
+                self._discard_locked(reminder_id)
+                return None
+            fire_ts = self._push_locked(reminder_id, reminder, fire_at.timestamp(), weight)
+            self._cond.notify()
+        return datetime.fromtimestamp(fire_ts, pytz.UTC)
+
+    def unschedule(self, reminder_id) -> bool:
+        """Снимает напоминание с расписания, возвращает True, если оно было запланировано"""
+        with self._cond:
+            removed = self._discard_locked(str(reminder_id))
+            if removed:
+                self._maybe_compact_locked()
+            return removed
+
+    def clear(self):
+        with self._cond:
+            self._entries.clear()
+            self._heap.clear()
+            self._pending_prepares = 0
+            if self._index is not None:
+                self._index.clear()
+            if self._shaper is not None:
+                self._shaper.clear()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def __contains__(self, reminder_id):
+        with self._cond:
+            return str(reminder_id) in self._entries
+
+    def next_fire_time(self, reminder_id) -> Optional[datetime]:
+        with self._cond:
+            entry = self._entries.get(str(reminder_id))
+            return datetime.fromtimestamp(entry.fire_ts, pytz.UTC) if entry else None
+
+    def entries(self, limit: Optional[int] = None) -> List[Tuple[str, datetime]]:
+        """[(reminder_id, fire_at UTC)] в порядке срабатывания (limit - только ближайшие)"""
+        with self._cond:
+            items = [(entry.fire_ts, reminder_id) for reminder_id, entry in self._entries.items()]
+        items = heapq.nsmallest(limit, items) if limit is not None else sorted(items)
+        return [(reminder_id, datetime.fromtimestamp(ts, pytz.UTC)) for ts, reminder_id in items]
+
+    # --- Поток планировщика ---
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+        logger.info(f"⏱️ Reminder scheduler started with {len(self)} reminders")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._running and self._thread and self._thread.is_alive())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._wait_for_due_locked()
+                if due is None:
+                    return
+
+            for phase, reminder, fire_ts in due:
+                fire_at = datetime.fromtimestamp(fire_ts, pytz.UTC)
+                if phase == PREPARE:
+                    try:
+                        self._on_prepare(reminder, fire_at)
+                    except Exception as e:
+                        logger.error(f"❌ Error preparing reminder {reminder.get('id')}: {e}")
+                    continue
+                try:
+                    self._on_fire(reminder, fire_at)
+                except Exception as e:
+                    logger.error(f"❌ Error dispatching reminder {reminder.get('id')}: {e}")
+                self._advance(reminder, fire_ts, fire_at)
+
+    def _wait_for_due_locked(self):
+        """
+        Ждет ближайшей записи кучи; возвращает список (фаза, reminder, fire_ts)
+        или None при остановке
+        """
+        while self._running:
+            self._drop_stale_head_locked()
+            if not self._heap:
+                self._cond.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                self._cond.wait(timeout=delay)
+                continue
+
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, reminder_id, phase = heapq.heappop(self._heap)
+                entry = self._entries.get(reminder_id)
+                if entry is None or entry.seq != seq:
+                    continue
+                if phase == PREPARE:
+                    entry.prepare_pending = False
+                    self._pending_prepares -= 1
+                due.append((phase, entry.reminder, entry.fire_ts))
+            if due:
+                return due
+        return None
+
+    def _advance(self, reminder, fire_ts, fire_at):
+        """После срабатывания планирует следующее (или удаляет разовое напоминание)"""
+        reminder_id = str(reminder.get("id"))
+        try:
+            next_at = self._next_fire(reminder, fire_at)
+        except Exception as e:
+            logger.error(f"❌ Error computing next fire time for reminder {reminder_id}: {e}")
+            next_at = None
+        weight = self._shaper.weight(reminder) if self._shaper is not None and next_at is not None else 1
+
+        with self._cond:
+            entry = self._entries.get(reminder_id)
+            # Напоминание могли перепланировать или удалить, пока шла отправка
+            if entry is None or entry.fire_ts != fire_ts or entry.reminder is not reminder:
+                return
+            if next_at is None:
+                self._discard_locked(reminder_id)
+            else:
+                self._push_locked(reminder_id, reminder, next_at.timestamp(), weight)
+
+    # --- Работа с кучей (под блокировкой) ---
+
+    def _push_locked(self, reminder_id, reminder, fire_ts, weight=1):
+        if self._shaper is not None:
+            fire_ts = self._shaper.place(reminder_id, weight, fire_ts)
+        seq = next(self._seq)
+        self._forget_prepare_locked(self._entries.get(reminder_id))
+        entry = _Entry(reminder, fire_ts, seq)
+        self._entries[reminder_id] = entry
+        heapq.heappush(self._heap, (fire_ts, seq, reminder_id, FIRE))
+        # Подготовка только если до срабатывания еще есть время
+        if self._prepare_lead > 0 and fire_ts - self._prepare_lead > time.time():
+            heapq.heappush(self._heap, (fire_ts - self._prepare_lead, seq, reminder_id, PREPARE))
+            entry.prepare_pending = True
+            self._pending_prepares += 1
+        if self._index is not None:
+            self._index.update(reminder, datetime.fromtimestamp(fire_ts, pytz.UTC))
+        self._maybe_compact_locked()
+        return fire_ts
+
+    def _forget_prepare_locked(self, entry):
+        if entry is not None and entry.prepare_pending:
+            entry.prepare_pending = False
+            self._pending_prepares -= 1
+
+    def _discard_locked(self, reminder_id) -> bool:
+        entry = self._entries.pop(reminder_id, None)
+        self._forget_prepare_locked(entry)
+        removed = entry is not None
+        if self._index is not None:
+            self._index.remove(reminder_id)
+        if self._shaper is not None:
+            self._shaper.release(reminder_id)
+        return removed
+
+    def _drop_stale_head_locked(self):
+        while self._heap:
+            _, seq, reminder_id, _ = self._heap[0]
+            entry = self._entries.get(reminder_id)
+            if entry is not None and entry.seq == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _maybe_compact_locked(self):
+        live = len(self._entries) + self._pending_prepares
+        stale = len(self._heap) - live
+        if stale > self.COMPACT_MIN_STALE and stale > live:
+            self._heap = [(entry.fire_ts, entry.seq, reminder_id, FIRE)
+                          for reminder_id, entry in self._entries.items()]
+            self._heap.extend((entry.fire_ts - self._prepare_lead, entry.seq, reminder_id, PREPARE)
+                              for reminder_id, entry in self._entries.items() if entry.prepare_pending)
+            heapq.heapify(self._heap)
@@ -2,19 +2,99 @@
 
 import os
 import json
+import uuid
 import logging
 from datetime import datetime
 import pytz
 from typing import Dict, List, Any, Optional
 import gspread
+import requests
 from google.oauth2.service_account import Credentials
 import time
 import random
+import atexit
+import threading
+from collections import Counter
+from functools import wraps
+from itertools import zip_longest
+from storage import get_store
+from spool import WriteSpool
+from circuit_breaker import CircuitBreaker, CircuitOpenError, OPEN, CLOSED
+from metrics import metrics
+from recurrence import schedule_fields, schedule_text, RecurrenceError
 
 # Константы
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Send_History пишется пачками в фоне: строки копятся в очереди и уходят одним
+# append_rows раз в SEND_HISTORY_FLUSH_SECONDS или при накоплении пачки
+SEND_HISTORY_FLUSH_SECONDS = float(os.environ.get('SEND_HISTORY_FLUSH_SECONDS', 5))
+SEND_HISTORY_BATCH_SIZE = 200
+SEND_HISTORY_MAX_QUEUE = 5000
+# Last_Sent напоминаний копится в памяти (по ID, последнее значение побеждает) и
+# пишется тем же фоновым потоком одним values_batch_update
+
+# Записи, которые не удалось отправить в Google Sheets, откладываются в локальный
+# SQLite spool и отправляются фоновым потоком по порядку пачками, когда Sheets снова доступен
+SHEETS_SPOOL_PATH = os.environ.get('SHEETS_SPOOL_PATH', 'sheets_spool.db')
+SPOOL_REPLAY_SECONDS = float(os.environ.get('SPOOL_REPLAY_SECONDS', 30))
+SPOOL_MAX_DELAY_SECONDS = 600
+SPOOL_BATCH_SIZE = 500
+
+# Circuit breaker: после SHEETS_BREAKER_FAILURES сбоев подряд (429, 5xx, сеть)
+# запросы к Sheets не выполняются SHEETS_BREAKER_COOLDOWN секунд - записи сразу
+# уходят в spool, чтения возвращают None (бот работает по локальным файлам).
+# Затем один пробный запрос проверяет, восстановился ли сервис
+SHEETS_BREAKER_FAILURES = int(os.environ.get('SHEETS_BREAKER_FAILURES', 3))
+SHEETS_BREAKER_COOLDOWN = float(os.environ.get('SHEETS_BREAKER_COOLDOWN', 60))
+SHEETS_BREAKER_MAX_COOLDOWN = 600
+# Таймаут одного HTTP запроса к Sheets API (по умолчанию у gspread его нет)
+SHEETS_REQUEST_TIMEOUT = float(os.environ.get('SHEETS_REQUEST_TIMEOUT', 20))
 logger = logging.getLogger(__name__)
 
+# Публичный метод SheetsManager, который выполняется в текущем потоке: ему
+# приписываются запросы к API, ответы 429 и паузы между повторами
+_operation = threading.local()
+
+def current_operation() -> str:
+    """Имя метода SheetsManager, выполняемого в текущем потоке ('other' - вне методов)"""
+    return getattr(_operation, 'name', None) or 'other'
+
+def sheets_operation(name: str):
+    """
+    Декоратор публичного метода SheetsManager: тайминг sheets_request{method=name}
+    и учет запросов к API, ответов 429 и пауз на повторы этого метода.
+    Во вложенных вызовах запросы приписываются внутреннему методу.
+    """
+    def decorator(func):
+        timed = metrics.timed("sheets_request", method=name)(func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            outer = getattr(_operation, 'name', None), getattr(_operation, 'breaker', None)
+            _operation.name, _operation.breaker = name, self.breaker
+            try:
+                return timed(self, *args, **kwargs)
+            finally:
+                _operation.name, _operation.breaker = outer
+        return wrapper
+    return decorator
+
+def _count_api_request(*args):
+    """Один HTTP запрос к Sheets API в рамках текущего метода"""
+    metrics.incr("sheets_api_requests", method=current_operation())
+
+def _is_rate_limit(error: Exception) -> bool:
+    error_str = str(error)
+    return "429" in error_str or "RATE_LIMIT_EXCEEDED" in error_str or "Quota exceeded" in error_str
+
+def _is_outage(error: Exception) -> bool:
+    """Сбой сервиса (429, 5xx, таймаут, сеть), а не ошибка конкретного запроса"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (OSError, requests.RequestException)) or _is_rate_limit(error)
+
 def handle_rate_limit_with_retry(func, max_retries: int = 3, base_delay: float = 1.0):
     """
     Обработка rate limiting с экспоненциальной задержкой и jitter
@@ -28,10 +108,14 @@ def handle_rate_limit_with_retry(func, max_retries: int = 3, base_delay: float =
         try:
             return func()
         except Exception as e:
-            error_str = str(e)
-            
             # Проверяем на ошибку rate limiting
-            if "429" in error_str or "RATE_LIMIT_EXCEEDED" in error_str or "Quota exceeded" in error_str:
+            if _is_rate_limit(e):
+                metrics.incr("sheets_rate_limited", method=current_operation())
+                breaker = getattr(_operation, 'breaker', None)
+                if breaker is not None and breaker.is_open:
+                    # Цепь разомкнулась - повторы только задержали бы вызывающего
+                    logger.warning("🔌 Rate limit exceeded and Google Sheets circuit is open. Not retrying.")
+                    raise
                 if attempt < max_retries:
                     # Более агрессивная экспоненциальная задержка для rate limiting
                     if attempt == 0:
@@ -42,6 +126,7 @@ def handle_rate_limit_with_retry(func, max_retries: int = 3, base_delay: float =
                         delay = base_delay * 6 + random.uniform(2.0, 4.0)  # 8-10 секунд
                     
                     logger.warning(f"⏱️ Rate limit exceeded. Retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries + 1})")
+                    metrics.observe("sheets_rate_limit_sleep", delay, method=current_operation())
                     time.sleep(delay)
                     continue
                 else:
@@ -53,38 +138,86 @@ def handle_rate_limit_with_retry(func, max_retries: int = 3, base_delay: float =
     
     return None
 
+class ChatColumns:
+    """
+    Колонки Chat_ID и Status листа Chat_Stats как они пришли из API (два плоских
+    списка, первая ячейка - заголовок). Итерация отдает пары (Chat_ID, Status)
+    по номеру строки, не создавая записей на каждый чат.
+    """
+
+    __slots__ = ('chat_ids', 'statuses')
+
+    def __init__(self, chat_ids: List[Any], statuses: List[Any]):
+        self.chat_ids = chat_ids
+        # Старый лист без колонки Status (в H что-то другое) - все чаты активны
+        self.statuses = statuses if statuses[:1] == ['Status'] else []
+
+    def __len__(self) -> int:
+        return max(len(self.chat_ids) - 1, 0)
+
+    def __iter__(self):
+        statuses = self.statuses
+        for index in range(1, len(self.chat_ids)):
+            yield self.chat_ids[index], statuses[index] if index < len(statuses) else ''
+
+
 class SheetsManager:
-    def __init__(self):
+    def __init__(self, client=None, sheet_id: Optional[str] = None, spool_path: Optional[str] = None):
+        """
+        client - готовый клиент с API gspread (например, fake_gspread.FakeClient);
+        без него клиент создается из GOOGLE_SHEETS_CREDENTIALS.
+        sheet_id - ID таблицы (по умолчанию GOOGLE_SHEETS_ID).
+        """
         self.credentials = None
-        self.client = None
+        self.client = client
         self.spreadsheet = None
-        self.sheet_id = None
+        self.sheet_id = sheet_id
         self.is_initialized = False
+        self._send_history_rows = []
+        self._send_history_cond = threading.Condition()
+        self._send_history_thread = None
+        self._last_sent: Dict[str, str] = {}
+        self._spool = self._open_spool(spool_path or SHEETS_SPOOL_PATH)
+        self._replay_lock = threading.Lock()
+        self._replay_wakeup = threading.Event()
+        self._replay_thread = None
+        self.breaker = CircuitBreaker("Google Sheets", SHEETS_BREAKER_FAILURES, SHEETS_BREAKER_COOLDOWN,
+                                      SHEETS_BREAKER_MAX_COOLDOWN, on_change=self._on_breaker_change)
         self._init_sheets()
+        if self.is_initialized and self.spool_pending():
+            logger.info(f"📦 {self.spool_depth} deferred Google Sheets writes found, replaying in background")
+            self._start_replayer()
     
+    @sheets_operation("init")
     def _init_sheets(self):
         """Инициализация Google Sheets"""
         try:
             # Получаем данные из переменных окружения
-            sheets_creds = os.environ.get('GOOGLE_SHEETS_CREDENTIALS')
-            self.sheet_id = os.environ.get('GOOGLE_SHEETS_ID')
+            self.sheet_id = self.sheet_id or os.environ.get('GOOGLE_SHEETS_ID')
             
-            if not sheets_creds or not self.sheet_id:
-                logger.warning("Google Sheets credentials or ID not found in environment variables")
+            if self.client is None:
+                sheets_creds = os.environ.get('GOOGLE_SHEETS_CREDENTIALS')
+                if not sheets_creds or not self.sheet_id:
+                    logger.warning("Google Sheets credentials or ID not found in environment variables")
+                    return
+                
+                # Парсим JSON credentials
+                creds_data = json.loads(sheets_creds)
+                
+                # Настраиваем scopes
+                scopes = [
+                    'https://www.googleapis.com/auth/spreadsheets',
+                    'https://www.googleapis.com/auth/drive'
+                ]
+                
+                # Создаем credentials
+                self.credentials = Credentials.from_service_account_info(creds_data, scopes=scopes)
+                self.client = gspread.authorize(self.credentials)
+            elif not self.sheet_id:
+                logger.warning("Google Sheets ID not found in environment variables")
                 return
             
-            # Парсим JSON credentials
-            creds_data = json.loads(sheets_creds)
-            
-            # Настраиваем scopes
-            scopes = [
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-            
-            # Создаем credentials
-            self.credentials = Credentials.from_service_account_info(creds_data, scopes=scopes)
-            self.client = gspread.authorize(self.credentials)
+            self._instrument_client()
             self.spreadsheet = self.client.open_by_key(self.sheet_id)
             
             # Создаем необходимые листы
@@ -96,8 +229,78 @@ class SheetsManager:
             logger.error(f"Failed to initialize Google Sheets: {e}")
             self.is_initialized = False
     
+    def _instrument_client(self):
+        """
+        Оборачивает client.request: каждый HTTP запрос к Sheets API считается
+        (sheets_api_requests{method}) и проходит через circuit breaker - при
+        разомкнутой цепи запрос сразу отклоняется с CircuitOpenError.
+        """
+        if hasattr(self.client, 'set_timeout'):
+            self.client.set_timeout(SHEETS_REQUEST_TIMEOUT)
+        request = getattr(self.client, 'request', None)
+        if request is None or getattr(request, '_instrumented', False):
+            return
+        breaker = self.breaker
+
+        def guarded_request(*args, **kwargs):
+            if not breaker.allow():
+                metrics.incr("sheets_circuit_rejected", method=current_operation())
+                raise CircuitOpenError(f"Google Sheets circuit is open, next probe in {breaker.retry_in:.0f}s")
+            _count_api_request()
+            try:
+                response = request(*args, **kwargs)
+            except Exception as e:
+                # Ошибка конкретного запроса (400, 404) - сервис при этом отвечает
+                if _is_outage(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                raise
+            breaker.record_success()
+            return response
+        guarded_request._instrumented = True
+        # Все объекты gspread (Spreadsheet, Worksheet) и fake_gspread ходят в API через client.request
+        self.client.request = guarded_request
+
+    def _on_breaker_change(self, old: str, new: str):
+        if new == OPEN:
+            metrics.incr("sheets_circuit_opened")
+        elif new == CLOSED and self.spool_pending():
+            # Sheets снова доступен - отправляем накопленное, не дожидаясь таймера
+            self._start_replayer()
+
+    def api_stats(self) -> List[Dict[str, Any]]:
+        """
+        Сводка по публичным методам: вызовы, запросы к API, суммарная и p95
+        длительность, ответы 429 и время пауз на повторы. Сортировка - по числу запросов.
+        """
+        timings = metrics.timings("sheets_request", "method")
+        requests = metrics.counters("sheets_api_requests", "method")
+        rate_limited = metrics.counters("sheets_rate_limited", "method")
+        sleeps = metrics.timings("sheets_rate_limit_sleep", "method")
+        stats = []
+        for method in set(timings) | set(requests) | set(rate_limited):
+            timing = timings.get(method, {})
+            stats.append({
+                "method": method,
+                "calls": timing.get("count", 0),
+                "errors": timing.get("errors", 0),
+                "api_requests": requests.get(method, 0),
+                "total_seconds": timing.get("total_seconds", 0.0),
+                "p95_seconds": timing.get("p95_seconds"),
+                "rate_limited": rate_limited.get(method, 0),
+                "retry_sleep_seconds": sleeps.get(method, {}).get("total_seconds", 0.0),
+            })
+        stats.sort(key=lambda item: (-item["api_requests"], -item["total_seconds"], item["method"]))
+        return stats
+
     def _setup_sheets(self):
-        """Создание и настройка необходимых листов"""
+        """
+        Создание и проверка листов. Метаданные таблицы и строки заголовков
+        читаются двумя запросами, все исправления уходят одним batch_update.
+        Строки с данными не удаляются: недостающие заголовки дописываются
+        в конец строки, несовпадающие только попадают в лог.
+        """
         try:
             # Список необходимых листов с их заголовками
             sheets_config = {
@@ -119,137 +322,298 @@ class SheetsManager:
                 ]
             }
             
-            existing_sheets = [sheet.title for sheet in self.spreadsheet.worksheets()]
+            metadata = self.spreadsheet.fetch_sheet_metadata(params={'fields': 'sheets.properties'})
+            existing = {sheet['properties']['title']: sheet['properties'] for sheet in metadata.get('sheets', [])}
+            
+            # Строки заголовков всех существующих листов - одним запросом
+            present = [name for name in sheets_config if name in existing]
+            header_rows = {}
+            if present:
+                value_ranges = self.spreadsheet.values_batch_get([f"'{name}'!1:1" for name in present]).get('valueRanges', [])
+                for name, value_range in zip(present, value_ranges):
+                    values = value_range.get('values', [])
+                    header_rows[name] = values[0] if values else []
             
+            requests = []
+            next_sheet_id = max((properties['sheetId'] for properties in existing.values()), default=0) + 1
             for sheet_name, headers in sheets_config.items():
-                if sheet_name not in existing_sheets:
-                    # Создаем новый лист
-                    worksheet = self.spreadsheet.add_worksheet(
-                        title=sheet_name, 
-                        rows=1000, 
-                        cols=len(headers)
-                    )
-                    # Добавляем заголовки
-                    worksheet.append_row(headers)
-                    logger.info(f"Created sheet: {sheet_name}")
+                properties = existing.get(sheet_name)
+                if properties is None:
+                    # Создаем новый лист с заголовками
+                    requests.append({"addSheet": {"properties": {
+                        "sheetId": next_sheet_id,
+                        "title": sheet_name,
+                        "gridProperties": {"rowCount": 1000, "columnCount": len(headers)},
+                    }}})
+                    requests.append(self._header_cells_request(next_sheet_id, 0, headers))
+                    next_sheet_id += 1
+                    logger.info(f"Creating sheet: {sheet_name}")
+                    continue
+                
+                current_headers = header_rows.get(sheet_name, [])
+                if current_headers == headers:
+                    continue
+                if current_headers == headers[:len(current_headers)]:
+                    # Лист пустой или не хватает новых колонок в конце - дописываем заголовки
+                    if properties.get('gridProperties', {}).get('columnCount', 0) < len(headers):
+                        requests.append({"updateSheetProperties": {
+                            "properties": {"sheetId": properties['sheetId'], "gridProperties": {"columnCount": len(headers)}},
+                            "fields": "gridProperties.columnCount",
+                        }})
+                    requests.append(self._header_cells_request(properties['sheetId'], len(current_headers),
+                                                               headers[len(current_headers):]))
+                    logger.info(f"Updating headers for sheet: {sheet_name}")
                 else:
-                    # Проверяем и обновляем заголовки существующего листа
-                    worksheet = self.spreadsheet.worksheet(sheet_name)
-                    try:
-                        current_headers = worksheet.row_values(1)
-                        # Если заголовки не совпадают или лист пустой
-                        if not current_headers or current_headers != headers:
-                            worksheet.clear()
-                            worksheet.append_row(headers)
-                            logger.info(f"Updated headers for sheet: {sheet_name}")
-                    except Exception as e:
-                        # Если не удается получить заголовки, очищаем и создаем заново
-                        logger.warning(f"Could not read headers for {sheet_name}, recreating: {e}")
-                        worksheet.clear()
-                        worksheet.append_row(headers)
-                        logger.info(f"Recreated headers for sheet: {sheet_name}")
+                    logger.warning(f"⚠️ Headers of sheet {sheet_name} differ from expected, data left untouched: "
+                                   f"{current_headers} != {headers}")
+            
+            if requests:
+                self.spreadsheet.batch_update({"requests": requests})
+                logger.info(f"Applied {len(requests)} sheet setup changes in one batch update")
                         
         except Exception as e:
             logger.error(f"Error setting up sheets: {e}")
     
+    @staticmethod
+    def _header_cells_request(sheet_id: int, start_column: int, headers: List[str]) -> Dict[str, Any]:
+        """Запрос batch_update: записать заголовки в первую строку листа начиная с колонки start_column"""
+        return {"updateCells": {
+            "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": start_column},
+            "rows": [{"values": [{"userEnteredValue": {"stringValue": header}} for header in headers]}],
+            "fields": "userEnteredValue",
+        }}
+    
+    @sheets_operation("log_reminder_action")
     def log_reminder_action(self, action: str, user_id: int, username: str, 
                           chat_id: int, details: str, reminder_id: int = None):
         """Логирование действий с напоминаниями с обработкой rate limiting"""
         if not self.is_initialized:
             return
         
-        def _log_operation():
-            worksheet = self.spreadsheet.worksheet('Operation_Logs')
-            
-            # Московское время
-            moscow_time = datetime.now(MOSCOW_TZ).strftime('%Y-%m-%d %H:%M:%S')
-            
-            row = [
-                moscow_time,
-                action,
-                user_id,
-                username,
-                chat_id,
-                details,
-                reminder_id or ''
-            ]
-            
-            worksheet.append_row(row)
-            logger.info(f"Logged action: {action} by {username}")
+        # Московское время
+        moscow_time = datetime.now(MOSCOW_TZ).strftime('%Y-%m-%d %H:%M:%S')
+        
+        row = [
+            moscow_time,
+            action,
+            user_id,
+            username,
+            chat_id,
+            details,
+            reminder_id or ''
+        ]
+        
+        if not self._append_or_spool('Operation_Logs', [row], max_retries=2, base_delay=0.5):
+            return False
+        logger.info(f"Logged action: {action} by {username}")
+        return True
+    
+    @sheets_operation("sync_reminder")
+    def sync_reminder(self, reminder: Dict[str, Any], action: str = 'UPDATE'):
+        """
+        Синхронизация напоминания с Google Sheets с обработкой rate limiting.
+        Если запись не удалась (или в очереди уже ждут более ранние записи),
+        она откладывается в spool - более поздняя версия напоминания заменяет раннюю.
+        """
+        if not self.is_initialized:
+            return
+        
+        payload = {"reminder": reminder, "action": action}
+        if self.spool_pending() or self.breaker.is_open:
+            self._spool_write("sync_reminder", "Reminders", [(f"reminder:{reminder.get('id')}", payload)], replace=True)
+            return False
         
         try:
-            # Используем retry механизм для обработки rate limiting
-            handle_rate_limit_with_retry(_log_operation, max_retries=2, base_delay=0.5)
+            # Используем retry механизм для обработки rate limiting с увеличенными параметрами
+            handle_rate_limit_with_retry(lambda: self._write_reminder(reminder, action), max_retries=5, base_delay=2.0)
             
         except Exception as e:
-            logger.error(f"Error logging reminder action: {e}")
+            logger.error(f"Error syncing reminder: {e}")
+            self._spool_write("sync_reminder", "Reminders", [(f"reminder:{reminder.get('id')}", payload)], replace=True)
+            # Возвращаем False чтобы вызывающий код знал об ошибке
             return False
         
         return True
     
-    def sync_reminder(self, reminder: Dict[str, Any], action: str = 'UPDATE'):
-        """Синхронизация напоминания с Google Sheets с обработкой rate limiting"""
-        if not self.is_initialized:
-            return
+    def _write_reminder(self, reminder: Dict[str, Any], action: str):
+        """Запись строки напоминания в лист Reminders (CREATE - добавление, UPDATE/DELETE - обновление по ID)"""
+        worksheet = self.spreadsheet.worksheet('Reminders')
         
-        def _sync_operation():
-            worksheet = self.spreadsheet.worksheet('Reminders')
+        # Подготавливаем данные для записи
+        row_data = [
+            reminder.get('id', ''),
+            reminder.get('text', ''),
+            schedule_text(reminder),
+            reminder.get('type', ''),
+            reminder.get('chat_id', ''),
+            reminder.get('chat_name', ''),
+            'Active' if action != 'DELETE' else 'Deleted',
+            reminder.get('created_at', ''),
+            reminder.get('username', ''),
+            reminder.get('last_sent', ''),
+            str(reminder.get('days_of_week', ''))
+        ]
+        
+        if action == 'CREATE':
+            # Добавляем новую запись
+            worksheet.append_row(row_data)
+        elif action == 'UPDATE' or action == 'DELETE':
+            # Ошибка чтения пробрасывается: иначе строка дописалась бы повторно
+            records = worksheet.get_all_records()
+            
+            row_to_update = None
             
-            # Подготавливаем данные для записи
-            row_data = [
+            for i, record in enumerate(records):
+                if str(record.get('ID', '')) == str(reminder.get('id')):
+                    row_to_update = i + 2  # +2 потому что индексы с 1 и есть заголовок
+                    break
+            
+            if row_to_update:
+                # Обновляем существующую строку
+                for col, value in enumerate(row_data, 1):
+                    worksheet.update_cell(row_to_update, col, value)
+            else:
+                # Если не найдена, добавляем новую
+                worksheet.append_row(row_data)
+        
+        logger.info(f"Synced reminder {reminder.get('id')} with action {action}")
+    
+    @sheets_operation("mark_reminders_deleted")
+    def mark_reminders_deleted(self, reminders: List[Dict[str, Any]]):
+        """
+        Массово помечает напоминания Deleted: одно чтение листа и один batch_update
+        колонки Status; отсутствующие в листе дописываются одним append_rows.
+        Если запись не удалась (в spool уже ждут более ранние записи или цепь
+        разомкнута), статус Deleted каждого напоминания откладывается в spool,
+        как в sync_reminder.
+        Возвращает (True, обновлено, дописано, отложено) или (False, 0, 0, 0) -
+        запись не удалась и не отложена.
+        """
+        if not self.is_initialized:
+            return False, 0, 0, 0
+        if not reminders:
+            return True, 0, 0, 0
+
+        if not self.spool_pending() and not self.breaker.is_open:
+            try:
+                updated, appended = handle_rate_limit_with_retry(
+                    lambda: self._write_deleted_statuses(reminders), max_retries=5, base_delay=2.0
+                )
+                return True, updated, appended, 0
+            except Exception as e:
+                logger.error(f"Error marking reminders deleted: {e}")
+
+        items = [(f"reminder:{reminder.get('id')}", {"reminder": reminder, "action": "DELETE"}) for reminder in reminders]
+        if self._spool_write("sync_reminder", "Reminders", items, replace=True):
+            return True, 0, 0, len(items)
+        return False, 0, 0, 0
+
+    def _write_deleted_statuses(self, reminders: List[Dict[str, Any]]):
+        """Ставит Status = Deleted строкам напоминаний в листе Reminders, возвращает (обновлено, дописано)"""
+        worksheet = self.spreadsheet.worksheet('Reminders')
+        values = worksheet.get_all_values()
+        headers = values[0] if values else []
+        status_col = headers.index('Status') + 1 if 'Status' in headers else 7
+
+        pending = {str(reminder.get('id')): reminder for reminder in reminders}
+        updates = []
+        for row_number, row in enumerate(values[1:], start=2):
+            reminder_id = row[0] if row else ''
+            if reminder_id not in pending:
+                continue
+            pending.pop(reminder_id)
+            current_status = row[status_col - 1] if len(row) >= status_col else ''
+            if current_status != 'Deleted':
+                updates.append({
+                    'range': gspread.utils.rowcol_to_a1(row_number, status_col),
+                    'values': [['Deleted']],
+                })
+
+        if updates:
+            worksheet.batch_update(updates)
+
+        # Как и sync_reminder(DELETE): строки, которых нет в листе, добавляются уже удаленными
+        missing_rows = [
+            [
                 reminder.get('id', ''),
                 reminder.get('text', ''),
-                reminder.get('time', ''),
+                schedule_text(reminder),
                 reminder.get('type', ''),
                 reminder.get('chat_id', ''),
                 reminder.get('chat_name', ''),
-                'Active' if action != 'DELETE' else 'Deleted',
+                'Deleted',
                 reminder.get('created_at', ''),
                 reminder.get('username', ''),
                 reminder.get('last_sent', ''),
                 str(reminder.get('days_of_week', ''))
             ]
-            
-            if action == 'CREATE':
-                # Добавляем новую запись
-                worksheet.append_row(row_data)
-            elif action == 'UPDATE' or action == 'DELETE':
-                # Безопасно получаем записи
-                try:
-                    records = worksheet.get_all_records()
-                except Exception as e:
-                    logger.warning(f"Could not get records from Reminders, sheet may be empty: {e}")
-                    records = []
-                
-                row_to_update = None
-                
-                for i, record in enumerate(records):
-                    if str(record.get('ID', '')) == str(reminder.get('id')):
-                        row_to_update = i + 2  # +2 потому что индексы с 1 и есть заголовок
-                        break
-                
-                if row_to_update:
-                    # Обновляем существующую строку
-                    for col, value in enumerate(row_data, 1):
-                        worksheet.update_cell(row_to_update, col, value)
-                else:
-                    # Если не найдена, добавляем новую
-                    worksheet.append_row(row_data)
-            
-            logger.info(f"Synced reminder {reminder.get('id')} with action {action}")
-        
-        try:
-            # Используем retry механизм для обработки rate limiting с увеличенными параметрами
-            handle_rate_limit_with_retry(_sync_operation, max_retries=5, base_delay=2.0)
-            
-        except Exception as e:
-            logger.error(f"Error syncing reminder: {e}")
-            # Возвращаем False чтобы вызывающий код знал об ошибке
+            for reminder in pending.values()
+        ]
+        if missing_rows:
+            worksheet.append_rows(missing_rows)
+
+        logger.info(f"🗑️ Marked {len(updates)} reminders Deleted in one batch ({len(missing_rows)} appended)")
+        return len(updates), len(missing_rows)
+
+    @sheets_operation("update_last_sent")
+    def update_last_sent(self, reminder_id, last_sent: str):
+        """
+        Ставит Last_Sent напоминания в очередь: значения копятся по ID и пишутся
+        в фоне одним запросом (flush_last_sent), рассылка не ждет Google Sheets.
+        """
+        if not self.is_initialized:
             return False
-        
+        with self._send_history_cond:
+            self._last_sent[str(reminder_id)] = last_sent
+        self._start_send_history_writer()
         return True
-    
-    def log_reminder_sent(self, reminder_id: int, chat_id: int, status: str, 
+
+    @sheets_operation("flush_last_sent")
+    def flush_last_sent(self) -> int:
+        """
+        Записывает накопленные Last_Sent: колонка ID и заголовок читаются одним
+        values_batch_get, значения пишутся одним values_batch_update.
+        Возвращает число обновленных строк.
+        """
+        if self.breaker.is_open:
+            return 0  # Значения ждут в очереди, пока Sheets недоступен
+        with self._send_history_cond:
+            pending = self._last_sent
+            self._last_sent = {}
+        if not pending:
+            return 0
+
+        def _flush_operation():
+            value_ranges = self.spreadsheet.values_batch_get(
+                ["'Reminders'!1:1", "'Reminders'!A:A"], params={'majorDimension': 'COLUMNS'}
+            ).get('valueRanges', [])
+            header = [column[0] if column else '' for column in value_ranges[0].get('values', [])]
+            if 'Last_Sent' not in header:
+                raise ValueError("Reminders sheet has no Last_Sent column")
+            column_letter = gspread.utils.rowcol_to_a1(1, header.index('Last_Sent') + 1).rstrip('1')
+            ids = (value_ranges[1].get('values') or [[]])[0]
+            rows = {str(value).strip(): number for number, value in enumerate(ids, start=1) if number > 1}
+            data = [{"range": f"'Reminders'!{column_letter}{rows[reminder_id]}", "values": [[last_sent]]}
+                    for reminder_id, last_sent in pending.items() if reminder_id in rows]
+            if data:
+                self.spreadsheet.values_batch_update(body={"valueInputOption": "USER_ENTERED", "data": data})
+            return len(data)
+
+        try:
+            updated = handle_rate_limit_with_retry(_flush_operation, max_retries=2, base_delay=1.0)
+        except Exception as e:
+            logger.error(f"Error updating Last_Sent for {len(pending)} reminders: {e}")
+            # Вернем значения в очередь, более новые (пришедшие за время записи) побеждают
+            with self._send_history_cond:
+                self._last_sent = {**pending, **self._last_sent}
+            return 0
+        if updated < len(pending):
+            logger.warning(f"{len(pending) - updated} reminders not found in Reminders sheet, Last_Sent not updated")
+        logger.debug(f"Flushed Last_Sent of {updated} reminders")
+        return updated
+
+    @sheets_operation("log_reminder_sent")
+    def log_reminder_sent(self, reminder_id: int, chat_id: int, status: str,
                          error: str = None, text_preview: str = ''):
         """Логирование отправленных напоминаний"""
         if not self.is_initialized:
@@ -276,6 +640,7 @@ class SheetsManager:
         except Exception as e:
             logger.error(f"Error logging reminder sent: {e}")
     
+    @sheets_operation("update_chat_stats")
     def update_chat_stats(self, chat_id: int, chat_name: str, chat_type: str, 
                          members_count: int = None, status: str = "Active"):
         """Обновление статистики чатов с поддержкой статуса"""
@@ -355,6 +720,7 @@ class SheetsManager:
         except Exception as e:
             logger.error(f"Error updating chat stats: {e}")
     
+    @sheets_operation("update_reminders_count")
     def update_reminders_count(self, chat_id: int):
         """Обновление количества напоминаний для чата с обработкой rate limiting"""
         if not self.is_initialized:
@@ -403,6 +769,7 @@ class SheetsManager:
         
         return True
     
+    @sheets_operation("backup_all_reminders")
     def backup_all_reminders(self, reminders: List[Dict[str, Any]]):
         """Полное резервное копирование всех напоминаний"""
         if not self.is_initialized:
@@ -424,7 +791,7 @@ class SheetsManager:
                 row_data = [
                     reminder.get('id', ''),
                     reminder.get('text', ''),
-                    reminder.get('time', ''),
+                    schedule_text(reminder),
                     reminder.get('type', ''),
                     reminder.get('chat_id', ''),
                     reminder.get('chat_name', ''),
@@ -441,123 +808,195 @@ class SheetsManager:
         except Exception as e:
             logger.error(f"Error backing up reminders: {e}")
 
-    def restore_reminders_from_sheets(self, target_file="reminders.json"):
-        """Восстановление активных напоминаний из Google Sheets"""
+    # Диапазоны пакетного чтения: Reminders целиком (все 11 колонок нужны для
+    # восстановления), из Chat_Stats - только Chat_ID (A) и Status (H)
+    SHEET_VIEW_RANGES = {
+        'reminders': ["'Reminders'!A:K"],
+        'chats': ["'Chat_Stats'!A:A", "'Chat_Stats'!H:H"],
+    }
+
+    @staticmethod
+    def _columns_to_rows(columns: List[List[Any]]) -> List[List[Any]]:
+        """Колонки ответа majorDimension=COLUMNS обратно в строки"""
+        return [list(row) for row in zip_longest(*columns, fillvalue='')]
+
+    @staticmethod
+    def _values_to_records(values: List[List[Any]]) -> List[Dict[str, Any]]:
+        """Строки листа (первая - заголовок) в записи как у get_all_records (с numericise)"""
+        if not values:
+            return []
+        headers = values[0]
+        records = []
+        for row in values[1:]:
+            row = list(row) + [''] * (len(headers) - len(row))
+            records.append(dict(zip(headers, gspread.utils.numericise_all(row[:len(headers)]))))
+        return records
+
+    @sheets_operation("fetch_sheet_views")
+    def fetch_sheet_views(self, views=('reminders', 'chats')) -> Optional[Dict[str, Any]]:
+        """
+        Читает нужные листы одним запросом values_batch_get (без запросов метаданных
+        worksheet()): {'reminders': [записи], 'chats': ChatColumns}.
+        Значения приходят по колонкам (majorDimension=COLUMNS): колонка Chat_ID -
+        один плоский список, а не список строк из одной ячейки.
+        None - если Google Sheets недоступен или чтение не удалось.
+        """
+        if not self.is_initialized:
+            return None
+
+        ranges = [sheet_range for view in views for sheet_range in self.SHEET_VIEW_RANGES[view]]
+
+        def _fetch_operation():
+            return self.spreadsheet.values_batch_get(
+                ranges, params={'majorDimension': 'COLUMNS'}
+            ).get('valueRanges', [])
+
+        try:
+            value_ranges = handle_rate_limit_with_retry(_fetch_operation, max_retries=3, base_delay=1.0)
+        except Exception as e:
+            logger.error(f"Error reading sheets {list(views)}: {e}")
+            return None
+
+        columns = iter(value_range.get('values', []) for value_range in value_ranges)
+        result = {}
+        for view in views:
+            if view == 'reminders':
+                result[view] = self._values_to_records(self._columns_to_rows(next(columns, [])))
+            else:
+                chat_ids, statuses = next(columns, []), next(columns, [])
+                result[view] = ChatColumns(chat_ids[0] if chat_ids else [], statuses[0] if statuses else [])
+        logger.info(f"📥 Read {', '.join(f'{view}: {len(result[view])}' for view in views)} rows in one batch request")
+        return result
+
+    # Последняя колонка строки листа для точечного чтения (fetch_rows)
+    SHEET_ROW_LAST_COLUMN = {'Reminders': 'K', 'Chat_Stats': 'H'}
+
+    @sheets_operation("fetch_rows")
+    def fetch_rows(self, sheet_name: str, ids=(), rows=()) -> Optional[List[Dict[str, Any]]]:
+        """
+        Записи отдельных строк листа: по номерам строк и/или по значениям первой
+        колонки (ID напоминания, Chat_ID). Вместо всего листа читаются колонка ID
+        и сами строки. None - если Google Sheets недоступен или чтение не удалось.
+        """
+        if not self.is_initialized:
+            return None
+
+        last_column = self.SHEET_ROW_LAST_COLUMN[sheet_name]
+        keys = {str(value).strip() for value in ids}
+
+        def _fetch_operation():
+            wanted = {int(row) for row in rows if int(row) >= 2}
+            if keys:
+                value_ranges = self.spreadsheet.values_batch_get([f"'{sheet_name}'!A:A"]).get('valueRanges', [])
+                column = value_ranges[0].get('values', []) if value_ranges else []
+                wanted.update(number for number, cell in enumerate(column, start=1)
+                              if number > 1 and cell and str(cell[0]).strip() in keys)
+            if not wanted:
+                return []
+            ranges = [f"'{sheet_name}'!A1:{last_column}1"] + [
+                f"'{sheet_name}'!A{number}:{last_column}{number}" for number in sorted(wanted)
+            ]
+            value_ranges = self.spreadsheet.values_batch_get(ranges).get('valueRanges', [])
+            return [value_range.get('values', [[]])[0] for value_range in value_ranges]
+
+        try:
+            values = handle_rate_limit_with_retry(_fetch_operation, max_retries=3, base_delay=1.0)
+        except Exception as e:
+            logger.error(f"Error reading rows from {sheet_name}: {e}")
+            return None
+
+        # Пустые строки (удаленные в таблице) отбрасываются
+        values = values[:1] + [row for row in values[1:] if row and str(row[0]).strip()]
+        return self._values_to_records(values)
+
+    @staticmethod
+    def parse_reminder_records(records: List[Dict[str, Any]]):
+        """
+        Активные напоминания листа Reminders в формате бота (без дубликатов ID
+        и с проверенным расписанием). Возвращает (напоминания, множество ID).
+        """
+        # Фильтруем только активные напоминания
+        active_reminders = []
+        seen_ids = set()  # 🆕 Отслеживаем уже обработанные ID
+        
+        for record in records:
+            try:
+                # Проверяем статус
+                status = record.get('Status', '').strip()
+                if status.lower() != 'active':
+                    logger.debug(f"Skipping reminder {record.get('ID')} with status: {status}")
+                    continue
+                
+                # 🆕 Проверяем уникальность ID
+                reminder_id = str(record.get('ID', '')).strip()
+                if not reminder_id or reminder_id in seen_ids:
+                    if not reminder_id:
+                        logger.warning(f"Skipping reminder with empty ID: {record}")
+                    else:
+                        logger.warning(f"Skipping duplicate reminder ID: {reminder_id}")
+                    continue
+                
+                seen_ids.add(reminder_id)  # 🆕 Запоминаем ID
+                
+                # Конвертируем в формат бота
+                reminder_type = record.get('Type', '').strip().lower()
+                
+                # Поля расписания разбираются и проверяются общим модулем recurrence
+                try:
+                    schedule = schedule_fields(reminder_type, record.get('Time_MSK', ''),
+                                               str(record.get('Days_Of_Week', '')))
+                except RecurrenceError as e:
+                    logger.warning(f"Invalid schedule for reminder {record.get('ID')} ({reminder_type}): {e}")
+                    continue
+                
+                restored_reminder = {
+                    "id": reminder_id,  # 🆕 Используем проверенный ID
+                    "text": record.get('Text', ''),
+                    "chat_id": record.get('Chat_ID', ''),
+                    "chat_name": record.get('Chat_Name', ''),
+                    "created_at": record.get('Created_At', ''),
+                    "username": record.get('Username', ''),
+                    "last_sent": record.get('Last_Sent', '')
+                }
+                restored_reminder.update(schedule)
+                
+                # Валидация обязательных полей
+                if not restored_reminder.get('id') or not restored_reminder.get('text'):
+                    logger.warning(f"Invalid reminder data: ID={restored_reminder.get('id')}, Text={restored_reminder.get('text')}")
+                    continue
+                
+                active_reminders.append(restored_reminder)
+                logger.debug(f"Restored reminder: {restored_reminder['id']} ({restored_reminder['type']})")
+                
+            except Exception as e:
+                logger.error(f"Error processing reminder record: {e}")
+                continue
+        
+        return active_reminders, seen_ids
+
+    @sheets_operation("restore_reminders_from_sheets")
+    def restore_reminders_from_sheets(self, target_file="reminders.json", records=None):
+        """
+        Восстановление активных напоминаний из Google Sheets.
+        records - уже прочитанные записи листа (fetch_sheet_views), иначе читаются здесь.
+        """
         if not self.is_initialized:
             logger.warning("Google Sheets not available for reminders restoration")
             return False, "Google Sheets не инициализирован"
         
         try:
-            worksheet = self.spreadsheet.worksheet('Reminders')
-            
             # Безопасно получаем записи
-            try:
-                records = worksheet.get_all_records()
-            except Exception as e:
-                logger.warning(f"Could not get records from Reminders, sheet may be empty: {e}")
-                return False, "Не удалось получить данные из Google Sheets (лист может быть пустым)"
+            if records is None:
+                views = self.fetch_sheet_views(('reminders',))
+                if views is None:
+                    return False, "Не удалось получить данные из Google Sheets (лист может быть пустым)"
+                records = views['reminders']
             
             if not records:
                 logger.warning("No records found in Reminders sheet")
                 return False, "В листе Reminders нет записей"
             
-            # Фильтруем только активные напоминания
-            active_reminders = []
-            seen_ids = set()  # 🆕 Отслеживаем уже обработанные ID
-            
-            for record in records:
-                try:
-                    # Проверяем статус
-                    status = record.get('Status', '').strip()
-                    if status.lower() != 'active':
-                        logger.debug(f"Skipping reminder {record.get('ID')} with status: {status}")
-                        continue
-                    
-                    # 🆕 Проверяем уникальность ID
-                    reminder_id = str(record.get('ID', '')).strip()
-                    if not reminder_id or reminder_id in seen_ids:
-                        if not reminder_id:
-                            logger.warning(f"Skipping reminder with empty ID: {record}")
-                        else:
-                            logger.warning(f"Skipping duplicate reminder ID: {reminder_id}")
-                        continue
-                    
-                    seen_ids.add(reminder_id)  # 🆕 Запоминаем ID
-                    
-                    # Конвертируем в формат бота
-                    reminder_type = record.get('Type', '').strip().lower()
-                    
-                    if reminder_type == 'once':
-                        # Разовое напоминание
-                        restored_reminder = {
-                            "id": reminder_id,  # 🆕 Используем проверенный ID
-                            "type": "once",
-                            "datetime": record.get('Time_MSK', ''),
-                            "text": record.get('Text', ''),
-                            "chat_id": record.get('Chat_ID', ''),
-                            "chat_name": record.get('Chat_Name', ''),
-                            "created_at": record.get('Created_At', ''),
-                            "username": record.get('Username', ''),
-                            "last_sent": record.get('Last_Sent', '')
-                        }
-                        
-                    elif reminder_type == 'daily':
-                        # Ежедневное напоминание
-                        restored_reminder = {
-                            "id": reminder_id,  # 🆕 Используем проверенный ID
-                            "type": "daily",
-                            "time": record.get('Time_MSK', ''),
-                            "text": record.get('Text', ''),
-                            "chat_id": record.get('Chat_ID', ''),
-                            "chat_name": record.get('Chat_Name', ''),
-                            "created_at": record.get('Created_At', ''),
-                            "username": record.get('Username', ''),
-                            "last_sent": record.get('Last_Sent', '')
-                        }
-                        
-                    elif reminder_type == 'weekly':
-                        # Еженедельное напоминание
-                        days_of_week = record.get('Days_Of_Week', '').strip()
-                        time_parts = record.get('Time_MSK', '').strip().split()
-                        
-                        if len(time_parts) >= 2:
-                            # Формат: "понедельник 10:00"
-                            day_name = time_parts[0].lower()
-                            time_str = time_parts[1]
-                        else:
-                            # Используем Days_Of_Week и Time_MSK отдельно
-                            day_name = days_of_week.lower() if days_of_week else 'понедельник'
-                            time_str = record.get('Time_MSK', '10:00')
-                        
-                        restored_reminder = {
-                            "id": reminder_id,  # 🆕 Используем проверенный ID
-                            "type": "weekly",
-                            "day": day_name,
-                            "time": time_str,
-                            "text": record.get('Text', ''),
-                            "chat_id": record.get('Chat_ID', ''),
-                            "chat_name": record.get('Chat_Name', ''),
-                            "created_at": record.get('Created_At', ''),
-                            "username": record.get('Username', ''),
-                            "last_sent": record.get('Last_Sent', ''),
-                            "days_of_week": day_name
-                        }
-                        
-                    else:
-                        logger.warning(f"Unknown reminder type: {reminder_type} for ID {record.get('ID')}")
-                        continue
-                    
-                    # Валидация обязательных полей
-                    if not restored_reminder.get('id') or not restored_reminder.get('text'):
-                        logger.warning(f"Invalid reminder data: ID={restored_reminder.get('id')}, Text={restored_reminder.get('text')}")
-                        continue
-                    
-                    active_reminders.append(restored_reminder)
-                    logger.debug(f"Restored reminder: {restored_reminder['id']} ({restored_reminder['type']})")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing reminder record: {e}")
-                    continue
+            active_reminders, seen_ids = self.parse_reminder_records(records)
             
             if not active_reminders:
                 logger.warning("No active reminders found in Google Sheets")
@@ -575,11 +1014,9 @@ class SheetsManager:
             logger.info(f"   Invalid records skipped: {invalid_skipped}")
             logger.info(f"   Non-active records skipped: {total_processed - len(seen_ids)}")
             
-            # Сохраняем восстановленные напоминания
+            # Сохраняем восстановленные напоминания (через общее хранилище с блокировкой)
             try:
-                import json
-                with open(target_file, "w", encoding='utf-8') as f:
-                    json.dump(active_reminders, f, ensure_ascii=False, indent=2)
+                get_store(target_file, indent=2, ensure_ascii=False).write(active_reminders)
                 
                 logger.info(f"✅ Successfully restored {len(active_reminders)} active reminders from Google Sheets to {target_file}")
                 logger.info(f"🔄 File completely overwritten - no duplicates possible")
@@ -606,31 +1043,34 @@ class SheetsManager:
             logger.error(f"Error restoring reminders from Google Sheets: {e}")
             return False, f"Ошибка восстановления из Google Sheets: {e}"
 
-    def get_subscribed_chats(self):
-        """Получение списка АКТИВНЫХ подписанных чатов из Google Sheets (исключая отписавшихся)"""
+    @sheets_operation("get_subscribed_chats")
+    def get_subscribed_chats(self, chat_rows=None):
+        """
+        Получение списка АКТИВНЫХ подписанных чатов из Google Sheets (исключая отписавшихся).
+        chat_rows - уже прочитанные пары (Chat_ID, Status) листа Chat_Stats
+        (ChatColumns из fetch_sheet_views), иначе читаются здесь. Пары разбираются
+        потоком, без записей-словарей на каждый чат.
+        """
         if not self.is_initialized:
             return []
         
         try:
-            worksheet = self.spreadsheet.worksheet('Chat_Stats')
-            
-            # Безопасно получаем записи
-            try:
-                records = worksheet.get_all_records()
-            except Exception as e:
-                logger.warning(f"Could not get records from Chat_Stats, sheet may be empty: {e}")
-                return []
+            # Безопасно получаем колонки Chat_ID и Status
+            if chat_rows is None:
+                views = self.fetch_sheet_views(('chats',))
+                if views is None:
+                    return []
+                chat_rows = views['chats']
             
             # 🆕 Возвращаем только АКТИВНЫЕ чаты (исключаем отписавшихся)
             chat_ids = []
             unsubscribed_count = 0
-            for record in records:
+            for chat_id_value, status in chat_rows:
                 try:
-                    chat_id_value = record.get('Chat_ID')
-                    status = record.get('Status', 'Active').strip()  # По умолчанию Active для совместимости
+                    status = str(status or 'Active').strip()  # По умолчанию Active для совместимости
                     
                     if chat_id_value:
-                        chat_id = int(chat_id_value)
+                        chat_id = int(str(chat_id_value).strip())
                         if chat_id != 0:  # Исключаем 0 и пустые значения
                             # 🚫 ФИЛЬТРУЕМ ПО СТАТУСУ - исключаем отписавшихся
                             if status.lower() in ['unsubscribed', 'blocked', 'deleted']:
@@ -653,23 +1093,25 @@ class SheetsManager:
             logger.error(f"Error retrieving subscribed chats from Google Sheets: {e}")
             return []
     
-    def restore_subscribed_chats_file(self, target_file="subscribed_chats.json"):
-        """Восстановление файла subscribed_chats.json из Google Sheets"""
+    def restore_subscribed_chats_file(self, target_file="subscribed_chats.json", chat_rows=None):
+        """
+        Восстановление файла subscribed_chats.json из Google Sheets.
+        chat_rows - уже прочитанные пары (Chat_ID, Status) листа Chat_Stats (fetch_sheet_views).
+        """
         if not self.is_initialized:
             logger.warning("Google Sheets not available for chat restoration")
             return False
         
         try:
             # Получаем чаты из Google Sheets
-            chat_ids = self.get_subscribed_chats()
+            chat_ids = self.get_subscribed_chats(chat_rows)
             
             if not chat_ids:
                 logger.warning("No chats found in Google Sheets for restoration")
                 return False
             
             # Записываем в локальный файл
-            with open(target_file, "w") as f:
-                json.dump(chat_ids, f)
+            get_store(target_file).write(chat_ids)
             
             logger.info(f"✅ Successfully restored {len(chat_ids)} chats to {target_file}")
             return True
@@ -678,38 +1120,33 @@ class SheetsManager:
             logger.error(f"Error restoring subscribed chats file: {e}")
             return False
     
-    def sync_subscribed_chats_from_sheets(self, target_file="subscribed_chats.json"):
-        """Синхронизация subscribed_chats.json с Google Sheets (безопасное обновление)"""
+    @sheets_operation("sync_subscribed_chats_from_sheets")
+    def sync_subscribed_chats_from_sheets(self, target_file="subscribed_chats.json", chat_rows=None):
+        """
+        Синхронизация subscribed_chats.json с Google Sheets (безопасное обновление).
+        chat_rows - уже прочитанные пары (Chat_ID, Status) листа Chat_Stats (fetch_sheet_views).
+        """
         if not self.is_initialized:
             return False
         
         try:
-            # Получаем текущие чаты из локального файла
-            current_chats = []
-            try:
-                with open(target_file, "r") as f:
-                    current_chats = json.load(f)
-                    if not isinstance(current_chats, list):
-                        current_chats = []
-            except (FileNotFoundError, json.JSONDecodeError):
-                current_chats = []
-            
-            # Получаем чаты из Google Sheets
-            sheets_chats = self.get_subscribed_chats()
+            # Получаем чаты из Google Sheets (до блокировки файла - это сетевой запрос)
+            sheets_chats = self.get_subscribed_chats(chat_rows)
             
             if not sheets_chats:
                 logger.warning("No chats in Google Sheets, keeping current local file")
                 return True
             
-            # Сравниваем и обновляем только если есть изменения
-            current_set = set(current_chats)
             sheets_set = set(sheets_chats)
             
+            # Сравниваем и обновляем только если есть изменения - в одной транзакции
+            with get_store(target_file).transaction() as tx:
+                current_chats = tx.data if isinstance(tx.data, list) else []
+                current_set = set(current_chats)
+                if current_set != sheets_set:
+                    tx.data = sheets_chats
+            
             if current_set != sheets_set:
-                # Есть изменения - обновляем файл
-                with open(target_file, "w") as f:
-                    json.dump(sheets_chats, f)
-                
                 added = sheets_set - current_set
                 removed = current_set - sheets_set
                 
@@ -727,57 +1164,293 @@ class SheetsManager:
             logger.error(f"Error syncing subscribed chats: {e}")
             return False
 
+    # --- Отложенные записи (spool) ---
+
+    @staticmethod
+    def _open_spool(path: str):
+        try:
+            return WriteSpool(path)
+        except Exception as e:
+            logger.error(f"❌ Could not open Google Sheets write spool {path}: {e}")
+            return None
+
+    @property
+    def spool_depth(self) -> int:
+        return len(self._spool) if self._spool is not None else 0
+
+    def spool_pending(self) -> bool:
+        """Есть ли отложенные записи (новые записи тогда встают за ними, чтобы не нарушить порядок)"""
+        return self.spool_depth > 0
+
+    def spooled_reminder_ids(self) -> set:
+        """ID напоминаний, чьи записи в лист Reminders еще ждут в spool"""
+        if self._spool is None:
+            return set()
+        return {key[len("reminder:"):] for key in self._spool.keys("reminder:")}
+
+    @staticmethod
+    def _row_key(sheet_name: str) -> str:
+        """
+        Ключ отложенной строки - свой у каждой постановки: одинаковые строки (та же
+        секунда, чат и статус) - разные записи журнала, spool не должен их склеивать.
+        Повторная отправка пачки не задваивает строки: replay сверяет их с листом (_unwritten_rows).
+        """
+        return f"{sheet_name}:{uuid.uuid4().hex}"
+
+    def _spool_write(self, kind: str, target: str, items: List[tuple], replace: bool = False) -> bool:
+        """Откладывает записи [(ключ, payload)] в spool и будит фоновую отправку"""
+        if self._spool is None:
+            return False
+        try:
+            if replace:
+                for key, payload in items:
+                    self._spool.append(kind, target, payload, key, replace=True)
+            else:
+                self._spool.extend(kind, target, items)
+        except Exception as e:
+            logger.error(f"❌ Could not spool {len(items)} {target} writes: {e}")
+            return False
+        metrics.incr("sheets_spooled", len(items), sheet=target)
+        logger.warning(f"📦 Deferred {len(items)} {target} writes to spool (depth: {self.spool_depth})")
+        self._start_replayer()
+        return True
+
+    def _append_or_spool(self, sheet_name: str, rows: List[List[Any]], max_retries: int = 3,
+                         base_delay: float = 1.0) -> bool:
+        """
+        Дописывает строки в лист; при ошибке (или если в spool уже ждут записи)
+        откладывает их в spool. Возвращает True, если строки записаны сразу.
+        """
+        if not self.spool_pending() and not self.breaker.is_open:
+            try:
+                worksheet = self.spreadsheet.worksheet(sheet_name)
+                handle_rate_limit_with_retry(lambda: worksheet.append_rows(rows), max_retries=max_retries, base_delay=base_delay)
+                return True
+            except Exception as e:
+                logger.error(f"Error writing {len(rows)} rows to {sheet_name}: {e}")
+        self._spool_write("append", sheet_name, [(self._row_key(sheet_name), row) for row in rows])
+        return False
+
+    def _start_replayer(self):
+        with self._replay_lock:
+            if self._replay_thread is None:
+                self._replay_thread = threading.Thread(target=self._spool_replayer, name="sheets-spool-replay", daemon=True)
+                self._replay_thread.start()
+        self._replay_wakeup.set()
+
+    def _spool_replayer(self):
+        backoff = SPOOL_REPLAY_SECONDS
+        while True:
+            self._replay_wakeup.wait(SPOOL_REPLAY_SECONDS)
+            self._replay_wakeup.clear()
+            while self.is_initialized and self.spool_pending() and not self.replay_spool():
+                # Sheets все еще недоступен - повторяем все реже, новые записи попытки не торопят;
+                # при разомкнутой цепи следующая попытка - пробный запрос по окончании cooldown
+                retry_in = self.breaker.retry_in
+                time.sleep(retry_in or backoff)
+                if not retry_in:
+                    backoff = min(backoff * 2, SPOOL_MAX_DELAY_SECONDS)
+            backoff = SPOOL_REPLAY_SECONDS
+
+    def _unwritten_rows(self, sheet_name: str, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Записи пачки, которых еще нет в конце листа. Нужна только для пачек,
+        которые уже отправлялись: запись могла пройти, а подтверждение - потеряться.
+        """
+        column = self.spreadsheet.values_batch_get([f"'{sheet_name}'!A:A"]).get('valueRanges', [{}])[0].get('values', [])
+        last_row = len(column)
+        first_row = max(2, last_row - len(entries) - SPOOL_BATCH_SIZE + 1)
+        if last_row < first_row:
+            return entries
+        value_ranges = self.spreadsheet.values_batch_get([f"'{sheet_name}'!A{first_row}:Z{last_row}"]).get('valueRanges', [{}])
+        # Мультимножество: одинаковые строки (та же секунда, чат и статус) бывают законно,
+        # каждая строка листа подтверждает только одну запись пачки
+        written = Counter(tuple(str(value) for value in row) for row in value_ranges[0].get('values', []))
+        unwritten = []
+        for entry in entries:
+            row = list(entry["payload"])
+            # Лист не возвращает пустые ячейки в конце строки
+            while row and row[-1] in ('', None):
+                row.pop()
+            key = tuple(str(value) for value in row)
+            if written[key] > 0:
+                written[key] -= 1
+            else:
+                unwritten.append(entry)
+        return unwritten
+
+    @sheets_operation("replay_spool")
+    def replay_spool(self) -> bool:
+        """
+        Отправляет отложенные записи в порядке добавления: подряд идущие строки
+        одного листа - одним append_rows. Останавливается на первой ошибке,
+        чтобы не нарушить порядок. Возвращает True, если spool опустел.
+        """
+        if self._spool is None or not self.is_initialized or self.breaker.is_open:
+            return False
+        
+        sent = 0
+        while True:
+            entries = self._spool.peek(SPOOL_BATCH_SIZE)
+            if not entries:
+                break
+            first = entries[0]
+            batch = [first]
+            if first["kind"] == "append":
+                for entry in entries[1:]:
+                    if entry["kind"] != "append" or entry["target"] != first["target"]:
+                        break
+                    batch.append(entry)
+            elif first["kind"] == "sync_reminder" and first["payload"]["action"] == "DELETE":
+                # Подряд идущие удаления (например, /clear_reminders) - одним batch_update
+                for entry in entries[1:]:
+                    if entry["kind"] != "sync_reminder" or entry["payload"]["action"] != "DELETE":
+                        break
+                    batch.append(entry)
+            seqs = [entry["seq"] for entry in batch]
+            
+            try:
+                if first["kind"] == "append":
+                    pending = batch
+                    if any(entry["attempts"] for entry in batch):
+                        pending = handle_rate_limit_with_retry(lambda: self._unwritten_rows(first["target"], batch))
+                    if pending:
+                        self._spool.mark_attempt(seqs)
+                        worksheet = self.spreadsheet.worksheet(first["target"])
+                        rows = [entry["payload"] for entry in pending]
+                        handle_rate_limit_with_retry(lambda: worksheet.append_rows(rows), max_retries=3, base_delay=1.0)
+                elif len(batch) > 1:
+                    self._spool.mark_attempt(seqs)
+                    deleted = [entry["payload"]["reminder"] for entry in batch]
+                    handle_rate_limit_with_retry(lambda: self._write_deleted_statuses(deleted), max_retries=3, base_delay=2.0)
+                elif first["kind"] == "sync_reminder":
+                    self._spool.mark_attempt(seqs)
+                    payload = first["payload"]
+                    # Повторная отправка - всегда обновление по ID: CREATE не продублирует строку
+                    action = "UPDATE" if payload["action"] == "CREATE" else payload["action"]
+                    handle_rate_limit_with_retry(lambda: self._write_reminder(payload["reminder"], action), max_retries=3, base_delay=2.0)
+                else:
+                    logger.error(f"❌ Unknown spool entry kind {first['kind']}, dropping")
+            except Exception as e:
+                self._spool.mark_attempt(seqs, str(e)[:200])
+                logger.warning(f"⚠️ Spool replay stopped after {sent} writes ({self.spool_depth} left): {e}")
+                return False
+            
+            self._spool.ack(seqs)
+            sent += len(batch)
+        
+        if sent:
+            metrics.incr("sheets_spool_replayed", sent)
+            logger.info(f"📤 Replayed {sent} deferred Google Sheets writes")
+        return True
+
     def log_send_history(self, utc_time: str, moscow_time: str, reminder_id: str, 
                         chat_id: str, status: str, error: str = "", text_preview: str = ""):
-        """Детальное логирование истории отправки напоминаний"""
+        """
+        Детальное логирование истории отправки напоминаний.
+        Строка только ставится в очередь - запись в таблицу идет в фоне пачками,
+        поэтому рассылка не ждет Google Sheets.
+        """
         if not self.is_initialized:
             return
         
-        try:
-            worksheet = self.spreadsheet.worksheet('Send_History')
-            
-            row = [
-                utc_time,
-                moscow_time,
-                reminder_id,
-                chat_id,
-                status,
-                error or '',
-                text_preview[:50] + '...' if len(text_preview) > 50 else text_preview
-            ]
-            
-            worksheet.append_row(row)
-            logger.debug(f"Logged send history: {reminder_id} -> {chat_id} ({status})")
-            
-        except Exception as e:
-            logger.error(f"Error logging send history: {e}")
+        row = [
+            utc_time,
+            moscow_time,
+            reminder_id,
+            chat_id,
+            status,
+            error or '',
+            text_preview[:50] + '...' if len(text_preview) > 50 else text_preview
+        ]
+        
+        with self._send_history_cond:
+            self._send_history_rows.append(row)
+            if len(self._send_history_rows) > SEND_HISTORY_MAX_QUEUE:
+                dropped = len(self._send_history_rows) - SEND_HISTORY_MAX_QUEUE
+                del self._send_history_rows[:dropped]
+                logger.warning(f"⚠️ Send history queue overflow, dropped {dropped} oldest rows")
+            if len(self._send_history_rows) >= SEND_HISTORY_BATCH_SIZE:
+                self._send_history_cond.notify()
+        self._start_send_history_writer()
+        logger.debug(f"Queued send history: {reminder_id} -> {chat_id} ({status})")
+    
+    @property
+    def send_history_queue_depth(self) -> int:
+        with self._send_history_cond:
+            return len(self._send_history_rows)
+    
+    def _start_send_history_writer(self):
+        with self._send_history_cond:
+            if self._send_history_thread is None:
+                self._send_history_thread = threading.Thread(
+                    target=self._send_history_writer, name="send-history-writer", daemon=True
+                )
+                self._send_history_thread.start()
+                atexit.register(self.flush_last_sent)
+                atexit.register(self.flush_send_history)
+    
+    def _send_history_writer(self):
+        while True:
+            with self._send_history_cond:
+                self._send_history_cond.wait_for(
+                    lambda: len(self._send_history_rows) >= SEND_HISTORY_BATCH_SIZE,
+                    timeout=SEND_HISTORY_FLUSH_SECONDS
+                )
+            self.flush_send_history()
+            self.flush_last_sent()
+    
+    @sheets_operation("flush_send_history")
+    def flush_send_history(self) -> int:
+        """Записывает накопленные строки Send_History одним запросом, возвращает их число"""
+        with self._send_history_cond:
+            rows = self._send_history_rows
+            self._send_history_rows = []
+        if not rows:
+            return 0
+        
+        if self._spool is None:
+            try:
+                worksheet = self.spreadsheet.worksheet('Send_History')
+                handle_rate_limit_with_retry(lambda: worksheet.append_rows(rows), max_retries=3, base_delay=1.0)
+                logger.debug(f"Flushed {len(rows)} send history rows")
+                return len(rows)
+            except Exception as e:
+                logger.error(f"Error logging send history ({len(rows)} rows): {e}")
+                # Возвращаем строки в начало очереди - попробуем при следующем сбросе
+                with self._send_history_cond:
+                    self._send_history_rows[:0] = rows
+                    del self._send_history_rows[:-SEND_HISTORY_MAX_QUEUE]
+                return 0
+        
+        # Не записанные строки уходят в spool - при сбое Sheets они не теряются
+        if self._append_or_spool('Send_History', rows, max_retries=3, base_delay=1.0):
+            logger.debug(f"Flushed {len(rows)} send history rows")
+            return len(rows)
+        return 0
     
+    @sheets_operation("log_operation")
     def log_operation(self, timestamp: str, action: str, user_id: str, username: str,
                      chat_id: int, details: str, reminder_id: str = ""):
         """Общее логирование операций системы"""
         if not self.is_initialized:
             return
         
-        try:
-            worksheet = self.spreadsheet.worksheet('Operation_Logs')
-            
-            row = [
-                timestamp,
-                timestamp,  # Может быть изменено на UTC если нужно
-                action,
-                user_id,
-                username or 'Unknown',
-                chat_id,
-                details,
-                reminder_id or ''
-            ]
-            
-            worksheet.append_row(row)
+        row = [
+            timestamp,
+            timestamp,  # Может быть изменено на UTC если нужно
+            action,
+            user_id,
+            username or 'Unknown',
+            chat_id,
+            details,
+            reminder_id or ''
+        ]
+        
+        if self._append_or_spool('Operation_Logs', [row], max_retries=0):
             logger.debug(f"Logged operation: {action} by {username}")
-            
-        except Exception as e:
-            logger.error(f"Error logging operation: {e}")
     
+    @sheets_operation("sync_subscribed_chats_to_sheets")
     def sync_subscribed_chats_to_sheets(self, chat_ids: List[int]):
         """Синхронизация локального списка чатов в Google Sheets"""
         if not self.is_initialized:
@@ -809,5 +1482,24 @@ class SheetsManager:
             return False
 
 
-# Глобальный экземпляр
-sheets_manager = SheetsManager() 
+# Общий экземпляр процесса создается при первом обращении: импорт модуля не
+# выполняет аутентификацию в Google и open_by_key
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+def get_sheets_manager() -> SheetsManager:
+    """
+    Общий SheetsManager процесса. Первый вызов подключается к Google Sheets;
+    параллельные вызовы ждут его и получают тот же экземпляр.
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            if os.environ.get('SHEETS_BACKEND', '').strip().lower() == 'fake':
+                # Офлайн запуск: таблица в памяти процесса (fake_gspread)
+                from fake_gspread import FakeClient
+                logger.warning("🧪 SHEETS_BACKEND=fake - using in-memory Google Sheets")
+                _shared_manager = SheetsManager(client=FakeClient(), sheet_id=os.environ.get('GOOGLE_SHEETS_ID') or 'fake')
+            else:
+                _shared_manager = SheetsManager()
+        return _shared_manager
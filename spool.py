@@ -0,0 +1,118 @@
+# spool.py
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WriteSpool:
+    """
+    Локальная очередь отложенных записей в Google Sheets поверх SQLite.
+
+    Записи, которые не удалось отправить (ошибки, исчерпанная квота), не
+    теряются: они сохраняются на диск и переживают перезапуск процесса.
+    Порядок - порядок добавления (seq). Ключ записи (key) уникален:
+      - append(..., replace=False) - повторное добавление с тем же ключом
+        игнорируется (идемпотентность);
+      - append(..., replace=True) - запись с тем же ключом заменяется новой
+        и переезжает в конец очереди (последняя версия побеждает).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL UNIQUE,"
+            " kind TEXT NOT NULL,"
+            " target TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT)"
+        )
+
+    def append(self, kind: str, target: str, payload: Any, key: str, replace: bool = False) -> bool:
+        """Добавляет запись, возвращает False, если запись с таким ключом уже есть (replace=False)"""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            cursor = self._conn.execute(
+                f"{verb} INTO spool (key, kind, target, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, target, json.dumps(payload, ensure_ascii=False, default=str), time.time())
+            )
+            return cursor.rowcount > 0
+
+    def extend(self, kind: str, target: str, items: List[tuple]) -> int:
+        """Добавляет [(ключ, payload)] одной транзакцией, возвращает число новых записей"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                added = 0
+                for key, payload in items:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO spool (key, kind, target, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, kind, target, json.dumps(payload, ensure_ascii=False, default=str), now)
+                    )
+                    added += cursor.rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return added
+
+    def peek(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """Первые limit записей в порядке добавления"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, key, kind, target, payload, attempts FROM spool ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {"seq": seq, "key": key, "kind": kind, "target": target,
+             "payload": json.loads(payload), "attempts": attempts}
+            for seq, key, kind, target, payload, attempts in rows
+        ]
+
+    def mark_attempt(self, seqs: List[int], error: Optional[str] = None):
+        """Отмечает попытку отправки записей (до отправки - error=None, после ошибки - текст)"""
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE spool SET attempts = attempts + ?, last_error = ? WHERE seq = ?",
+                [(0 if error else 1, error, seq) for seq in seqs]
+            )
+
+    def ack(self, seqs: List[int]):
+        """Удаляет отправленные записи"""
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM spool WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """Ключи записей, начинающиеся с prefix"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM spool WHERE substr(key, 1, ?) = ? ORDER BY seq", (len(prefix), prefix)
+            ).fetchall()
+        return [key for key, in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def oldest_age(self) -> float:
+        """Возраст самой старой записи в секундах (0 - очередь пуста)"""
+        with self._lock:
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM spool").fetchone()[0]
+        return max(0.0, time.time() - oldest) if oldest else 0.0
@@ -0,0 +1,224 @@
+# storage.py
+
+import os
+import json
+import copy
+import logging
+import threading
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StoreConflictError(Exception):
+    """Данные в хранилище изменились между чтением и записью (оптимистичная блокировка)"""
+
+
+class JsonStore:
+    """
+    Потокобезопасное хранилище поверх JSON файла.
+
+    Все изменения проходят через блокировку и получают номер версии.
+    Потоки JobQueue и диспетчера могут одновременно менять один и тот же файл
+    без потери обновлений:
+      - transaction()  — read-modify-write под блокировкой;
+      - snapshot() + compare_and_swap() — оптимистичная запись с проверкой версии;
+      - update(func)   — оптимистичное обновление с повтором при конфликте.
+    Запись атомарная (временный файл + os.replace), поэтому файл никогда не
+    остается обрезанным.
+    """
+
+    def __init__(self, path: str, default_factory: Callable[[], Any] = list,
+                 indent: Optional[int] = None, ensure_ascii: bool = True):
+        self.path = path
+        self.default_factory = default_factory
+        self.indent = indent
+        self.ensure_ascii = ensure_ascii
+        self._lock = threading.RLock()
+        self._version = 0
+        self._data = None
+        self._file_stamp = None
+        self._index_builders: Dict[str, Callable[[Any], Any]] = {}
+        self._indexes: Dict[str, Tuple[int, Any]] = {}
+
+    # --- Внутренние helpers (вызываются под блокировкой) ---
+
+    def _stat_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _load_locked(self):
+        """Перечитывает файл, если он изменился снаружи (или еще не загружен)"""
+        stamp = self._stat_stamp()
+        if self._data is not None and stamp == self._file_stamp:
+            return self._data
+
+        try:
+            with open(self.path, "r", encoding='utf-8') as f:
+                raw = f.read().strip()
+                data = json.loads(raw) if raw else self.default_factory()
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"⚠️ {self.path} is corrupted, using empty data: {e}")
+            data = self.default_factory()
+
+        # Внешнее изменение файла тоже считается новой версией
+        if self._data is not None:
+            self._version += 1
+        self._data = data
+        self._file_stamp = stamp
+        return self._data
+
+    def _write_locked(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=self.ensure_ascii, indent=self.indent)
+            # mkstemp создает файл с правами 0600 - сохраняем права исходного файла
+            try:
+                mode = os.stat(self.path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        # Храним собственную копию: вызывающий код может продолжать менять data
+        self._data = copy.deepcopy(data)
+        self._file_stamp = self._stat_stamp()
+        self._version += 1
+        return self._version
+
+    # --- Публичный API ---
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            self._load_locked()
+            return self._version
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def read(self):
+        """Возвращает копию текущих данных"""
+        return self.snapshot()[0]
+
+    def snapshot(self) -> Tuple[Any, int]:
+        """Возвращает (копия данных, версия) для последующего compare_and_swap"""
+        with self._lock:
+            data = self._load_locked()
+            return copy.deepcopy(data), self._version
+
+    def write(self, data) -> int:
+        """Безусловная запись, возвращает новую версию"""
+        with self._lock:
+            self._load_locked()
+            return self._write_locked(data)
+
+    def compare_and_swap(self, expected_version: int, data) -> int:
+        """Записывает данные, только если версия не изменилась с момента snapshot()"""
+        with self._lock:
+            self._load_locked()
+            if self._version != expected_version:
+                raise StoreConflictError(
+                    f"{self.path}: expected version {expected_version}, found {self._version}"
+                )
+            return self._write_locked(data)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Read-modify-write под блокировкой хранилища.
+
+        Внутри блока доступна копия данных (tx.data); при выходе без исключения
+        она записывается, если была изменена. tx.abort() отменяет запись.
+        """
+        with self._lock:
+            data = copy.deepcopy(self._load_locked())
+            tx = _Transaction(data, self._version)
+            yield tx
+            if not tx.aborted and tx.data != self._data:
+                tx.version = self._write_locked(tx.data)
+
+    def update(self, func: Callable[[Any], Any], retries: int = 5):
+        """
+        Оптимистичное обновление: func(data) -> new_data вызывается без блокировки,
+        запись проходит через compare_and_swap. При конфликте повторяем.
+        """
+        for attempt in range(retries + 1):
+            data, version = self.snapshot()
+            new_data = func(data)
+            try:
+                self.compare_and_swap(version, new_data)
+                return new_data
+            except StoreConflictError:
+                if attempt >= retries:
+                    raise
+                logger.debug(f"🔁 Store conflict on {self.path}, retrying ({attempt + 1}/{retries})")
+
+    def add_index(self, name: str, builder: Callable[[Any], Any]):
+        """
+        Регистрирует производный индекс: builder(data) строится один раз на версию
+        хранилища и переиспользуется всеми читателями до следующей записи.
+        """
+        with self._lock:
+            self._index_builders[name] = builder
+            self._indexes.pop(name, None)
+
+    def index(self, name: str):
+        """
+        Возвращает индекс для текущей версии данных.
+        Индекс разделяется между потоками - его нельзя изменять.
+        """
+        with self._lock:
+            data = self._load_locked()
+            cached = self._indexes.get(name)
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+            value = self._index_builders[name](data)
+            self._indexes[name] = (self._version, value)
+            return value
+
+    @contextmanager
+    def locked(self):
+        """Держит блокировку хранилища (для согласованного изменения нескольких хранилищ)"""
+        with self._lock:
+            yield self
+
+
+class _Transaction:
+    def __init__(self, data, version):
+        self.data = data
+        self.version = version
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+# --- Реестр хранилищ: один экземпляр (и одна блокировка) на файл ---
+_stores: Dict[str, JsonStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str, **options) -> JsonStore:
+    """Возвращает общее хранилище для файла; опции учитываются при первом создании"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = JsonStore(path, **options)
+            _stores[key] = store
+        return store
@@ -0,0 +1,156 @@
+# tasks.py
+
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class TaskCancelled(Exception):
+    """Задача отменена пользователем (бросается из check_cancelled и sleep)"""
+
+
+class TaskConflictError(Exception):
+    """Такая же задача уже выполняется или стоит в очереди"""
+
+
+class BackgroundTask:
+    """
+    Фоновая задача: тяжелая операция команды, вынесенная из потоков диспетчера.
+
+    Функция задачи получает сам объект задачи и должна регулярно вызывать
+    check_cancelled() или sleep() - так отмена срабатывает между шагами.
+    report(text) сохраняет текущий прогресс для /tasks.
+    """
+
+    def __init__(self, task_id: int, kind: str, title: str, func: Callable[["BackgroundTask"], None],
+                 chat_id=None, user_id=None, key: Optional[str] = None):
+        self.id = task_id
+        self.kind = kind
+        self.title = title
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.key = key
+        self.status = QUEUED
+        self.progress = ""
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._func = func
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise TaskCancelled(self.title)
+
+    def sleep(self, seconds: float):
+        """Пауза, которую прерывает отмена"""
+        if self._cancel.wait(seconds):
+            raise TaskCancelled(self.title)
+
+    def report(self, text: str):
+        self.progress = text
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class TaskManager:
+    """
+    Пул фоновых задач с ограничением одновременного выполнения.
+
+    Сверх max_workers задачи ждут в очереди; задачи с одинаковым key
+    не запускаются параллельно (submit бросает TaskConflictError).
+    Последние history завершенных задач хранятся для /tasks.
+    """
+
+    def __init__(self, max_workers: int = 2, history: int = 20, name: str = "bg-task"):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._history = history
+        self._tasks: "OrderedDict[int, BackgroundTask]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, title: str, func: Callable[[BackgroundTask], None],
+               chat_id=None, user_id=None, key: Optional[str] = None) -> BackgroundTask:
+        with self._lock:
+            if key is not None:
+                for task in self._tasks.values():
+                    if task.key == key and task.active:
+                        raise TaskConflictError(f"Task #{task.id} ({task.title}) is already {task.status}")
+            task = BackgroundTask(next(self._ids), kind, title, func, chat_id, user_id, key)
+            self._tasks[task.id] = task
+            self._trim_locked()
+        self._executor.submit(self._run, task)
+        logger.info(f"📥 Background task #{task.id} queued: {title}")
+        return task
+
+    def _run(self, task: BackgroundTask):
+        if task.cancelled:
+            task.status = CANCELLED
+            task.finished_at = time.time()
+            logger.info(f"🚫 Background task #{task.id} cancelled before start")
+            return
+        task.status = RUNNING
+        task.started_at = time.time()
+        try:
+            task._func(task)
+            task.status = CANCELLED if task.cancelled else DONE
+        except TaskCancelled:
+            task.status = CANCELLED
+        except Exception as e:
+            task.status = FAILED
+            task.error = str(e)
+            logger.error(f"❌ Background task #{task.id} ({task.title}) failed: {e}")
+        finally:
+            task.finished_at = time.time()
+        logger.info(f"🏁 Background task #{task.id} {task.status} in {task.elapsed():.1f}s: {task.title}")
+
+    def _trim_locked(self):
+        finished = [task_id for task_id, task in self._tasks.items() if not task.active]
+        for task_id in finished[:max(0, len(finished) - self._history)]:
+            del self._tasks[task_id]
+
+    def get(self, task_id: int) -> Optional[BackgroundTask]:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def list(self, chat_id=None) -> List[BackgroundTask]:
+        """Задачи (новые последними), для chat_id - только задачи этого чата"""
+        with self._lock:
+            return [task for task in self._tasks.values() if chat_id is None or task.chat_id == chat_id]
+
+    def cancel(self, task_id: int) -> bool:
+        """Запрашивает отмену, возвращает False, если задача уже завершена или не найдена"""
+        task = self.get(task_id)
+        if task is None or not task.active:
+            return False
+        task.cancel()
+        logger.info(f"🛑 Cancellation requested for background task #{task_id}")
+        return True
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return sum(1 for task in self._tasks.values() if task.status == status)
@@ -0,0 +1,134 @@
+# tests/test_auto_sync.py
+
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from scheduler import AdaptiveInterval
+from storage import JsonStore
+
+
+class _Manager:
+    """Таблица для автосинхронизации: отдает заданные подписки и напоминания"""
+
+    is_initialized = True
+
+    def __init__(self, chats, reminders):
+        self.chats = chats
+        self.reminders = reminders
+        self.operations = []
+
+    def fetch_sheet_views(self):
+        return {"chats": self.chats, "reminders": self.reminders}
+
+    def get_subscribed_chats(self, records):
+        return list(records)
+
+    def parse_reminder_records(self, records):
+        reminders = [dict(record) for record in records]
+        return reminders, {reminder["id"] for reminder in reminders}
+
+    def spooled_reminder_ids(self):
+        return set()
+
+    def log_operation(self, **fields):
+        self.operations.append(fields["action"])
+
+
+class _JobQueue:
+    def __init__(self):
+        self.runs = []
+
+    def run_once(self, callback, when, name=None):
+        self.runs.append((callback, when, name))
+
+
+@pytest.fixture
+def sync(monkeypatch, tmp_path):
+    reminders = JsonStore(str(tmp_path / "reminders.json"))
+    chats = JsonStore(str(tmp_path / "chats.json"))
+    monkeypatch.setattr(bot, "reminders_store", reminders)
+    monkeypatch.setattr(bot, "chats_store", chats)
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", True)
+    monkeypatch.setattr(bot, "auto_sync_interval", AdaptiveInterval(60, 1800, initial=300))
+    scheduled = []
+    monkeypatch.setattr(bot, "schedule_reminder", lambda job_queue, reminder: scheduled.append(reminder["id"]))
+    monkeypatch.setattr(bot, "unschedule_reminder", lambda job_queue, reminder_id: scheduled.append(f"-{reminder_id}"))
+    job_queue = _JobQueue()
+    context = SimpleNamespace(job_queue=job_queue, dispatcher=SimpleNamespace(job_queue=job_queue))
+    return SimpleNamespace(reminders=reminders, chats=chats, scheduled=scheduled, job_queue=job_queue, context=context)
+
+
+def _reminder(reminder_id, text="text", **fields):
+    reminder = {"id": reminder_id, "type": "daily", "time": "09:00", "text": text, "chat_id": 5}
+    reminder.update(fields)
+    return reminder
+
+
+def _intervals(job_queue):
+    assert all(callback is bot.auto_sync and name == "auto_sync" for callback, _, name in job_queue.runs)
+    return [when for _, when, _ in job_queue.runs]
+
+
+def test_interval_backs_off_while_sheet_is_unchanged(sync, monkeypatch):
+    sync.chats.write([5])
+    sync.reminders.write([_reminder("1")])
+    manager = _Manager([5], [_reminder("1")])
+    monkeypatch.setattr(bot, "sheets_manager", manager)
+
+    for _ in range(4):
+        bot.auto_sync(sync.context)
+
+    assert _intervals(sync.job_queue) == [600, 1200, 1800, 1800]
+    assert sync.scheduled == []
+    assert manager.operations == []
+
+
+def test_change_resets_interval_and_reschedules_only_changed(sync, monkeypatch):
+    sync.chats.write([5])
+    sync.reminders.write([_reminder("1"), _reminder("2"), _reminder("3")])
+    manager = _Manager([5, 7], [_reminder("1"), _reminder("2", "edited"), _reminder("4")])
+    monkeypatch.setattr(bot, "sheets_manager", manager)
+
+    bot.auto_sync(sync.context)
+
+    assert _intervals(sync.job_queue) == [60]
+    assert sorted(sync.scheduled) == ["-3", "2", "4"]
+    assert sorted(sync.chats.read()) == [5, 7]
+    assert {r["id"]: r["text"] for r in sync.reminders.read()} == {"1": "text", "2": "edited", "4": "text"}
+    assert manager.operations == ["AUTO_SYNC"]
+
+
+def test_sync_keeps_local_fields_and_later_last_sent(sync, monkeypatch):
+    sync.reminders.write([_reminder("1", audience="chat", last_sent="2030-01-02 09:00")])
+    remote = _reminder("1", "edited", last_sent="2030-01-01 09:00")
+    monkeypatch.setattr(bot, "sheets_manager", _Manager([], [remote]))
+
+    bot.auto_sync(sync.context)
+
+    [reminder] = sync.reminders.read()
+    assert reminder["text"] == "edited"
+    assert reminder["audience"] == "chat"
+    assert reminder["last_sent"] == "2030-01-02 09:00"
+
+
+def test_empty_sheet_keeps_local_data(sync, monkeypatch):
+    sync.chats.write([5])
+    sync.reminders.write([_reminder("1")])
+    monkeypatch.setattr(bot, "sheets_manager", _Manager([], []))
+
+    bot.auto_sync(sync.context)
+
+    assert sync.chats.read() == [5]
+    assert [r["id"] for r in sync.reminders.read()] == ["1"]
+    assert _intervals(sync.job_queue) == [600]
+
+
+def test_unavailable_sheets_still_reschedules(sync, monkeypatch):
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", False)
+
+    bot.auto_sync(sync.context)
+    bot.auto_sync(sync.context)
+
+    assert _intervals(sync.job_queue) == [600, 1200]
@@ -0,0 +1,68 @@
+# tests/test_chat_reminders.py
+
+import pytest
+
+import bot
+from storage import JsonStore
+
+
+@pytest.fixture
+def reminders(monkeypatch, tmp_path):
+    store = JsonStore(str(tmp_path / "reminders.json"))
+    store.add_index("by_chat", bot._build_reminders_by_chat)
+    monkeypatch.setattr(bot, "reminders_store", store)
+    return store
+
+
+def _reminder(reminder_id, chat_id=None, **fields):
+    reminder = {"id": str(reminder_id), "type": "daily", "time": "09:00", "text": f"r{reminder_id}"}
+    if chat_id is not None:
+        reminder["chat_id"] = chat_id
+    reminder.update(fields)
+    return reminder
+
+
+def test_reminder_owner():
+    assert bot.reminder_owner(_reminder(1, -100500)) == "-100500"
+    assert bot.reminder_owner(_reminder(1, " 42 ")) == "42"
+    for legacy in (None, "", 0):
+        assert bot.reminder_owner(_reminder(1, legacy)) == ""
+    assert bot.reminder_owner(_reminder(1)) == ""
+
+
+def test_reminder_audience_defaults_to_deployment_setting(monkeypatch):
+    monkeypatch.setattr(bot, "DEFAULT_REMINDER_AUDIENCE", "all")
+    assert bot.reminder_audience(_reminder(1, 5)) == "all"
+    assert bot.reminder_audience(_reminder(1, 5, audience=" Chat ")) == "chat"
+    monkeypatch.setattr(bot, "DEFAULT_REMINDER_AUDIENCE", "chat")
+    assert bot.reminder_audience(_reminder(1, 5)) == "chat"
+
+
+def test_recipients_follow_audience(monkeypatch):
+    monkeypatch.setattr(bot, "DEFAULT_REMINDER_AUDIENCE", "all")
+    chats = [1, 5, 7]
+    assert bot.get_reminder_recipients(_reminder(1, 5), chats) == chats
+    assert bot.get_reminder_recipients(_reminder(1, 5, audience="chat"), chats) == [5]
+    # Владелец отписан - в режиме "chat" доставлять некому
+    assert bot.get_reminder_recipients(_reminder(1, 9, audience="chat"), chats) == []
+    # У старых напоминаний нет владельца - рассылаются всем
+    assert bot.get_reminder_recipients(_reminder(1, audience="chat"), chats) == chats
+
+
+def test_chat_reminders_include_legacy_sorted_by_id(reminders):
+    reminders.write([
+        _reminder(10, 5), _reminder(2, 7), _reminder(3), _reminder(1, 5), _reminder(11),
+    ])
+    assert [r["id"] for r in bot.get_chat_reminders(5)] == ["1", "3", "10", "11"]
+    assert [r["id"] for r in bot.get_chat_reminders("7")] == ["2", "3", "11"]
+    assert [r["id"] for r in bot.get_chat_reminders(99)] == ["3", "11"]
+
+
+def test_chat_reminders_follow_store_writes(reminders):
+    reminders.write([_reminder(1, 5)])
+    assert [r["id"] for r in bot.get_chat_reminders(5)] == ["1"]
+    with reminders.transaction() as tx:
+        tx.data.append(_reminder(2, 5))
+        tx.data.append(_reminder(3, 6))
+    assert [r["id"] for r in bot.get_chat_reminders(5)] == ["1", "2"]
+    assert [r["id"] for r in bot.get_chat_reminders(6)] == ["3"]
@@ -0,0 +1,107 @@
+# tests/test_circuit_breaker.py
+
+from types import SimpleNamespace
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+def changes():
+    return []
+
+
+@pytest.fixture
+def breaker(clock, changes):
+    return CircuitBreaker("test", failure_threshold=3, cooldown=10, max_cooldown=25,
+                          on_change=lambda old, new: changes.append((old, new)))
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_failures_in_a_row(breaker, changes):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open and not breaker.allow()
+    assert breaker.retry_in == 10
+    assert changes == [(CLOSED, OPEN)]
+
+
+def test_half_open_allows_single_probe(breaker, clock):
+    _open(breaker)
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    assert not breaker.is_open
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(breaker, clock, changes):
+    _open(breaker)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+    assert changes == [(CLOSED, OPEN), (HALF_OPEN, CLOSED)]
+
+
+def test_failed_probe_doubles_cooldown_up_to_max(breaker, clock, changes):
+    _open(breaker)
+    for expected in (20, 25, 25):
+        clock.now += breaker.retry_in
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_in == expected
+    assert changes[1:] == [(HALF_OPEN, OPEN)] * 3
+
+    # Успех возвращает исходный cooldown
+    clock.now += breaker.retry_in
+    assert breaker.allow()
+    breaker.record_success()
+    _open(breaker)
+    assert breaker.retry_in == 10
+
+
+def test_failures_while_open_do_not_extend_cooldown(breaker, clock):
+    _open(breaker)
+    clock.now += 5
+    breaker.record_failure()
+    assert breaker.retry_in == 5
+
+
+def test_callback_errors_are_ignored(clock):
+    def fail(old, new):
+        raise RuntimeError("boom")
+
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=1, on_change=fail)
+    breaker.record_failure()
+    assert breaker.state == OPEN
@@ -0,0 +1,32 @@
+# tests/test_commands.py
+
+from types import SimpleNamespace
+
+import bot
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+
+    def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def test_delete_list_includes_custom_reminders(monkeypatch):
+    reminders = [
+        {"id": 1, "type": "daily", "time": "09:00", "text": "утро"},
+        {"id": 2, "type": "custom", "rule": "weekdays 10:00", "text": "стендап"},
+        {"id": 3, "type": "once", "datetime": "2030-01-01 12:00", "text": "праздник"},
+    ]
+    monkeypatch.setattr(bot, "get_chat_reminders", lambda chat_id: reminders)
+    message = _Message()
+    update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=42))
+    context = SimpleNamespace(user_data={})
+
+    assert bot.start_delete_reminder(update, context) == bot.REM_DEL_ID
+
+    text = message.replies[-1]
+    assert context.user_data["delete_candidates"] == [1, 2, 3]
+    assert "2. [🧭 По будням в 10:00]" in text
+    assert "3. [📅 Разово]" in text
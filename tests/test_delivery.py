@@ -0,0 +1,92 @@
+# tests/test_delivery.py
+
+import pytest
+from telegram.ext.utils.promise import Promise
+
+import bot
+from storage import JsonStore
+
+
+def _finished_promise(func):
+    promise = Promise(func, (), {})
+    promise.run()
+    return promise
+
+
+def _boom():
+    raise RuntimeError("prepare failed")
+
+
+def test_failed_preparation_falls_back_to_inline(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot, "deliver_reminder", lambda b, reminder, prepared=None: calls.append(prepared))
+
+    bot.deliver_live_reminder(None, {"id": 1}, _finished_promise(_boom))
+
+    assert calls == [None]
+    assert bot._live_deliveries == 0
+
+
+def test_prepared_fanout_is_passed_through(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot, "deliver_reminder", lambda b, reminder, prepared=None: calls.append(prepared))
+    prepared = {"chats": [1], "text": "t"}
+
+    bot.deliver_live_reminder(None, {"id": 1}, _finished_promise(lambda: prepared))
+
+    assert calls == [prepared]
+
+
+def test_preparation_without_chats_does_not_restore_again(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot, "deliver_reminder", lambda b, reminder, prepared=None: calls.append(prepared))
+
+    bot.deliver_live_reminder(None, {"id": 1}, _finished_promise(lambda: None))
+
+    assert calls == []
+
+
+@pytest.fixture
+def last_sent(monkeypatch, tmp_path):
+    store = JsonStore(str(tmp_path / "reminders.json"))
+    store.write([{"id": str(i), "type": "daily", "time": "09:00"} for i in range(1, 4)])
+    monkeypatch.setattr(bot, "reminders_store", store)
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", False)
+    monkeypatch.setattr(bot, "_pending_last_sent", {})
+    # Фоновую запись заменяет явный flush_local_last_sent
+    monkeypatch.setattr(bot, "_last_sent_writer", object())
+    return store
+
+
+def test_last_sent_is_saved_in_one_write(last_sent):
+    version = last_sent.version
+    bot.record_last_sent(1, "2030-01-01 09:00:00")
+    bot.record_last_sent("2", "2030-01-01 09:00:00")
+    bot.record_last_sent(1, "2030-01-01 10:00:00")
+    bot.record_last_sent(99, "2030-01-01 10:00:00")
+    assert last_sent.version == version
+
+    assert bot.flush_local_last_sent() == 2
+    assert last_sent.version == version + 1
+    assert [r.get("last_sent") for r in last_sent.read()] == ["2030-01-01 10:00:00", "2030-01-01 09:00:00", None]
+    assert bot.flush_local_last_sent() == 0
+    assert last_sent.version == version + 1
+
+
+def test_last_sent_is_kept_when_write_fails(last_sent, monkeypatch):
+    bot.record_last_sent(1, "old")
+
+    def fail():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(last_sent, "transaction", fail)
+    assert bot.flush_local_last_sent() == 0
+    bot.record_last_sent(1, "new")
+    assert bot._pending_last_sent == {"1": "new"}
+
+
+def test_shutdown_saves_pending_last_sent(last_sent, monkeypatch):
+    monkeypatch.setattr(bot, "reminder_scheduler", None)
+    bot.record_last_sent(3, "2030-01-01 09:00:00")
+    bot.shutdown()
+    assert last_sent.read()[2]["last_sent"] == "2030-01-01 09:00:00"
@@ -0,0 +1,40 @@
+# tests/test_fake_gspread.py
+
+import pytest
+
+from fake_gspread import ACTION_BUDGETS, CallBudgetExceeded, FakeClient, FakeRateLimitError, run_benchmark
+
+
+def test_actions_stay_within_request_budgets(capsys):
+    assert run_benchmark(reminders=50)
+    report = capsys.readouterr().out
+    for action in ACTION_BUDGETS:
+        assert action in report
+    assert "over budget" not in report
+
+
+def test_budget_counts_calls_inside_block():
+    client = FakeClient()
+    worksheet = client.open_by_key("test").seed("Reminders", [["ID"], ["1"]])
+
+    with client.stats.budget(1):
+        assert worksheet.get_all_values() == [["ID"], ["1"]]
+    with pytest.raises(CallBudgetExceeded):
+        with client.stats.budget(1, "two reads"):
+            worksheet.get_all_values()
+            worksheet.get_all_values()
+
+
+def test_injected_rate_limits_are_counted_as_errors():
+    client = FakeClient()
+    worksheet = client.spreadsheet("test").seed("Logs", [["A"]])
+    client.inject_rate_limit(2)
+
+    for _ in range(2):
+        with pytest.raises(FakeRateLimitError, match="429"):
+            worksheet.append_row(["x"])
+    worksheet.append_row(["y"])
+
+    assert worksheet.get_all_values() == [["A"], ["y"]]
+    assert client.stats.total == 4
+    assert client.stats.snapshot()["append_row"]["errors"] == 2
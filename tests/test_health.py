@@ -0,0 +1,79 @@
+# tests/test_health.py
+
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from scheduler import ReminderScheduler
+
+
+@pytest.fixture
+def running_bot(monkeypatch):
+    """Бот после запуска: обновления получаются, работает heap-планировщик"""
+    stages = bot.StartupStages()
+    for name in ("local_state", "schedule", bot.UPDATES_STAGE):
+        with stages.stage(name):
+            pass
+    scheduler = ReminderScheduler(on_fire=lambda reminder, fire_at: None,
+                                  next_fire=lambda reminder, after: None)
+    scheduler.start()
+    monkeypatch.setattr(bot, "startup_stages", stages)
+    monkeypatch.setattr(bot, "reminder_scheduler", scheduler)
+    monkeypatch.setattr(bot, "_updater", SimpleNamespace(
+        running=True, dispatcher=SimpleNamespace(running=True), job_queue=None))
+    yield scheduler
+    scheduler.stop()
+
+
+def _get(server, path):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def health_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), bot.HealthHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_liveness_with_heap_scheduler(running_bot):
+    ok, checks = bot.check_liveness()
+    assert ok
+    assert checks["scheduler"] is True
+
+
+def test_liveness_fails_when_heap_scheduler_stopped(running_bot):
+    running_bot.stop()
+    ok, checks = bot.check_liveness()
+    assert not ok
+    assert checks["scheduler"] is False
+
+
+def test_healthz_endpoint(running_bot, health_server):
+    code, document = _get(health_server, "/healthz")
+    assert code == 200
+    assert document["status"] == "ok"
+
+    running_bot.stop()
+    code, document = _get(health_server, "/")
+    assert code == 503
+    assert document["checks"]["scheduler"] is False
+
+
+def test_liveness_before_updates_started(monkeypatch):
+    monkeypatch.setattr(bot, "startup_stages", bot.StartupStages())
+    monkeypatch.setattr(bot, "_updater", None)
+    assert bot.check_liveness() == (True, {})
@@ -0,0 +1,100 @@
+# tests/test_job_registry.py
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+import pytz
+
+import bot
+from storage import JsonStore
+
+
+class _Job:
+    def __init__(self, name, context, next_t=None):
+        self.name = name
+        self.context = context
+        self.next_t = next_t
+        self.removed = False
+
+    def schedule_removal(self):
+        self.removed = True
+
+
+class _JobQueue:
+    """JobQueue без APScheduler: запоминает созданные задания"""
+
+    def __init__(self):
+        self.created = []
+
+    def _add(self, name, context, next_t=None):
+        job = _Job(name, context, next_t)
+        self.created.append(job)
+        return job
+
+    def run_once(self, callback, when, context=None, name=None):
+        return self._add(name, context, when if when.tzinfo else pytz.UTC.localize(when))
+
+    def run_daily(self, callback, time, days=None, context=None, name=None):
+        return self._add(name, context)
+
+    def jobs(self):
+        raise AssertionError("реестр не должен перебирать job_queue.jobs()")
+
+
+@pytest.fixture
+def job_queue(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, "reminder_scheduler", None)
+    monkeypatch.setattr(bot, "_reminder_jobs", {})
+    monkeypatch.setattr(bot, "reminders_store", JsonStore(str(tmp_path / "reminders.json")))
+    return _JobQueue()
+
+
+def _once(reminder_id, when):
+    return {"id": str(reminder_id), "type": "once", "datetime": when, "text": "t"}
+
+
+def test_replace_and_cancel_use_the_registry(job_queue):
+    bot.schedule_reminder(job_queue, _once(1, "2099-01-01 10:00"))
+    bot.schedule_reminder(job_queue, _once(2, "2099-01-01 09:00"))
+    first = job_queue.created[0]
+
+    bot.schedule_reminder(job_queue, _once(1, "2099-01-01 11:00"))
+    assert first.removed
+    assert bot.count_scheduled_reminders(job_queue) == 2
+    assert [reminder_id for reminder_id, _ in bot.get_scheduled_reminders(job_queue)] == ["2", "1"]
+    assert [reminder_id for reminder_id, _ in bot.get_scheduled_reminders(job_queue, limit=1)] == ["2"]
+
+    bot.unschedule_reminder(job_queue, "2")
+    assert job_queue.created[1].removed
+    assert bot.count_scheduled_reminders(job_queue) == 1
+    # Повторная отмена ничего не ломает
+    bot.unschedule_reminder(job_queue, "2")
+
+
+def test_reschedule_all_cancels_registered_jobs(job_queue):
+    reminders = [_once(1, "2099-01-01 10:00"), {"id": "2", "type": "daily", "time": "09:00", "text": "t"}]
+    bot.reminders_store.write(reminders)
+    for reminder in reminders:
+        bot.schedule_reminder(job_queue, reminder)
+    old_jobs = list(job_queue.created)
+
+    bot.reschedule_all_reminders(job_queue)
+    assert all(job.removed for job in old_jobs)
+    assert bot.count_scheduled_reminders(job_queue) == 2
+    assert not any(job.removed for job in job_queue.created[len(old_jobs):])
+
+
+def test_fired_one_time_job_leaves_registry(job_queue, monkeypatch):
+    delivered = []
+    monkeypatch.setattr(bot, "deliver_reminder", lambda *args, **kwargs: delivered.append(args[1]["id"]))
+    monkeypatch.setattr(bot, "deliver_live_reminder", lambda *args, **kwargs: delivered.append(args[1]["id"]),
+                        raising=False)
+    reminder = _once(1, "2099-01-01 10:00")
+    bot.schedule_reminder(job_queue, reminder)
+    job = job_queue.created[0]
+
+    monkeypatch.setattr(bot, "get_moscow_time", lambda: bot.MOSCOW_TZ.localize(datetime(2099, 1, 2)))
+    bot.send_reminder(SimpleNamespace(bot=None, job=job, job_queue=job_queue))
+    assert delivered == ["1"]
+    assert bot.count_scheduled_reminders(job_queue) == 0
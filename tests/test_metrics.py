@@ -0,0 +1,84 @@
+# tests/test_metrics.py
+
+import pytest
+
+from metrics import HISTOGRAM_BUCKETS, Metrics, RateWindow, Timing
+
+
+@pytest.fixture
+def registry():
+    return Metrics(prefix="test")
+
+
+def test_counters_by_label(registry):
+    registry.incr("sent", chat="a")
+    registry.incr("sent", 2, chat="b")
+    registry.incr("sent", 0, chat="c")
+    assert registry.counter("sent", chat="b") == 2
+    assert registry.counters("sent", "chat") == {"a": 1, "b": 2}
+    assert registry.snapshot()["counters"]['sent{chat="b"}']["last_1m"] == 2
+
+
+def test_rate_window_drops_old_events():
+    window = RateWindow(window=60)
+    window.add(3, now=1000)
+    window.add(2, now=1030)
+    assert window.count(now=1050) == 5
+    assert window.count(seconds=30, now=1050) == 2
+    assert window.count(now=1070) == 2
+
+
+def test_timing_percentile_and_summary():
+    timing = Timing()
+    assert timing.percentile(95) is None
+    for value in range(1, 101):
+        timing.add(value / 100.0, error=value > 98)
+    assert timing.percentile(50) == 0.51
+    assert timing.percentile(95) == 0.95
+    summary = timing.as_dict()
+    assert summary["count"] == 100 and summary["errors"] == 2
+    assert summary["max_seconds"] == 1.0
+
+
+def test_timed_treats_false_result_as_error(registry):
+    @registry.timed("op")
+    def op(result):
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    op(True)
+    op(False)
+    op((False, 0))
+    with pytest.raises(ValueError):
+        op(ValueError())
+    assert registry.timings("op", "x")[""]["count"] == 4
+    assert registry.timings("op", "x")[""]["errors"] == 3
+
+
+def test_render_prometheus(registry):
+    registry.incr("sent", 3, chat='a"b')
+    registry.observe("sheets", 0.07, operation="read")
+    registry.observe("sheets", 1000.0, error=True, operation="read")
+    registry.gauge("queue_depth", lambda: 4)
+    registry.gauge("details", lambda: {"a": 1})
+    registry.gauge("broken", lambda: 1 / 0)
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert "# TYPE test_sent_total counter" in lines
+    assert 'test_sent_total{chat="a\\"b"} 3' in lines
+    assert "# TYPE test_sheets_seconds histogram" in lines
+    assert 'test_sheets_seconds_bucket{operation="read",le="0.05"} 0' in lines
+    assert 'test_sheets_seconds_bucket{operation="read",le="0.1"} 1' in lines
+    # Длительность больше последней границы попадает только в +Inf
+    assert f'test_sheets_seconds_bucket{{operation="read",le="{HISTOGRAM_BUCKETS[-1]!r}"}} 1' in lines
+    assert 'test_sheets_seconds_bucket{operation="read",le="+Inf"} 2' in lines
+    assert 'test_sheets_seconds_count{operation="read"} 2' in lines
+    assert 'test_sheets_errors_total{operation="read"} 1' in lines
+    assert "test_queue_depth 4" in lines
+    assert any(line.startswith("test_uptime_seconds ") for line in lines)
+    assert not any("details" in line or "broken" in line for line in lines)
+    # Каждая метрика объявлена один раз
+    types = [line for line in lines if line.startswith("# TYPE")]
+    assert len(types) == len(set(types))
@@ -0,0 +1,132 @@
+# tests/test_recurrence.py
+
+from datetime import datetime
+
+import pytest
+
+from recurrence import (
+    MOSCOW_TZ, RecurrenceError, _parse_cron_field, compile_reminder, parse_rule, schedule_fields,
+)
+
+
+def _msk(*args):
+    return MOSCOW_TZ.localize(datetime(*args))
+
+
+def _fires(rule, after, count):
+    recurrence = parse_rule(rule)
+    result = []
+    for _ in range(count):
+        after = recurrence.next_after(after)
+        result.append(after)
+    return result
+
+
+def test_cron_field_forms():
+    assert _parse_cron_field("*", 0, 59) is None
+    assert _parse_cron_field("*/15", 0, 59) == {0, 15, 30, 45}
+    assert _parse_cron_field("1-5", 0, 7) == {1, 2, 3, 4, 5}
+    assert _parse_cron_field("10-20/5", 0, 59) == {10, 15, 20}
+    assert _parse_cron_field("1,15,30", 1, 31) == {1, 15, 30}
+
+
+def test_cron_field_start_with_step_runs_to_end_of_range():
+    assert _parse_cron_field("5/10", 0, 59) == {5, 15, 25, 35, 45, 55}
+    assert _parse_cron_field("20/2", 0, 23) == {20, 22}
+
+
+@pytest.mark.parametrize("text", ["60", "5-1", "1-x", "*/0", "a", "5/x"])
+def test_cron_field_rejects_invalid(text):
+    with pytest.raises(RecurrenceError):
+        _parse_cron_field(text, 0, 59)
+
+
+def test_cron_minutes_with_start_and_step():
+    fires = _fires("cron 5/20 9 * * *", _msk(2024, 1, 1, 0, 0), 4)
+    assert [(f.hour, f.minute) for f in fires] == [(9, 5), (9, 25), (9, 45), (9, 5)]
+    assert fires[3].day == 2
+
+
+def test_cron_restricted_monthday_and_weekday_match_either():
+    # 1-е число или любой понедельник: январь 2024 начинается с понедельника
+    fires = _fires("cron 0 9 1 * 1", _msk(2024, 1, 1, 10, 0), 3)
+    assert [f.day for f in fires] == [8, 15, 22]
+    fires = _fires("cron 0 9 1 * 1", _msk(2024, 1, 29, 10, 0), 2)
+    assert [(f.month, f.day) for f in fires] == [(2, 1), (2, 5)]
+
+
+def test_cron_star_step_monthday_requires_both_fields():
+    # */2 по числам начинается с '*' - нужны и нечетное число, и понедельник
+    fires = _fires("cron 0 9 */2 * 1", _msk(2024, 1, 1, 10, 0), 3)
+    assert [(f.month, f.day) for f in fires] == [(1, 15), (1, 29), (2, 5)]
+
+
+def test_cron_star_step_weekday_requires_both_fields():
+    fires = _fires("cron 0 9 10 * */3", _msk(2024, 1, 1, 0, 0), 2)
+    # */3 по дням недели: вс, ср, сб
+    assert all(f.day == 10 and f.weekday() in (6, 2, 5) for f in fires)
+    assert [(f.year, f.month) for f in fires] == [(2024, 1), (2024, 2)]
+
+
+def test_cron_sunday_is_zero_and_seven():
+    for field in ("0", "7"):
+        fire = parse_rule(f"cron 30 8 * * {field}").next_after(_msk(2024, 1, 1, 0, 0))
+        assert fire == _msk(2024, 1, 7, 8, 30)
+
+
+def test_cron_requires_five_fields():
+    with pytest.raises(RecurrenceError):
+        parse_rule("cron 0 9 * *")
+
+
+def test_keyword_rules_and_russian_aliases():
+    assert parse_rule("ежедневно 18:00,09:00").rule == "daily 09:00,18:00"
+    assert parse_rule("будни 09:00").rule == "weekdays 09:00"
+    assert parse_rule("weekly пт,mon,среда 10:30").rule == "weekly пн,ср,пт 10:30"
+    assert parse_rule("weekly сб-пн 10:00").rule == "weekly пн,сб,вс 10:00"
+    assert parse_rule("monthly 15,1 12:00").rule == "monthly 1,15 12:00"
+    assert parse_rule("каждые 3ч 08:00").rule == "every 3h 08:00"
+
+
+def test_weekdays_rule_skips_weekend():
+    # 2024-01-05 - пятница
+    fire = parse_rule("weekdays 09:00").next_after(_msk(2024, 1, 5, 9, 0))
+    assert fire == _msk(2024, 1, 8, 9, 0)
+
+
+def test_every_rule_crosses_midnight():
+    fires = _fires("every 6h 20:00", _msk(2024, 1, 1, 20, 0), 2)
+    assert fires == [_msk(2024, 1, 2, 2, 0), _msk(2024, 1, 2, 8, 0)]
+
+
+def test_every_rule_keeps_start_time_when_hours_do_not_divide_day():
+    fires = _fires("every 5h 09:00", _msk(2026, 10, 19, 8, 0), 7)
+    assert fires == [_msk(2026, 10, 19, 9, 0), _msk(2026, 10, 19, 14, 0), _msk(2026, 10, 19, 19, 0),
+                     _msk(2026, 10, 20, 0, 0), _msk(2026, 10, 20, 5, 0), _msk(2026, 10, 20, 9, 0),
+                     _msk(2026, 10, 20, 14, 0)]
+    assert parse_rule("every 5h 09:00").describe() == "Каждые 5 ч. (от 09:00)"
+
+
+def test_monthly_skips_short_months():
+    fire = parse_rule("monthly 31 09:00").next_after(_msk(2024, 1, 31, 10, 0))
+    assert fire == _msk(2024, 3, 31, 9, 0)
+
+
+@pytest.mark.parametrize("text", ["", "daily 25:00", "weekly xx 09:00", "every 0h", "every 30h", "sometimes 09:00"])
+def test_invalid_rules(text):
+    with pytest.raises(RecurrenceError):
+        parse_rule(text)
+
+
+def test_compile_reminder_legacy_types():
+    once = compile_reminder({"type": "once", "datetime": "2024-01-01 09:00"})
+    assert once.next_after(_msk(2024, 1, 1, 8, 0)) == _msk(2024, 1, 1, 9, 0)
+    assert once.next_after(_msk(2024, 1, 1, 9, 0)) is None
+    weekly = compile_reminder({"type": "weekly", "day": "среда", "time": "10:00"})
+    assert weekly.next_after(_msk(2024, 1, 1, 0, 0)) == _msk(2024, 1, 3, 10, 0)
+
+
+def test_schedule_fields_normalises_custom_rule():
+    assert schedule_fields("custom", "будни 9:00") == {"type": "custom", "rule": "weekdays 09:00"}
+    with pytest.raises(RecurrenceError):
+        schedule_fields("custom", "cron 61 * * * *")
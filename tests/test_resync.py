@@ -0,0 +1,138 @@
+# tests/test_resync.py
+
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from scheduler import AdaptiveInterval
+from storage import JsonStore
+
+
+class _JobQueue:
+    def __init__(self):
+        self.runs = []
+
+    def run_once(self, callback, when, name=None):
+        self.runs.append(name)
+
+
+@pytest.fixture
+def resync_state(monkeypatch):
+    """Пустая очередь пересинхронизации и JobQueue, записывающая задания"""
+    job_queue = _JobQueue()
+    monkeypatch.setattr(bot, "_resync_pending", {"Reminders": {"ids": set(), "rows": set()},
+                                                 "Chat_Stats": {"ids": set(), "rows": set()}})
+    monkeypatch.setattr(bot, "_resync_queued", False)
+    monkeypatch.setattr(bot, "_updater", SimpleNamespace(job_queue=job_queue))
+    return job_queue
+
+
+@pytest.fixture
+def health_server(monkeypatch):
+    monkeypatch.setattr(bot, "RESYNC_TOKEN", "secret")
+    monkeypatch.setattr(bot, "updates_running", lambda: True)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), bot.HealthHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _post(server, body, token="secret", path="/resync"):
+    headers = {"Content-Type": "application/json"}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}{path}",
+                                     data=data, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_resync_requires_token(health_server, resync_state):
+    assert _post(health_server, {"ids": [1]}, token=None) == 403
+    assert _post(health_server, {"ids": [1]}, token="wrong") == 403
+    assert resync_state.runs == []
+
+
+def test_resync_validates_payload(health_server, resync_state):
+    assert _post(health_server, b"not json") == 400
+    assert _post(health_server, {"sheet": "Operation_Logs", "ids": [1]}) == 400
+    assert _post(health_server, {"sheet": "Reminders"}) == 400
+    assert _post(health_server, {"rows": list(range(bot.RESYNC_MAX_ITEMS + 1))}) == 400
+    assert resync_state.runs == []
+
+
+def test_resync_requests_are_coalesced(health_server, resync_state):
+    assert _post(health_server, {"ids": [7, " 8 "]}) == 202
+    assert _post(health_server, {"sheet": "Chat_Stats", "rows": [3]}) == 202
+
+    assert resync_state.runs == ["targeted_resync"]
+    assert bot._resync_pending["Reminders"] == {"ids": {"7", "8"}, "rows": set()}
+    assert bot._resync_pending["Chat_Stats"] == {"ids": set(), "rows": {3}}
+
+
+def test_resync_disabled_without_token(health_server, resync_state, monkeypatch):
+    monkeypatch.setattr(bot, "RESYNC_TOKEN", "")
+    assert _post(health_server, {"ids": [1]}, token="") == 404
+
+
+class _Manager:
+    """Таблица для точечной пересинхронизации: строки Reminders по ID и номеру строки"""
+
+    is_initialized = True
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = []
+
+    def fetch_rows(self, sheet_name, ids=(), rows=()):
+        self.fetched.append((sheet_name, set(ids), set(rows)))
+        return [dict(record) for number, record in self.rows.items()
+                if number in rows or record["ID"] in ids]
+
+    def parse_reminder_records(self, records):
+        reminders = [{"id": record["ID"], "text": record["Text"], "type": "daily", "time": "09:00", "chat_id": 5}
+                     for record in records if record["Status"] == "Active"]
+        return reminders, {reminder["id"] for reminder in reminders}
+
+    def spooled_reminder_ids(self):
+        return set()
+
+
+def test_targeted_resync_touches_only_requested_rows(resync_state, monkeypatch, tmp_path):
+    reminders = JsonStore(str(tmp_path / "reminders.json"))
+    monkeypatch.setattr(bot, "reminders_store", reminders)
+    monkeypatch.setattr(bot, "chats_store", JsonStore(str(tmp_path / "chats.json")))
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", True)
+    monkeypatch.setattr(bot, "auto_sync_interval", AdaptiveInterval(60, 1800, initial=300))
+    scheduled = []
+    monkeypatch.setattr(bot, "schedule_reminder", lambda job_queue, reminder: scheduled.append(reminder["id"]))
+    monkeypatch.setattr(bot, "unschedule_reminder", lambda job_queue, reminder_id: scheduled.append(f"-{reminder_id}"))
+    manager = _Manager({
+        2: {"ID": "1", "Text": "edited in sheet", "Status": "Active"},
+        3: {"ID": "2", "Text": "r2", "Status": "Deleted"},
+        5: {"ID": "5", "Text": "new", "Status": "Active"},
+    })
+    monkeypatch.setattr(bot, "sheets_manager", manager)
+    reminders.write([{"id": reminder_id, "text": f"r{reminder_id}", "type": "daily", "time": "09:00", "chat_id": 5}
+                     for reminder_id in ("1", "2", "3")])
+
+    bot.request_resync("Reminders", ids=["2"], rows=[5])
+    context = SimpleNamespace(dispatcher=SimpleNamespace(job_queue=None))
+    bot.run_targeted_resync(context)
+
+    assert manager.fetched == [("Reminders", {"2"}, {5})]
+    assert {r["id"]: r["text"] for r in reminders.read()} == {"1": "r1", "3": "r3", "5": "new"}
+    assert scheduled == ["-2", "5"]
+    assert bot.auto_sync_interval.current == bot.AUTO_SYNC_MAX_INTERVAL
+    assert bot._resync_queued is False
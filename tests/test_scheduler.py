@@ -0,0 +1,140 @@
+# tests/test_scheduler.py
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from scheduler import AdaptiveInterval, LoadShaper, ReminderScheduler, UpcomingIndex
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=pytz.UTC)
+
+
+def _at(reminder, after):
+    """next_fire для тестов: reminder["at"] - список секунд от NOW"""
+    for offset in reminder["at"]:
+        fire_at = NOW + timedelta(seconds=offset)
+        if fire_at > after:
+            return fire_at
+    return None
+
+
+def _reminder(reminder_id, *offsets, chat="c"):
+    return {"id": reminder_id, "at": list(offsets), "chat": chat}
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = ReminderScheduler(on_fire=lambda reminder, fire_at: None, next_fire=_at)
+    yield scheduler
+    scheduler.stop()
+
+
+def test_entries_in_fire_order(scheduler):
+    for reminder_id, offset in (("b", 30), ("a", 10), ("c", 20)):
+        scheduler.schedule(_reminder(reminder_id, offset), after=NOW)
+    assert [reminder_id for reminder_id, _ in scheduler.entries()] == ["a", "c", "b"]
+    assert [reminder_id for reminder_id, _ in scheduler.entries(limit=2)] == ["a", "c"]
+    assert scheduler.next_fire_time("c") == NOW + timedelta(seconds=20)
+
+
+def test_reschedule_replaces_entry(scheduler):
+    scheduler.schedule(_reminder("a", 10), after=NOW)
+    scheduler.schedule(_reminder("a", 50), after=NOW)
+    assert len(scheduler) == 1
+    assert scheduler.entries() == [("a", NOW + timedelta(seconds=50))]
+
+
+def test_unschedule_and_finished_reminders(scheduler):
+    scheduler.schedule(_reminder("a", 10), after=NOW)
+    assert "a" in scheduler
+    assert scheduler.unschedule("a") is True
+    assert scheduler.unschedule("a") is False
+    assert "a" not in scheduler
+    # Нет будущих срабатываний - не планируется
+    assert scheduler.schedule(_reminder("b", 10), after=NOW + timedelta(seconds=20)) is None
+    assert len(scheduler) == 0
+
+
+def test_stale_entries_are_compacted(scheduler, monkeypatch):
+    monkeypatch.setattr(ReminderScheduler, "COMPACT_MIN_STALE", 10)
+    for offset in range(100):
+        scheduler.schedule(_reminder("a", 1000 + offset), after=NOW)
+    assert len(scheduler._heap) <= 2 * 10 + 2
+
+
+def test_fires_due_reminders_in_order_and_advances():
+    fired = []
+    done = threading.Event()
+    now = datetime.now(pytz.UTC)
+
+    def next_fire(reminder, after):
+        for offset in reminder["at"]:
+            fire_at = now + timedelta(seconds=offset)
+            if fire_at > after:
+                return fire_at
+        return None
+
+    def on_fire(reminder, fire_at):
+        fired.append(reminder["id"])
+        if len(fired) == 3:
+            done.set()
+
+    scheduler = ReminderScheduler(on_fire=on_fire, next_fire=next_fire)
+    scheduler.schedule(_reminder("late", 0.2), after=now)
+    scheduler.schedule(_reminder("repeat", 0.05, 0.3), after=now)
+    scheduler.start()
+    try:
+        assert scheduler.is_running
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert fired == ["repeat", "late", "repeat"]
+    assert not scheduler.is_running
+    assert len(scheduler) == 0
+
+
+def test_index_follows_schedule():
+    index = UpcomingIndex(group_key=lambda reminder: reminder["chat"])
+    scheduler = ReminderScheduler(on_fire=lambda reminder, fire_at: None, next_fire=_at, index=index)
+    scheduler.schedule(_reminder("a", 30, chat="x"), after=NOW)
+    scheduler.schedule(_reminder("b", 10, chat="y"), after=NOW)
+    scheduler.schedule(_reminder("c", 20, chat="x"), after=NOW)
+    assert index.peek() == NOW + timedelta(seconds=10)
+    assert index.head(["x"])[0]["id"] == "c"
+    scheduler.unschedule("c")
+    assert index.head(["x"])[0]["id"] == "a"
+    assert len(index) == 2
+
+
+def test_index_firings_merges_repeats():
+    index = UpcomingIndex(group_key=lambda reminder: reminder["chat"])
+    index.update(_reminder("a", 10, 40), NOW + timedelta(seconds=10))
+    index.update(_reminder("b", 20), NOW + timedelta(seconds=20))
+    firings = index.firings(["c"], 5, _at)
+    assert [(reminder["id"], (fire_at - NOW).seconds) for reminder, fire_at in firings] == [
+        ("a", 10), ("b", 20), ("a", 40)]
+
+
+def test_load_shaper_spreads_within_minute():
+    shaper = LoadShaper(fanout=lambda reminder: reminder["fanout"], rate=10, spread=30)
+    base = 60 * 1000
+    assert shaper.place("a", 50, base) == base
+    assert shaper.place("b", 400, base) == base + 5
+    assert shaper.place("c", 1, base) == base + 30
+    assert shaper.peak_load() == 451
+    shaper.release("b")
+    assert shaper.peak_load() == 51
+    # Повторное размещение в той же минуте сохраняет сдвиг
+    assert shaper.place("c", 1, base) == base + 30
+
+
+def test_adaptive_interval_backs_off_and_resets():
+    interval = AdaptiveInterval(minimum=10, maximum=35)
+    assert interval.next(changed=False) == 20
+    assert interval.next(changed=False) == 35
+    assert interval.next(changed=False) == 35
+    assert interval.next(changed=True) == 10
+    interval.reset(25)
+    assert interval.current == 25
@@ -0,0 +1,94 @@
+# tests/test_sheet_setup.py
+
+import pytest
+
+import sheets_integration
+from sheets_integration import SheetsManager
+
+REMINDERS_HEADER = ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+                    "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+SEND_HISTORY_HEADER = ["Timestamp_UTC", "Timestamp_MSK", "Reminder_ID", "Chat_ID",
+                       "Status", "Error", "Text_Preview"]
+CHAT_STATS_HEADER = ["Chat_ID", "Chat_Name", "Chat_Type", "Reminders_Count",
+                     "Last_Activity", "Members_Count", "First_Seen", "Status"]
+OPERATION_LOGS_HEADER = ["Timestamp_UTC", "Timestamp_MSK", "Action", "User_ID",
+                         "Username", "Chat_ID", "Details", "Reminder_ID"]
+
+
+class _Spreadsheet:
+    """Таблица для _setup_sheets: заголовки листов и журнал запросов к API"""
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.calls = []
+        self.batch_updates = []
+
+    def fetch_sheet_metadata(self, params=None):
+        self.calls.append("fetch_sheet_metadata")
+        return {"sheets": [
+            {"properties": {"sheetId": sheet_id, "title": title, "gridProperties": {"columnCount": len(header)}}}
+            for sheet_id, (title, header) in enumerate(self.headers.items(), start=1)
+        ]}
+
+    def values_batch_get(self, ranges, params=None):
+        self.calls.append("values_batch_get")
+        return {"valueRanges": [{"values": [self.headers[sheet_range.split("!")[0].strip("'")]]}
+                                for sheet_range in ranges]}
+
+    def batch_update(self, body):
+        self.calls.append("batch_update")
+        self.batch_updates.append(body["requests"])
+
+
+@pytest.fixture
+def setup_sheets(monkeypatch, tmp_path):
+    monkeypatch.delenv("GOOGLE_SHEETS_CREDENTIALS", raising=False)
+    monkeypatch.delenv("GOOGLE_SHEETS_ID", raising=False)
+    monkeypatch.setattr(sheets_integration, "SHEETS_SPOOL_PATH", str(tmp_path / "spool.db"))
+
+    def run(headers):
+        spreadsheet = _Spreadsheet(headers)
+        manager = SheetsManager()
+        manager.spreadsheet = spreadsheet
+        manager._setup_sheets()
+        return spreadsheet
+    return run
+
+
+def _request_kinds(requests):
+    return [next(iter(request)) for request in requests]
+
+
+def test_new_spreadsheet_is_created_in_one_batch(setup_sheets):
+    spreadsheet = setup_sheets({})
+
+    assert spreadsheet.calls == ["fetch_sheet_metadata", "batch_update"]
+    [requests] = spreadsheet.batch_updates
+    assert _request_kinds(requests) == ["addSheet", "updateCells"] * 4
+    titles = [request["addSheet"]["properties"]["title"] for request in requests[::2]]
+    assert titles == ["Reminders", "Send_History", "Chat_Stats", "Operation_Logs"]
+
+
+def test_ready_spreadsheet_needs_two_reads(setup_sheets):
+    spreadsheet = setup_sheets({
+        "Reminders": REMINDERS_HEADER, "Send_History": SEND_HISTORY_HEADER,
+        "Chat_Stats": CHAT_STATS_HEADER, "Operation_Logs": OPERATION_LOGS_HEADER,
+    })
+
+    assert spreadsheet.calls == ["fetch_sheet_metadata", "values_batch_get"]
+
+
+def test_missing_columns_are_appended_and_foreign_headers_kept(setup_sheets):
+    spreadsheet = setup_sheets({
+        "Reminders": REMINDERS_HEADER[:10],
+        "Send_History": SEND_HISTORY_HEADER,
+        "Chat_Stats": ["Something", "Else"],
+        "Operation_Logs": OPERATION_LOGS_HEADER,
+    })
+
+    assert spreadsheet.calls == ["fetch_sheet_metadata", "values_batch_get", "batch_update"]
+    [requests] = spreadsheet.batch_updates
+    assert _request_kinds(requests) == ["updateSheetProperties", "updateCells"]
+    cells = requests[1]["updateCells"]
+    assert cells["start"] == {"sheetId": 1, "rowIndex": 0, "columnIndex": 10}
+    assert cells["rows"][0]["values"] == [{"userEnteredValue": {"stringValue": "Days_Of_Week"}}]
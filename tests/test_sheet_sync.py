@@ -0,0 +1,127 @@
+# tests/test_sheet_sync.py
+
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+import sheets_integration
+from fake_gspread import FakeClient
+from sheets_integration import SheetsManager
+from storage import JsonStore
+
+REMINDERS_HEADER = ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+                    "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+
+
+class _Manager:
+    def __init__(self, spooled=()):
+        self.spooled = set(spooled)
+
+    def spooled_reminder_ids(self):
+        return set(self.spooled)
+
+
+@pytest.fixture
+def stores(monkeypatch, tmp_path):
+    reminders = JsonStore(str(tmp_path / "reminders.json"))
+    chats = JsonStore(str(tmp_path / "chats.json"))
+    monkeypatch.setattr(bot, "reminders_store", reminders)
+    monkeypatch.setattr(bot, "chats_store", chats)
+    calls = []
+    monkeypatch.setattr(bot, "schedule_reminder", lambda job_queue, reminder: calls.append(("schedule", reminder["id"])))
+    monkeypatch.setattr(bot, "unschedule_reminder", lambda job_queue, reminder_id: calls.append(("unschedule", reminder_id)))
+    return reminders, calls
+
+
+def _reminder(reminder_id, text="text"):
+    return {"id": reminder_id, "type": "daily", "time": "09:00", "text": text, "chat_id": 1}
+
+
+def test_full_sync_removes_reminders_missing_from_sheet(stores, monkeypatch):
+    reminders, calls = stores
+    monkeypatch.setattr(bot, "sheets_manager", _Manager())
+    reminders.write([_reminder("1"), _reminder("2")])
+
+    _, _, changed, removed = bot.apply_sheet_sync(None, [], [_reminder("1")])
+
+    assert removed == ["2"]
+    assert [r["id"] for r in reminders.read()] == ["1"]
+    assert calls == [("unschedule", "2")]
+
+
+def test_full_sync_keeps_reminders_with_pending_spool_writes(stores, monkeypatch):
+    reminders, calls = stores
+    # CREATE напоминания 2 и UPDATE напоминания 1 еще не дошли до таблицы
+    monkeypatch.setattr(bot, "sheets_manager", _Manager(spooled={"1", "2"}))
+    reminders.write([_reminder("1", "new text"), _reminder("2")])
+
+    _, _, changed, removed = bot.apply_sheet_sync(None, [], [_reminder("1", "old text"), _reminder("3")])
+
+    assert removed == []
+    assert [r["id"] for r in changed] == ["3"]
+    assert {r["id"]: r["text"] for r in reminders.read()} == {"1": "new text", "2": "text", "3": "text"}
+
+
+def test_pending_delete_is_not_resurrected(stores, monkeypatch):
+    reminders, calls = stores
+    monkeypatch.setattr(bot, "sheets_manager", _Manager(spooled={"5"}))
+    reminders.write([_reminder("1")])
+
+    _, _, changed, removed = bot.apply_sheet_sync(None, [], [_reminder("1"), _reminder("5")])
+
+    assert changed == [] and removed == []
+    assert [r["id"] for r in reminders.read()] == ["1"]
+
+
+def test_cleared_reminders_stay_deleted_when_sheets_is_rate_limited(stores, monkeypatch, tmp_path):
+    reminders, calls = stores
+    monkeypatch.setattr(sheets_integration.time, "sleep", lambda seconds: None)
+    client = FakeClient()
+    manager = SheetsManager(client=client, sheet_id="test", spool_path=str(tmp_path / "spool.db"))
+    # Отложенные записи отправляются явно, без фонового потока
+    monkeypatch.setattr(manager, "_start_replayer", lambda: None)
+    monkeypatch.setattr(bot, "sheets_manager", manager)
+    monkeypatch.setattr(bot, "edit_task_message", lambda *args, **kwargs: None)
+    sheet = client.spreadsheet("test")
+    sheet.seed("Reminders", [REMINDERS_HEADER] + [
+        [reminder_id, "text", "09:00", "daily", 1, "", "Active"] for reminder_id in ("1", "2")])
+    reminders.write([_reminder("1"), _reminder("2")])
+
+    client.inject_rate_limit(1000)
+    task = SimpleNamespace(check_cancelled=lambda: None)
+    bot.clear_reminders_task(task, None, None, None, reminders.read(), 1, "chat", 42, "user")
+    assert reminders.read() == []
+
+    # Таблица снова доступна, но статусы Deleted еще в spool - автосинхронизация не возвращает напоминания
+    client._pending_rate_limits = 0
+    manager.breaker.record_success()
+    bot.sync_from_sheets(None)
+    assert reminders.read() == []
+    assert manager.spooled_reminder_ids() == {"1", "2"}
+
+    assert manager.replay_spool()
+    assert [row[6] for row in sheet._get("Reminders")._values()[1:]] == ["Deleted", "Deleted"]
+    bot.sync_from_sheets(None)
+    assert reminders.read() == []
+    assert ("schedule", "1") not in calls
+
+
+def test_clear_keeps_reminders_when_deletion_cannot_be_recorded(stores, monkeypatch):
+    reminders, calls = stores
+    messages = []
+    manager = SimpleNamespace(
+        log_reminder_action=lambda *args: None,
+        mark_reminders_deleted=lambda reminders_data: (False, 0, 0, 0),
+        update_reminders_count=lambda chat_id: None,
+    )
+    monkeypatch.setattr(bot, "sheets_manager", manager)
+    monkeypatch.setattr(bot, "edit_task_message", lambda tg_bot, message, task, text, final=False: messages.append(text))
+    reminders.write([_reminder("1")])
+
+    bot.clear_reminders_task(SimpleNamespace(check_cancelled=lambda: None), None, None, None,
+                             reminders.read(), 1, "chat", 42, "user")
+
+    assert [r["id"] for r in reminders.read()] == ["1"]
+    assert calls == []
+    assert "сохранены" in messages[-1]
@@ -0,0 +1,126 @@
+# tests/test_sheets_integration.py
+
+import pytest
+
+import sheets_integration
+from fake_gspread import FakeClient
+from sheets_integration import SheetsManager
+
+REMINDERS_HEADER = ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+                    "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Паузы повторов 429 в тестах не нужны
+    monkeypatch.setattr(sheets_integration.time, "sleep", lambda seconds: None)
+    return FakeClient()
+
+
+@pytest.fixture
+def manager(client, tmp_path):
+    manager = SheetsManager(client=client, sheet_id="test", spool_path=str(tmp_path / "spool.db"))
+    assert manager.is_initialized
+    return manager
+
+
+def _sheet(client, title):
+    return client.spreadsheet("test")._get(title)._values()
+
+
+def test_last_sent_is_coalesced_into_one_batch(client, manager):
+    client.spreadsheet("test").seed("Reminders", [REMINDERS_HEADER, ["1", "a"], ["2", "b"], ["3", "c"]])
+
+    for reminder_id, sent_at in ((1, "t1"), (3, "t3"), (3, "t3-late"), (99, "missing")):
+        assert manager.update_last_sent(reminder_id, sent_at)
+    client.stats.reset()
+
+    assert manager.flush_last_sent() == 2
+    assert client.stats.total == 2  # одно чтение и одна запись
+    rows = _sheet(client, "Reminders")
+    assert rows[1][9] == "t1"
+    assert rows[2] == ["2", "b"]
+    assert rows[3][9] == "t3-late"
+
+
+def test_last_sent_column_comes_from_header(client, manager):
+    header = ["ID", "Last_Sent", "Text"]
+    client.spreadsheet("test").seed("Reminders", [header, ["5", "", "x"]])
+
+    manager.update_last_sent(5, "now")
+    assert manager.flush_last_sent() == 1
+    assert _sheet(client, "Reminders")[1] == ["5", "now", "x"]
+
+
+def test_last_sent_is_kept_when_write_fails(client, manager):
+    client.spreadsheet("test").seed("Reminders", [REMINDERS_HEADER, ["1", "a"]])
+    manager.update_last_sent(1, "old")
+    client.inject_rate_limit(100)
+
+    assert manager.flush_last_sent() == 0
+    manager.update_last_sent(1, "new")
+    assert manager._last_sent == {"1": "new"}
+
+
+def test_spooled_reminder_ids(client, manager):
+    client.inject_rate_limit(100)
+    manager.sync_reminder({"id": 7, "text": "x", "type": "daily", "time": "09:00"}, "CREATE")
+    manager.log_operation("t", "A", "1", "u", 0, "details")
+
+    assert manager.spool_depth == 2
+    assert manager.spooled_reminder_ids() == {"7"}
+
+
+def test_identical_rows_in_one_batch_are_all_spooled_and_replayed(client, manager):
+    row = ["2030-01-01 09:00:00", "09:00 MSK", "1", "-100", "SUCCESS", "", "hi"]
+    client.inject_rate_limit(100)
+    manager.log_send_history(*row)
+    manager.log_send_history(*row)
+    manager.flush_send_history()
+    assert manager.spool_depth == 2
+
+    client._pending_rate_limits = 0
+    manager.breaker.record_success()
+    assert manager.replay_spool()
+    assert _sheet(client, "Send_History")[1:] == [row, row]
+
+
+def test_identical_rows_in_separate_batches_are_all_spooled(client, manager, monkeypatch):
+    monkeypatch.setattr(manager, "_start_replayer", lambda: None)
+    row = ["2030-01-01 09:00:00", "09:00 MSK", "1", "-100", "SUCCESS", "", "hi"]
+    client.inject_rate_limit(1000)
+    for _ in range(2):
+        manager.log_send_history(*row)
+        manager.flush_send_history()
+    # Та же операция дважды за одну секунду - две строки журнала
+    manager.log_operation("t", "A", "1", "u", 0, "details")
+    manager.log_operation("t", "A", "1", "u", 0, "details")
+    assert manager.spool_depth == 4
+
+    client._pending_rate_limits = 0
+    manager.breaker.record_success()
+    assert manager.replay_spool()
+    assert _sheet(client, "Send_History")[1:] == [row, row]
+    assert len(_sheet(client, "Operation_Logs")[1:]) == 2
+
+
+def test_unwritten_rows_counts_repeated_rows(client, manager):
+    row = ["t", "m", "1", "-100", "SUCCESS", "", "hi"]
+    client.spreadsheet("test").seed("Send_History", [["Time_UTC"], row])
+    entries = [{"payload": row}, {"payload": list(row)}]
+
+    # В листе одна такая строка - вторая запись пачки еще не записана
+    assert manager._unwritten_rows("Send_History", entries) == [entries[1]]
+
+
+def test_bulk_delete_goes_to_spool_while_circuit_is_open(client, manager, monkeypatch):
+    monkeypatch.setattr(manager, "_start_replayer", lambda: None)
+    client.spreadsheet("test").seed("Reminders", [REMINDERS_HEADER, ["1", "a", "09:00", "daily", "5", "", "Active"]])
+    for _ in range(manager.breaker.failure_threshold):
+        manager.breaker.record_failure()
+    client.stats.reset()
+
+    assert manager.mark_reminders_deleted([{"id": "1"}, {"id": "2"}]) == (True, 0, 0, 2)
+    # Разомкнутая цепь: ни одного запроса к API, статусы ждут в spool
+    assert client.stats.total == 0
+    assert manager.spooled_reminder_ids() == {"1", "2"}
@@ -0,0 +1,223 @@
+# tests/test_sheets_manager.py
+
+import threading
+import time
+
+import gspread
+import pytest
+
+import sheets_integration
+from sheets_integration import ChatColumns, SheetsManager
+
+HEADER = ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+          "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+
+
+class _Worksheet:
+    """Лист Reminders в памяти: считает вызовы API"""
+
+    def __init__(self, rows):
+        self.rows = [list(row) for row in rows]
+        self.calls = []
+
+    def get_all_values(self):
+        self.calls.append("get_all_values")
+        return [list(row) for row in self.rows]
+
+    def batch_update(self, updates):
+        self.calls.append("batch_update")
+        for update in updates:
+            row, col = gspread.utils.a1_to_rowcol(update["range"])
+            target = self.rows[row - 1]
+            target.extend([""] * (col - len(target)))
+            target[col - 1] = update["values"][0][0]
+
+    def append_rows(self, rows):
+        self.calls.append("append_rows")
+        self.rows.extend(list(row) for row in rows)
+
+
+def _transpose(rows, width):
+    """Строки в колонки, как их отдает API: без пустых ячеек и колонок в конце"""
+    columns = [[row[index] if index < len(row) else "" for row in rows] for index in range(width)]
+    for column in columns:
+        while column and column[-1] == "":
+            column.pop()
+    while columns and not columns[-1]:
+        columns.pop()
+    return columns
+
+
+class _Spreadsheet:
+    def __init__(self, **sheets):
+        self.sheets = {title: _Worksheet(rows) for title, rows in sheets.items()}
+        self.batch_gets = []
+
+    def worksheet(self, title):
+        return self.sheets[title]
+
+    def values_batch_get(self, ranges, params=None):
+        self.batch_gets.append(list(ranges))
+        value_ranges = []
+        for sheet_range in ranges:
+            title, columns = sheet_range.split("!")
+            first, last = (gspread.utils.a1_to_rowcol(f"{column}1")[1] for column in columns.split(":"))
+            rows = [row[first - 1:last] for row in self.sheets[title.strip("'")].rows]
+            if (params or {}).get("majorDimension") == "COLUMNS":
+                rows = _transpose(rows, last - first + 1)
+            value_ranges.append({"range": sheet_range, "values": rows})
+        return {"valueRanges": value_ranges}
+
+
+@pytest.fixture
+def make_manager(monkeypatch, tmp_path):
+    monkeypatch.delenv("GOOGLE_SHEETS_CREDENTIALS", raising=False)
+    monkeypatch.delenv("GOOGLE_SHEETS_ID", raising=False)
+    monkeypatch.setattr(sheets_integration, "SHEETS_SPOOL_PATH", str(tmp_path / "spool.db"), raising=False)
+
+    def make(spreadsheet):
+        manager = SheetsManager()
+        manager.spreadsheet = spreadsheet
+        manager.is_initialized = True
+        # Отложенные записи в тестах отправляются явно (replay_spool), без фонового потока
+        manager._start_replayer = lambda: None
+        return manager
+    return make
+
+
+def _row(reminder_id, status="Active"):
+    return [str(reminder_id), f"r{reminder_id}", "09:00", "daily", "5", "", status, "", "", "", ""]
+
+
+def _chat(chat_id, status="Active"):
+    return [str(chat_id), "name", "group", "", "", "", "", status]
+
+
+def test_statuses_are_written_in_one_batch(make_manager):
+    spreadsheet = _Spreadsheet(Reminders=[HEADER, _row(1), _row(2), _row(3, "Deleted"), _row(4)])
+    manager = make_manager(spreadsheet)
+    worksheet = spreadsheet.sheets["Reminders"]
+
+    reminders = [{"id": reminder_id, "text": f"r{reminder_id}", "type": "daily", "time": "09:00"}
+                 for reminder_id in (1, 3, 4, 9)]
+    assert manager.mark_reminders_deleted(reminders) == (True, 2, 1, 0)
+
+    assert worksheet.calls == ["get_all_values", "batch_update", "append_rows"]
+    assert [row[6] for row in worksheet.rows[1:5]] == ["Deleted", "Active", "Deleted", "Deleted"]
+    # Напоминания, которых нет в листе, дописываются уже удаленными
+    assert worksheet.rows[5][0] == 9
+    assert worksheet.rows[5][6] == "Deleted"
+
+
+def test_status_column_comes_from_header(make_manager):
+    spreadsheet = _Spreadsheet(Reminders=[["ID", "Status", "Text"], ["1", "Active", "x"]])
+    manager = make_manager(spreadsheet)
+    worksheet = spreadsheet.sheets["Reminders"]
+
+    assert manager.mark_reminders_deleted([{"id": "1"}]) == (True, 1, 0, 0)
+    assert worksheet.rows[1] == ["1", "Deleted", "x"]
+
+
+def test_nothing_to_mark(make_manager):
+    spreadsheet = _Spreadsheet(Reminders=[HEADER, _row(1, "Deleted")])
+    manager = make_manager(spreadsheet)
+    worksheet = spreadsheet.sheets["Reminders"]
+
+    assert manager.mark_reminders_deleted([]) == (True, 0, 0, 0)
+    assert manager.mark_reminders_deleted([{"id": 1}]) == (True, 0, 0, 0)
+    assert worksheet.calls == ["get_all_values"]
+
+
+def test_failed_write_is_deferred_to_spool(make_manager):
+    spreadsheet = _Spreadsheet(Reminders=[HEADER, _row(1), _row(2)])
+    worksheet = spreadsheet.sheets["Reminders"]
+    read = worksheet.get_all_values
+    worksheet.get_all_values = lambda: 1 / 0
+    manager = make_manager(spreadsheet)
+
+    assert manager.mark_reminders_deleted([{"id": 1}, {"id": 2}]) == (True, 0, 0, 2)
+    assert manager.spooled_reminder_ids() == {"1", "2"}
+
+    # После восстановления оба статуса уходят одним batch_update
+    worksheet.get_all_values = read
+    worksheet.calls.clear()
+    assert manager.replay_spool()
+    assert worksheet.calls == ["get_all_values", "batch_update"]
+    assert [row[6] for row in worksheet.rows[1:]] == ["Deleted", "Deleted"]
+    assert manager.spool_depth == 0
+
+
+def test_failure_without_spool_is_reported(make_manager):
+    spreadsheet = _Spreadsheet(Reminders=[HEADER])
+    spreadsheet.sheets["Reminders"].get_all_values = lambda: 1 / 0
+    manager = make_manager(spreadsheet)
+    manager._spool = None
+
+    assert manager.mark_reminders_deleted([{"id": 1}]) == (False, 0, 0, 0)
+
+
+def test_views_are_read_in_one_request(make_manager):
+    chats_header = ["Chat_ID", "Chat_Name", "Chat_Type", "", "", "", "", "Status"]
+    spreadsheet = _Spreadsheet(
+        Reminders=[HEADER, _row(1), _row(2, "Deleted")],
+        Chat_Stats=[chats_header, _chat(5), _chat(7, "Unsubscribed"), _chat(9)],
+    )
+    manager = make_manager(spreadsheet)
+
+    views = manager.fetch_sheet_views()
+    assert len(spreadsheet.batch_gets) == 1
+    assert [record["ID"] for record in views["reminders"]] == [1, 2]
+    assert views["reminders"][1]["Status"] == "Deleted"
+    assert isinstance(views["chats"], ChatColumns)
+    assert len(views["chats"]) == 3
+    assert manager.get_subscribed_chats(views["chats"]) == [5, 9]
+
+
+def test_chats_without_status_column_are_active(make_manager):
+    spreadsheet = _Spreadsheet(Chat_Stats=[["Chat_ID", "Chat_Name"], ["5", "a"], ["7", "b"]])
+    manager = make_manager(spreadsheet)
+
+    views = manager.fetch_sheet_views(("chats",))
+    assert spreadsheet.batch_gets == [list(SheetsManager.SHEET_VIEW_RANGES["chats"])]
+    assert manager.get_subscribed_chats(views["chats"]) == [5, 7]
+
+
+def test_chat_columns_pair_ids_with_statuses():
+    columns = ChatColumns(["Chat_ID", "5", "7", "9"], ["Status", "Active", "Unsubscribed"])
+    assert len(columns) == 3
+    # Колонка Status короче: пустые ячейки в конце API не возвращает
+    assert list(columns) == [("5", "Active"), ("7", "Unsubscribed"), ("9", "")]
+    assert list(ChatColumns(["Chat_ID", "5"], ["Other", "x"])) == [("5", "")]
+    assert len(ChatColumns([], [])) == 0 and list(ChatColumns([], [])) == []
+
+
+def test_failed_fetch_returns_none(make_manager):
+    spreadsheet = _Spreadsheet()
+    manager = make_manager(spreadsheet)
+
+    assert manager.fetch_sheet_views(("reminders",)) is None
+
+
+def test_shared_manager_is_created_once(monkeypatch):
+    created = []
+
+    class _Manager:
+        def __init__(self):
+            created.append(self)
+            time.sleep(0.05)  # параллельные вызовы приходят, пока идет подключение
+
+    monkeypatch.delenv("SHEETS_BACKEND", raising=False)
+    monkeypatch.setattr(sheets_integration, "SheetsManager", _Manager)
+    monkeypatch.setattr(sheets_integration, "_shared_manager", None)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sheets_integration.get_sheets_manager()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert len(results) == 8 and all(result is created[0] for result in results)
+    # Импорт модуля экземпляр не создает
+    assert not hasattr(sheets_integration, "sheets_manager")
@@ -0,0 +1,89 @@
+# tests/test_sheets_operations.py
+
+import pytest
+
+import sheets_integration
+from fake_gspread import FakeClient
+from metrics import metrics
+from sheets_integration import SheetsManager, current_operation
+
+REMINDERS_HEADER = ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+                    "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Паузы повторов 429 в тестах не нужны
+    monkeypatch.setattr(sheets_integration.time, "sleep", lambda seconds: None)
+    return FakeClient()
+
+
+@pytest.fixture
+def manager(client, tmp_path):
+    manager = SheetsManager(client=client, sheet_id="test", spool_path=str(tmp_path / "spool.db"))
+    client.spreadsheet("test").seed("Reminders", [REMINDERS_HEADER, ["1", "a", "09:00", "daily", "5", "", "Active"]])
+    client.stats.reset()
+    return manager
+
+
+class _Counters:
+    """Прирост глобальных метрик за время теста (реестр общий для процесса)"""
+
+    def __init__(self):
+        self.before = self._read()
+
+    @staticmethod
+    def _read():
+        return {
+            "requests": metrics.counters("sheets_api_requests", "method"),
+            "rate_limited": metrics.counters("sheets_rate_limited", "method"),
+            "sleeps": {method: timing["count"]
+                       for method, timing in metrics.timings("sheets_rate_limit_sleep", "method").items()},
+        }
+
+    def delta(self, name, method=None):
+        after = self._read()[name]
+        if method is None:
+            return sum(after.values()) - sum(self.before[name].values())
+        return after.get(method, 0) - self.before[name].get(method, 0)
+
+
+def test_api_requests_are_attributed_to_method(client, manager):
+    counters = _Counters()
+
+    manager.fetch_sheet_views(("reminders",))
+
+    assert client.stats.total == 1
+    assert counters.delta("requests", "fetch_sheet_views") == 1
+    assert current_operation() == "other"
+
+
+def test_nested_call_is_attributed_to_inner_method(client, manager, tmp_path):
+    counters = _Counters()
+
+    success, _ = manager.restore_reminders_from_sheets(str(tmp_path / "reminders.json"))
+
+    assert success
+    # Чтение листа приписано fetch_sheet_views, каждый запрос учтен ровно один раз
+    assert counters.delta("requests", "fetch_sheet_views") == 1
+    assert counters.delta("requests") == client.stats.total
+
+
+def test_rate_limits_and_retry_sleeps_are_attributed(client, manager):
+    counters = _Counters()
+    client.inject_rate_limit(2)
+
+    assert manager.fetch_sheet_views(("reminders",)) is not None
+
+    assert counters.delta("requests", "fetch_sheet_views") == 3
+    assert counters.delta("rate_limited", "fetch_sheet_views") == 2
+    assert counters.delta("sleeps", "fetch_sheet_views") == 2
+
+
+def test_api_stats_sorted_by_requests(client, manager):
+    manager.fetch_sheet_views(("reminders",))
+
+    stats = manager.api_stats()
+    assert [item["api_requests"] for item in stats] == sorted((item["api_requests"] for item in stats), reverse=True)
+    fetch = next(item for item in stats if item["method"] == "fetch_sheet_views")
+    assert fetch["calls"] >= 1 and fetch["api_requests"] >= 1
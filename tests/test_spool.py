@@ -0,0 +1,78 @@
+# tests/test_spool.py
+
+import pytest
+
+from spool import WriteSpool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return WriteSpool(str(tmp_path / "spool.db"))
+
+
+def _keys(spool):
+    return [entry["key"] for entry in spool.peek()]
+
+
+def test_append_is_idempotent_by_key(spool):
+    assert spool.append("append", "Logs", ["a"], key="k1") is True
+    assert spool.append("append", "Logs", ["changed"], key="k1") is False
+    assert len(spool) == 1
+    assert spool.peek()[0]["payload"] == ["a"]
+
+
+def test_replace_moves_entry_to_end_with_new_payload(spool):
+    spool.append("sync_reminder", "Reminders", {"v": 1}, key="reminder:1")
+    spool.append("append", "Logs", ["x"], key="k1")
+    assert spool.append("sync_reminder", "Reminders", {"v": 2}, key="reminder:1", replace=True) is True
+
+    entries = spool.peek()
+    assert [entry["key"] for entry in entries] == ["k1", "reminder:1"]
+    assert entries[1]["payload"] == {"v": 2}
+
+
+def test_extend_keeps_order_and_skips_known_keys(spool):
+    spool.append("append", "Logs", ["b"], key="b")
+    added = spool.extend("append", "Logs", [("a", ["a"]), ("b", ["b"]), ("c", ["c"])])
+    assert added == 2
+    assert _keys(spool) == ["b", "a", "c"]
+    assert [entry["key"] for entry in spool.peek(limit=2)] == ["b", "a"]
+
+
+def test_ack_removes_entries(spool):
+    spool.extend("append", "Logs", [("a", 1), ("b", 2), ("c", 3)])
+    seqs = [entry["seq"] for entry in spool.peek(limit=2)]
+    spool.ack(seqs)
+    assert _keys(spool) == ["c"]
+    # Подтвержденный ключ можно поставить снова
+    assert spool.append("append", "Logs", 1, key="a") is True
+
+
+def test_mark_attempt_counts_sends_not_errors(spool):
+    spool.append("append", "Logs", ["a"], key="a")
+    seq = spool.peek()[0]["seq"]
+    spool.mark_attempt([seq])
+    spool.mark_attempt([seq], "429 quota")
+    assert spool.peek()[0]["attempts"] == 1
+
+
+def test_keys_by_prefix(spool):
+    spool.append("sync_reminder", "Reminders", {}, key="reminder:7")
+    spool.append("append", "Logs", [], key="Logs:abc")
+    spool.append("sync_reminder", "Reminders", {}, key="reminder:3")
+    assert spool.keys("reminder:") == ["reminder:7", "reminder:3"]
+    assert len(spool.keys()) == 3
+
+
+def test_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "spool.db")
+    WriteSpool(path).extend("append", "Logs", [("a", ["a"]), ("b", ["b"])])
+    reopened = WriteSpool(path)
+    assert _keys(reopened) == ["a", "b"]
+    assert reopened.oldest_age() >= 0
+
+
+def test_empty_spool(spool):
+    assert len(spool) == 0
+    assert spool.peek() == []
+    assert spool.oldest_age() == 0.0
@@ -0,0 +1,52 @@
+# tests/test_spool_replay.py
+
+import pytest
+
+import sheets_integration
+from fake_gspread import FakeClient
+from sheets_integration import SheetsManager
+
+REMINDERS_HEADER = ["ID", "Text", "Time_MSK", "Type", "Chat_ID", "Chat_Name", "Status",
+                    "Created_At", "Username", "Last_Sent", "Days_Of_Week"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Паузы повторов 429 в тестах не нужны
+    monkeypatch.setattr(sheets_integration.time, "sleep", lambda seconds: None)
+    return FakeClient()
+
+
+@pytest.fixture
+def manager(client, tmp_path):
+    manager = SheetsManager(client=client, sheet_id="test", spool_path=str(tmp_path / "spool.db"))
+    assert manager.is_initialized
+    return manager
+
+
+def _sheet(client, title):
+    return client.spreadsheet("test")._get(title)._values()
+
+
+def test_replay_keeps_spool_order_and_latest_reminder_version(client, manager):
+    client.spreadsheet("test").seed("Reminders", [REMINDERS_HEADER])
+    client.inject_rate_limit(100)
+    manager.log_operation("t1", "A", "1", "u", 0, "first")
+    manager.sync_reminder({"id": 7, "text": "v1", "type": "daily", "time": "09:00"}, "CREATE")
+    manager.log_operation("t2", "B", "1", "u", 0, "second")
+    manager.sync_reminder({"id": 7, "text": "v2", "type": "daily", "time": "09:00"}, "UPDATE")
+    keys = [entry["key"] for entry in manager._spool.peek()]
+    assert keys[-1] == "reminder:7" and len(keys) == 3
+
+    # Пока Sheets недоступен, replay останавливается и ничего не теряет
+    manager.breaker.record_success()
+    assert not manager.replay_spool()
+    assert manager.spool_depth == 3
+
+    client._pending_rate_limits = 0
+    manager.breaker.record_success()
+    assert manager.replay_spool()
+    assert manager.spool_depth == 0
+    assert [row[2] for row in _sheet(client, "Operation_Logs")[1:]] == ["A", "B"]
+    reminders = _sheet(client, "Reminders")[1:]
+    assert [(row[0], row[1]) for row in reminders] == [("7", "v2")]
@@ -0,0 +1,122 @@
+# tests/test_startup.py
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+import sheets_integration
+
+
+@pytest.fixture
+def startup(monkeypatch):
+    stages = bot.StartupStages()
+    calls = {"catchup": [], "rescheduled": 0}
+    monkeypatch.setattr(bot, "startup_stages", stages)
+    monkeypatch.setattr(bot, "init_sheets_manager", lambda: None)
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", False)
+    monkeypatch.setattr(bot, "sheets_manager", None)
+    monkeypatch.setattr(bot, "load_chats", lambda: [1])
+    monkeypatch.setattr(bot, "ensure_subscribed_chats_file", lambda *args: True)
+    monkeypatch.setattr(bot, "ensure_reminders_file", lambda *args: (True, 2))
+    monkeypatch.setattr(bot, "check_active_jobs", lambda job_queue: 2)
+    monkeypatch.setattr(bot, "start_catchup_replay", lambda tg_bot, cutoff: calls["catchup"].append(cutoff))
+
+    def reschedule(job_queue):
+        calls["rescheduled"] += 1
+
+    monkeypatch.setattr(bot, "reschedule_all_reminders", reschedule)
+    return stages, calls
+
+
+def test_stage_records_status_and_duration():
+    stages = bot.StartupStages()
+    with stages.stage("local_state"):
+        pass
+    with pytest.raises(RuntimeError):
+        with stages.stage("broken"):
+            raise RuntimeError("boom")
+
+    snapshot = stages.snapshot()
+    assert [(name, status) for name, status, _ in snapshot] == [("local_state", "done"), ("broken", "failed")]
+    assert all(seconds is not None and seconds >= 0 for _, _, seconds in snapshot)
+    assert stages.status("local_state") == "done"
+    assert stages.status("missing") is None
+    assert not stages.is_complete
+    stages.complete()
+    assert stages.is_complete
+
+
+def test_background_startup_runs_sheets_stages_then_catchup(startup):
+    stages, calls = startup
+    cutoff = bot.get_moscow_time()
+
+    bot.run_background_startup(None, None, cutoff, local_reminders_count=5)
+
+    assert [(name, status) for name, status, _ in stages.snapshot()] == [
+        ("sheets_init", "done"), ("sheets_restore", "done"), ("jobs_check", "done")]
+    # Локальные напоминания уже были - повторно не планируем, догоняем с исходной отсечки
+    assert calls["rescheduled"] == 0
+    assert calls["catchup"] == [cutoff]
+    assert stages.is_complete
+
+
+def test_reminders_restored_into_empty_file_are_rescheduled(startup):
+    stages, calls = startup
+    cutoff = bot.get_moscow_time()
+
+    bot.run_background_startup(None, None, cutoff, local_reminders_count=0)
+
+    assert calls["rescheduled"] == 1
+    assert len(calls["catchup"]) == 1 and calls["catchup"][0] >= cutoff
+
+
+def test_failed_stage_still_starts_catchup(startup, monkeypatch):
+    stages, calls = startup
+
+    def broken(*args):
+        raise RuntimeError("sheets down")
+
+    monkeypatch.setattr(bot, "ensure_subscribed_chats_file", broken)
+    cutoff = bot.get_moscow_time()
+
+    bot.run_background_startup(None, None, cutoff, local_reminders_count=5)
+
+    assert stages.status("sheets_restore") == "failed"
+    assert stages.status("jobs_check") is None
+    assert calls["catchup"] == [cutoff]
+    assert stages.is_complete
+
+
+def test_sheets_ready_is_set_when_connection_fails(monkeypatch):
+    def broken():
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(bot, "sheets_ready", threading.Event())
+    monkeypatch.setattr(bot, "sheets_manager", None)
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", False)
+    monkeypatch.setattr(sheets_integration, "get_sheets_manager", broken)
+    assert bot.sheets_connecting()
+
+    bot.init_sheets_manager()
+
+    assert not bot.sheets_connecting()
+    assert bot.sheets_manager is None
+    assert bot.SHEETS_AVAILABLE is False
+
+
+def test_clear_reminders_waits_for_sheets_connection(monkeypatch):
+    monkeypatch.setattr(bot, "sheets_ready", threading.Event())
+    monkeypatch.setattr(bot, "get_chat_reminders", lambda chat_id: [{"id": "1"}])
+    removed = []
+    monkeypatch.setattr(bot, "remove_reminders", lambda ids: removed.extend(ids) or [])
+    replies = []
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=5),
+                             message=SimpleNamespace(reply_text=lambda text, **kwargs: replies.append(text)))
+
+    bot.clear_reminders(update, None)
+
+    # До подключения локальное удаление вернула бы первая автосинхронизация
+    assert removed == []
+    assert len(replies) == 1 and "еще подключается" in replies[0]
@@ -0,0 +1,127 @@
+# tests/test_storage.py
+
+import json
+import threading
+
+import pytest
+
+from storage import JsonStore, StoreConflictError, get_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JsonStore(str(tmp_path / "data.json"))
+
+
+def test_missing_and_corrupted_file_use_default(store, tmp_path):
+    assert store.read() == []
+    (tmp_path / "data.json").write_text("{not json")
+    assert store.read() == []
+
+
+def test_compare_and_swap_rejects_stale_version(store):
+    data, version = store.snapshot()
+    store.write([1])
+    with pytest.raises(StoreConflictError):
+        store.compare_and_swap(version, data + [2])
+    assert store.read() == [1]
+
+    data, version = store.snapshot()
+    new_version = store.compare_and_swap(version, data + [2])
+    assert new_version == version + 1
+    assert store.read() == [1, 2]
+
+
+def test_transaction_writes_only_changes(store):
+    start = store.version
+    with store.transaction() as tx:
+        tx.data.append("a")
+    assert tx.version == start + 1
+    with store.transaction() as tx:
+        pass
+    assert store.version == start + 1
+    assert json.loads(open(store.path).read()) == ["a"]
+
+
+def test_transaction_abort_and_exception_discard_changes(store):
+    store.write(["a"])
+    with store.transaction() as tx:
+        tx.data.append("b")
+        tx.abort()
+    with pytest.raises(RuntimeError):
+        with store.transaction() as tx:
+            tx.data.append("c")
+            raise RuntimeError("boom")
+    assert store.read() == ["a"]
+
+
+def test_snapshot_is_a_copy(store):
+    store.write([{"id": 1}])
+    data, _ = store.snapshot()
+    data[0]["id"] = 2
+    assert store.read() == [{"id": 1}]
+
+
+def test_update_retries_on_conflict(store):
+    store.write([])
+    calls = []
+
+    def append(data):
+        calls.append(len(data))
+        if len(calls) == 1:
+            # Конкурирующая запись между snapshot и compare_and_swap
+            store.write(["other"])
+        return data + ["mine"]
+
+    assert store.update(append) == ["other", "mine"]
+    assert calls == [0, 1]
+
+
+def test_update_gives_up_after_retries(store):
+    def always_conflicts(data):
+        store.write(data + ["other"])
+        return data
+
+    with pytest.raises(StoreConflictError):
+        store.update(always_conflicts, retries=2)
+
+
+def test_concurrent_transactions_do_not_lose_updates(store):
+    store.write([])
+
+    def worker():
+        for _ in range(50):
+            with store.transaction() as tx:
+                tx.data.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.read()) == 200
+
+
+def test_external_change_is_reloaded_as_new_version(store, tmp_path):
+    store.write(["a"])
+    version = store.version
+    (tmp_path / "data.json").write_text(json.dumps(["a", "external"]))
+    assert store.read() == ["a", "external"]
+    assert store.version > version
+
+
+def test_index_is_rebuilt_once_per_version(store):
+    builds = []
+    store.add_index("ids", lambda data: builds.append(1) or {item["id"] for item in data})
+    store.write([{"id": 1}])
+    assert store.index("ids") == {1}
+    assert store.index("ids") == {1}
+    assert len(builds) == 1
+    store.write([{"id": 1}, {"id": 2}])
+    assert store.index("ids") == {1, 2}
+    assert len(builds) == 2
+
+
+def test_get_store_returns_shared_instance(tmp_path):
+    path = str(tmp_path / "shared.json")
+    assert get_store(path) is get_store(path)
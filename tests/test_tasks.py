@@ -0,0 +1,96 @@
+# tests/test_tasks.py
+
+import threading
+import time
+
+import pytest
+
+from tasks import CANCELLED, DONE, FAILED, RUNNING, TaskConflictError, TaskManager
+
+
+def _wait(task, timeout=5):
+    deadline = time.monotonic() + timeout
+    while task.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not task.active, f"task #{task.id} is still {task.status}"
+    return task.status
+
+
+@pytest.fixture
+def manager():
+    return TaskManager(max_workers=1, history=2)
+
+
+def test_task_runs_and_reports_progress(manager):
+    def work(task):
+        task.report("step 1/1")
+
+    task = manager.submit("clear", "Очистка", work, chat_id=5)
+    assert _wait(task) == DONE
+    assert task.progress == "step 1/1"
+    assert task.elapsed() >= 0
+
+
+def test_same_key_conflicts_only_while_active(manager):
+    release = threading.Event()
+    first = manager.submit("clear", "Очистка", lambda task: release.wait(5), key="clear:5")
+    with pytest.raises(TaskConflictError):
+        manager.submit("clear", "Очистка", lambda task: None, key="clear:5")
+    # Другой ключ не конфликтует
+    other = manager.submit("clear", "Очистка", lambda task: None, key="clear:6")
+
+    release.set()
+    assert _wait(first) == DONE
+    assert _wait(other) == DONE
+    again = manager.submit("clear", "Очистка", lambda task: None, key="clear:5")
+    assert _wait(again) == DONE
+
+
+def test_cancel_running_task(manager):
+    started = threading.Event()
+
+    def work(task):
+        started.set()
+        while True:
+            task.sleep(0.01)
+
+    task = manager.submit("restore", "Восстановление", work)
+    assert started.wait(5)
+    assert task.status == RUNNING
+    assert manager.cancel(task.id)
+    assert _wait(task) == CANCELLED
+    assert not manager.cancel(task.id)
+    assert not manager.cancel(999)
+
+
+def test_cancel_queued_task_before_start(manager):
+    release = threading.Event()
+    ran = []
+    blocker = manager.submit("clear", "Первая", lambda task: release.wait(5))
+    queued = manager.submit("clear", "Вторая", lambda task: ran.append(task.id))
+
+    assert manager.cancel(queued.id)
+    release.set()
+    assert _wait(blocker) == DONE
+    assert _wait(queued) == CANCELLED
+    assert ran == []
+
+
+def test_failed_task_keeps_error(manager):
+    def work(task):
+        raise RuntimeError("sheets down")
+
+    task = manager.submit("restore", "Восстановление", work)
+    assert _wait(task) == FAILED
+    assert task.error == "sheets down"
+    assert manager.count(FAILED) == 1
+
+
+def test_list_by_chat_and_history_limit(manager):
+    tasks = [manager.submit("clear", f"#{i}", lambda task: None, chat_id=i % 2) for i in range(4)]
+    for task in tasks:
+        _wait(task)
+    manager.submit("clear", "last", lambda task: None, chat_id=1)
+    # Хранятся последние history завершенных задач и активные
+    assert len(manager.list()) <= 3
+    assert all(task.chat_id == 1 for task in manager.list(chat_id=1))
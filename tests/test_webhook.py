@@ -0,0 +1,60 @@
+# tests/test_webhook.py
+
+import signal
+
+import pytest
+from telegram import User
+from telegram.ext import Updater
+
+import bot
+
+
+@pytest.fixture
+def webhook_updater(monkeypatch):
+    monkeypatch.setattr(bot, "WEBHOOK_URL", "https://example.invalid")
+    updater = Updater(token="123456:TEST", use_context=True)
+    # Без getMe: диспетчеру нужен только id бота для имен потоков
+    monkeypatch.setattr(updater.bot, "_bot", User(id=123456, first_name="Test", is_bot=True))
+    webhooks = []
+    monkeypatch.setattr(updater.bot, "set_webhook", lambda **kwargs: webhooks.append(kwargs))
+    yield updater, webhooks
+    if updater.dispatcher.running:
+        updater.stop()
+
+
+def test_webhook_mode_stops_gracefully_on_sigterm(webhook_updater, monkeypatch):
+    updater, webhooks = webhook_updater
+    exits = []
+    monkeypatch.setattr("os._exit", lambda code: exits.append(code))
+
+    bot.start_webhook_mode(updater)
+    assert webhooks and webhooks[0]["url"] == "https://example.invalid" + bot.WEBHOOK_PATH
+    assert updater.running and updater.dispatcher.running
+
+    updater._signal_handler(signal.SIGTERM, None)
+
+    assert exits == []
+    assert not updater.running
+    assert not updater.dispatcher.running
+    assert not updater.job_queue.scheduler.running
+
+
+def test_shutdown_flushes_sheets_queues(monkeypatch):
+    flushed = []
+
+    class Manager:
+        is_initialized = True
+
+        def flush_send_history(self):
+            flushed.append("send_history")
+
+        def flush_last_sent(self):
+            flushed.append("last_sent")
+
+    monkeypatch.setattr(bot, "SHEETS_AVAILABLE", True)
+    monkeypatch.setattr(bot, "sheets_manager", Manager())
+    monkeypatch.setattr(bot, "reminder_scheduler", None)
+
+    bot.shutdown()
+
+    assert flushed == ["send_history", "last_sent"]